@@ -11,14 +11,13 @@ SPEC:
 """
 
 import argparse
-import csv
 import json
 import os
 import sys
 import time
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 # 允许脚本直接运行时导入项目模块
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
@@ -28,10 +27,8 @@ if ROOT not in sys.path:
 from kernel.bus import OutboxBus  # type: ignore
 from kernel.outbox_sqlite import OutboxSQLite  # type: ignore
 from kernel.guardian import BudgetGuardian  # type: ignore
-from skills.csv_clean import csv_clean  # type: ignore
-from skills.stats_aggregate import stats_aggregate  # type: ignore
-from skills.md_render import md_render  # type: ignore
 from packages.providers.router import LLMRouter  # type: ignore
+from packages.providers.recording import RecordingProvider, ReplayProvider, load_recording, recording_path  # type: ignore
 from packages.agents.interfaces import Planner, Executor, Critic, Reviser  # type: ignore
 from packages.agents.registry import get as get_plugin  # type: ignore
 import packages.agents.llm_agents  # noqa: F401  # 引入以触发注册
@@ -39,6 +36,12 @@ import packages.agents.rule_agents  # noqa: F401  # 引入以触发注册
 import packages.agents.mcp_agents  # noqa: F401  # 引入以触发注册
 from packages.config.loader import load_config  # type: ignore
 from packages.agents.skills_registry import verify_skills  # type: ignore
+from packages.agents.plan_executor import execute_plan  # type: ignore
+from packages.agents.skills_pipeline import plan_step_args  # type: ignore
+from packages.data.dataset import Dataset  # type: ignore
+from packages.data.dataset_cache import configure_dataset_cache, load_csv_cached  # type: ignore
+from packages.data.incremental import configure_incremental  # type: ignore
+from packages.agents.step_memo import configure_step_memo  # type: ignore
 
 
 def load_srs(path: str) -> Dict[str, Any]:
@@ -46,10 +49,9 @@ def load_srs(path: str) -> Dict[str, Any]:
         return json.load(f)
 
 
-def read_csv_rows(path: str) -> List[Dict[str, str]]:
-    with open(path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+def read_csv_rows(path: str) -> Dataset:
+    """整表读取为列式 Dataset（可按 List[Dict[str, str]] 使用）；先查磁盘解析缓存。"""
+    return load_csv_cached(path)
 
 
 def sample_csv_text(csv_path: str, max_rows: int = 80) -> str:
@@ -66,8 +68,16 @@ def sample_csv_text(csv_path: str, max_rows: int = 80) -> str:
 def build_plugins(planner: str, executor: str, critic: str, reviser: str, need_client: bool, cfg: Dict[str, Any]) -> Tuple[Planner, Executor, Critic, Reviser, dict]:
     client = None
     if need_client:
-        # 统一通过 Router 选择 provider（openrouter/openai）
-        client = LLMRouter(cfg)
+        llm_cfg = cfg.get("llm", {}) or {}
+        replay = llm_cfg.get("replay") or {}
+        if replay.get("path"):
+            # 回放：由录制的请求/响应对提供 LLM 输出，离线复跑
+            client = ReplayProvider.from_file(replay["path"], strict=bool(replay.get("strict", False)))
+        else:
+            # 统一通过 Router 选择 provider（openrouter/openai/mock）
+            client = LLMRouter(cfg)
+            if llm_cfg.get("record"):
+                client = RecordingProvider(client)
     ctx = {"client": client}
     PlannerCls = get_plugin("planner", planner)
     ExecutorCls = get_plugin("executor", executor)
@@ -81,71 +91,51 @@ def build_plugins(planner: str, executor: str, critic: str, reviser: str, need_c
     return p, e, c, r, ctx
 
 
-def execute_local_plan(plan: Dict[str, Any], rows: List[Dict[str, str]]) -> Tuple[str, Dict[str, Any]]:
-    """使用内置 skills 执行计划，产生 Markdown 与执行指标(离线、可复现)。"""
+def execute_local_plan(
+    plan: Dict[str, Any],
+    rows: Union[str, Iterable[Dict[str, str]]],
+    workers: Optional[int] = None,
+    emit: Optional[Callable[[str, Dict[str, Any]], Any]] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """使用内置 skills 执行计划，产生 Markdown 与执行指标(离线、可复现)。
+
+    计划经 agents.plan_executor 按 DAG 执行；rows 为 CSV 路径时清洗+聚合按文件选择流式/分块并行/增量/缓存路径。
+    """
     t0 = time.time()
-    artifacts: Dict[str, Any] = {}
-
-    # 默认参数兜底
-    steps = plan.get("steps", [])
-    step_by_id = {s.get("id"): s for s in steps if isinstance(s, dict)}
-
-    # s1: 清洗
-    s1 = step_by_id.get("s1") or {"op": "csv.clean", "args": {"drop_empty": True}}
-    cleaned = csv_clean(rows, **(s1.get("args", {}) or {}))
-    artifacts["cleaned_count"] = len(cleaned)
-
-    # s2: 聚合
-    s2 = step_by_id.get("s2") or {"op": "stats.aggregate", "args": {"top_n": 10, "score_by": "views", "title_field": "title"}}
-    agg = stats_aggregate(cleaned, **(s2.get("args", {}) or {}))
-    artifacts.update({
-        "top_n": (s2.get("args", {}) or {}).get("top_n"),
-        "score_by": (s2.get("args", {}) or {}).get("score_by"),
-        "title_field": (s2.get("args", {}) or {}).get("title_field"),
+    md_text, info = execute_plan(plan, rows, workers=workers, emit=emit, fallback=True)
+    agg = info.get("agg") or {}
+    _, s2_args, _ = plan_step_args(plan)
+    artifacts: Dict[str, Any] = {
+        "cleaned_count": int((agg.get("summary") or {}).get("count", 0)),
+        "top_n": s2_args.get("top_n"),
+        "score_by": s2_args.get("score_by"),
+        "title_field": s2_args.get("title_field"),
         "found_top": len(agg.get("top", [])),
-    })
-
-    # s3: 渲染
-    s3 = step_by_id.get("s3") or {"op": "md.render", "args": {"include_table": True}}
-    md_text = md_render(summary=agg.get("summary", {}), top=agg.get("top", []), **(s3.get("args", {}) or {}))
-
+    }
     latency_ms = int((time.time() - t0) * 1000)
-    return md_text, {"artifacts": artifacts, "metrics": {"latency_ms": latency_ms, "retries": 0, "cost": 0.0}}
+    return md_text, {"artifacts": artifacts, "metrics": {"latency_ms": latency_ms, "retries": 0, "cost": 0.0, "steps": len(info["steps"])}}
 
 
 def write_replay_script(trace_id: str, srs: Dict[str, Any], plan: Dict[str, Any], out_path: str) -> str:
-    """生成可重复运行的离线脚本 episodes/<trace_id>_replay.py。"""
+    """生成可重复运行的离线脚本 episodes/<trace_id>_replay.py（经计划执行器按原计划执行；与运行时一样 fallback=True，计划无效时回退规范三步计划）。"""
     script_path = os.path.join("episodes", f"{trace_id}_replay.py")
     plan_src = json.dumps(plan, ensure_ascii=False)
     srs_src = json.dumps({"inputs": srs.get("inputs", {})}, ensure_ascii=False)
     content = f"""# -*- coding: utf-8 -*-
-from typing import Dict, Any, List
-import csv, json
-from skills.csv_clean import csv_clean
-from skills.stats_aggregate import stats_aggregate
-from skills.md_render import md_render
+from typing import Dict, Any
+import json
+from packages.agents.plan_executor import execute_plan
 
 PLAN: Dict[str, Any] = json.loads(r'''{plan_src}''')
 SRS: Dict[str, Any] = json.loads(r'''{srs_src}''')
 OUT_PATH = r"{out_path}"
 
-def _read_csv_rows(path: str) -> List[Dict[str, str]]:
-    with open(path, newline="", encoding="utf-8") as f:
-        return list(csv.DictReader(f))
-
 def main():
-    rows = _read_csv_rows(SRS["inputs"]["csv_path"])  # type: ignore
-    steps = PLAN.get("steps", [])
-    by_id = {{s.get("id"): s for s in steps if isinstance(s, dict)}}
-    s1 = by_id.get("s1") or {{"op": "csv.clean", "args": {{"drop_empty": True}}}}
-    cleaned = csv_clean(rows, **(s1.get("args", {{}}) or {{}}))
-    s2 = by_id.get("s2") or {{"op": "stats.aggregate", "args": {{"top_n": 10, "score_by": "views", "title_field": "title"}}}}
-    agg = stats_aggregate(cleaned, **(s2.get("args", {{}}) or {{}}))
-    s3 = by_id.get("s3") or {{"op": "md.render", "args": {{"include_table": True}}}}
-    md_text = md_render(agg.get("summary", {{}}), agg.get("top", []), **(s3.get("args", {{}}) or {{}}))
+    md_text, info = execute_plan(PLAN, SRS["inputs"]["csv_path"], fallback=True)  # type: ignore
     with open(OUT_PATH, "w", encoding="utf-8") as f:
         f.write(md_text)
-    print(json.dumps({{"status":"ok","out":OUT_PATH}}, ensure_ascii=False))
+    steps = [{{"id": s["id"], "op": s["op"], "ms": s.get("ms")}} for s in info["steps"]]
+    print(json.dumps({{"status":"ok","out":OUT_PATH,"steps":steps}}, ensure_ascii=False))
 
 if __name__ == "__main__":
     main()
@@ -158,6 +148,26 @@ if __name__ == "__main__":
 # llm_* 函数已由 LLM 插件实现，保留本地技能执行与脚本生成
 
 
+def emit_progress(stage: str, status: str, message: str | None = None, extra: Dict[str, Any] | None = None) -> None:
+    payload: Dict[str, Any] = {
+        "kind": "progress",
+        "stage": stage,
+        "status": status,
+        "ts": datetime.utcnow().isoformat() + "Z",
+    }
+    if message:
+        payload["message"] = message
+    if extra:
+        payload["extra"] = extra
+    print(json.dumps(payload, ensure_ascii=False), flush=True)
+
+
+def _set_stage(client: Any, stage: str) -> None:
+    """录制/回放 provider 按阶段组织请求；普通 Router 无 stage 属性则忽略。"""
+    if isinstance(client, (RecordingProvider, ReplayProvider)):
+        client.stage = stage
+
+
 def ensure_dirs():
     for d in ("episodes", "reports"):
         os.makedirs(d, exist_ok=True)
@@ -168,11 +178,19 @@ def cmd_run(args: argparse.Namespace) -> None:
 
     # 加载配置
     cfg = load_config(getattr(args, "config", None))
+    configure_dataset_cache(cfg)
+    configure_incremental(cfg)
+    configure_step_memo(cfg)
     # 覆盖 provider（若传入）
     if getattr(args, "provider", None) is not None:
         cfg.setdefault("llm", {})["provider"] = args.provider
+    if getattr(args, "record", False):
+        cfg.setdefault("llm", {})["record"] = True
+    replay_src = getattr(args, "replay_src", None)
+    if replay_src:
+        cfg.setdefault("llm", {})["replay"] = {"path": replay_src["recording"]}
 
-    srs = load_srs(args.srs)
+    srs = getattr(args, "srs_obj", None) or load_srs(args.srs)
     if args.data:
         srs.setdefault("inputs", {})["csv_path"] = args.data
     out_path = args.out
@@ -189,9 +207,10 @@ def cmd_run(args: argparse.Namespace) -> None:
 
     # 记录感知
     bus.append("sense.srs_loaded", {"srs": srs})
+    if replay_src:
+        bus.append("replay.source", dict(replay_src))
     max_rows = int(args.max_rows if args.max_rows is not None else cfg.get("llm", {}).get("max_rows", 80))
     csv_excerpt = sample_csv_text(srs["inputs"]["csv_path"], max_rows=max_rows)  # type: ignore
-    rows = read_csv_rows(srs["inputs"]["csv_path"])  # type: ignore
 
     # 构建插件
     planner_name = args.planner or cfg.get("defaults", {}).get("planner", "llm")
@@ -201,7 +220,10 @@ def cmd_run(args: argparse.Namespace) -> None:
 
     need_client = (planner_name == "llm" or executor_name == "llm" or critic_name == "llm" or reviser_name == "llm")
     planner, executor, critic, reviser, _ctx = build_plugins(planner_name, executor_name, critic_name, reviser_name, need_client, cfg)
-    ctx = {"csv_excerpt": csv_excerpt, "rows": rows}
+    client = _ctx.get("client")
+    # 全量行仅供 LLM 提示词分层抽样；纯本地技能执行按 csv_path 流式读取，不物化整表
+    rows = read_csv_rows(srs["inputs"]["csv_path"]) if need_client else None  # type: ignore
+    ctx = {"csv_excerpt": csv_excerpt, "rows": rows, "csv_path": srs["inputs"]["csv_path"], "workers": getattr(args, "workers", None)}
 
     emit_progress("plan", "start", f"使用 {planner.name()} 规划")
     print(f"[PLAN] 使用 {planner.name()} 生成计划…")
@@ -210,7 +232,9 @@ def cmd_run(args: argparse.Namespace) -> None:
         "temperature": (args.temp_planner if args.temp_planner is not None else cfg.get("llm", {}).get("temperature", {}).get("planner", 0.2)),
         "retries": (args.retries if args.retries is not None else cfg.get("llm", {}).get("retries", 0)),
         "prompts_dir": cfg.get("prompts", {}).get("dir", "packages/prompts"),
+        "prompt_budget": cfg.get("llm", {}).get("prompt_budget"),
     })
+    _set_stage(client, "plan")
     plan = planner.plan(srs, ctx_plan)
     payload = {"plan": plan, "impl": planner.name()}
     if hasattr(planner, "last_meta"):
@@ -234,7 +258,11 @@ def cmd_run(args: argparse.Namespace) -> None:
         "temperature": (args.temp_executor if args.temp_executor is not None else cfg.get("llm", {}).get("temperature", {}).get("executor", 0.6)),
         "retries": (args.retries if args.retries is not None else cfg.get("llm", {}).get("retries", 0)),
         "prompts_dir": cfg.get("prompts", {}).get("dir", "packages/prompts"),
+        "prompt_budget": cfg.get("llm", {}).get("prompt_budget"),
     })
+    # 逐步计时事件（exec.step）直接写入 Outbox
+    ctx_exec["emit"] = bus.append
+    _set_stage(client, "execute")
     md_text, exec_ctx = executor.execute(srs, plan, ctx_exec)
     bus.append("exec.output", {"impl": executor.name(), **exec_ctx})
     emit_progress(
@@ -251,7 +279,9 @@ def cmd_run(args: argparse.Namespace) -> None:
         "temperature": (args.temp_critic if args.temp_critic is not None else cfg.get("llm", {}).get("temperature", {}).get("critic", 0.0)),
         "retries": (args.retries if args.retries is not None else cfg.get("llm", {}).get("retries", 0)),
         "prompts_dir": cfg.get("prompts", {}).get("dir", "packages/prompts"),
+        "prompt_budget": cfg.get("llm", {}).get("prompt_budget"),
     }
+    _set_stage(client, "review")
     rv = critic.review(srs, md_text, ctx_review)
     print(f"[REVIEW] score={rv.get('score')} pass={rv.get('pass')} reasons={rv.get('reasons')}")
     pay = dict(rv)
@@ -273,13 +303,16 @@ def cmd_run(args: argparse.Namespace) -> None:
             "temperature": (args.temp_reviser if args.temp_reviser is not None else cfg.get("llm", {}).get("temperature", {}).get("reviser", 0.4)),
             "retries": (args.retries if args.retries is not None else cfg.get("llm", {}).get("retries", 0)),
             "prompts_dir": cfg.get("prompts", {}).get("dir", "packages/prompts"),
+            "prompt_budget": cfg.get("llm", {}).get("prompt_budget"),
         }
+        _set_stage(client, "revise")
         revised = reviser.revise(srs, md_text, rv, ctx_patch)
         patch_payload = {"impl": reviser.name()}
         if hasattr(reviser, "last_meta"):
             patch_payload["llm"] = getattr(reviser, "last_meta")
         bus.append("patch.revised", patch_payload)
         md_text = revised
+        _set_stage(client, "review")
         rv = critic.review(srs, md_text, ctx_review)
         print(f"[REVIEW] after patch score={rv.get('score')} pass={rv.get('pass')}")
         pay2 = dict(rv)
@@ -299,7 +332,15 @@ def cmd_run(args: argparse.Namespace) -> None:
     emit_progress("deliver", "start", "已生成报告", {"out_path": out_path})
 
     status = "success" if rv["pass"] else "failed"
-    ep_path = bus.finalize(status=status, artifacts={"output_path": out_path, "plan": plan})  # 写入 Episode 文件
+    artifacts: Dict[str, Any] = {"output_path": out_path, "plan": plan}
+    if isinstance(client, RecordingProvider):
+        rec_path = client.save(recording_path("episodes", trace_id))
+        artifacts["llm_recording"] = rec_path
+        bus.append("artifact.llm_recording", {"path": rec_path, "calls": len(client.records)})
+    if isinstance(client, ReplayProvider):
+        artifacts["replay_of"] = (replay_src or {}).get("trace_id")
+        artifacts["replay_match"] = dict(client.stats)
+    ep_path = bus.finalize(status=status, artifacts=artifacts)  # 写入 Episode 文件
     emit_progress("record", "done", "Episode 已写入", {"episode_path": ep_path, "status": status})
 
     # 如需生成可重复执行的离线脚本
@@ -372,13 +413,36 @@ def cmd_replay(args: argparse.Namespace) -> None:
     with open(trace_file, "r", encoding="utf-8") as f:
         episode = json.load(f)
 
-    if getattr(args, "rerun", False):
+    rec_path = (episode.get("artifacts", {}) or {}).get("llm_recording")
+    if getattr(args, "rerun", False) and getattr(args, "llm", False):
+        # 使用录制的 LLM 响应完整复跑 plan → execute → review → revise（新 trace，离线）
+        if not rec_path or not os.path.exists(rec_path):
+            print(f"trace 无 LLM 录制（需以 run --record 运行）: {trace_id}", file=sys.stderr)
+            sys.exit(1)
+        stages = {r.get("stage") for r in load_recording(rec_path)}
+        srs = episode.get("sense", {}) or {}
+        out_path = args.out or (episode.get("artifacts", {}) or {}).get("output_path", "reports/replay.md")
+        run_args = argparse.Namespace(
+            srs=None, srs_obj=srs, data=None, out=out_path, emit_script=False,
+            planner="llm" if "plan" in stages else "rules",
+            executor="llm" if "execute" in stages else "skills",
+            critic="llm" if "review" in stages else "rules",
+            reviser="llm" if "revise" in stages else "rules",
+            provider=None, record=False, replay_src={"trace_id": trace_id, "recording": rec_path},
+            temp_planner=None, temp_executor=None, temp_critic=None, temp_reviser=None,
+            retries=None, max_rows=None, config=getattr(args, "config", None),
+        )
+        cmd_run(run_args)
+    elif getattr(args, "rerun", False):
         # 读取计划与输入，使用本地 skills 再跑一次，产出到原 output_path
         srs = episode.get("sense", {})
         plan = episode.get("plan", {})
         out_path = args.out or (episode.get("artifacts", {}) or {}).get("output_path", "reports/replay.md")
-        rows = read_csv_rows(srs["inputs"]["csv_path"])  # type: ignore
-        md_text, _ctx = execute_local_plan(plan, rows)
+        _cfg = load_config(getattr(args, "config", None))
+        configure_dataset_cache(_cfg)
+        configure_incremental(_cfg)
+        configure_step_memo(_cfg)
+        md_text, _ctx = execute_local_plan(plan, srs["inputs"]["csv_path"])  # type: ignore
         with open(out_path, "w", encoding="utf-8") as f:
             f.write(md_text)
         print(json.dumps({"trace_id": trace_id, "status": "rerun_ok", "out": out_path}, ensure_ascii=False))
@@ -749,8 +813,7 @@ def cmd_replay_sqlite(args: argparse.Namespace) -> None:
     if not srs or "inputs" not in srs:
         print("episode 无 SRS/inputs，无法复跑", file=sys.stderr)
         sys.exit(1)
-    rows = read_csv_rows(srs["inputs"]["csv_path"])  # type: ignore
-    md_text, _ctx = execute_local_plan(plan, rows)
+    md_text, _ctx = execute_local_plan(plan, srs["inputs"]["csv_path"])  # type: ignore
     out_path = args.out or (artifacts.get("output_path") if isinstance(artifacts, dict) else None) or "reports/replay_sqlite.md"
     with open(out_path, "w", encoding="utf-8") as f:
         f.write(md_text)
@@ -771,7 +834,7 @@ def main():
     p_run.add_argument("--executor", choices=["llm", "skills"], default=None, help="执行实现选择(未指定则读 config.json)")
     p_run.add_argument("--critic", choices=["llm", "rules"], default=None, help="评审实现选择(未指定则读 config.json)")
     p_run.add_argument("--reviser", choices=["llm", "rules"], default=None, help="修补实现选择(未指定则读 config.json)")
-    p_run.add_argument("--provider", choices=["openrouter", "openai"], default=None, help="LLM provider 覆盖配置(openrouter/openai)")
+    p_run.add_argument("--provider", choices=["openrouter", "openai", "mock"], default=None, help="LLM provider 覆盖配置(openrouter/openai/mock)")
     # 运行参数化（覆盖 config.json）
     p_run.add_argument("--temp-planner", type=float, default=None, help="Planner 温度，覆盖配置")
     p_run.add_argument("--temp-executor", type=float, default=None, help="Executor 温度，覆盖配置")
@@ -779,13 +842,16 @@ def main():
     p_run.add_argument("--temp-reviser", type=float, default=None, help="Reviser 温度，覆盖配置")
     p_run.add_argument("--retries", type=int, default=None, help="LLM 重试次数，覆盖配置")
     p_run.add_argument("--max-rows", type=int, default=None, help="CSV 片段最大行数，覆盖配置")
+    p_run.add_argument("--workers", type=int, default=None, help="本地技能执行的并行进程数(>1 时 CSV 分块 map-reduce)，覆盖计划中的 workers")
     p_run.add_argument("--config", help="配置文件路径，默认 ./config.json")
+    p_run.add_argument("--record", action="store_true", help="录制 LLM 请求/响应到 episodes/<trace>.llm.jsonl，供 replay --rerun --llm 离线复跑")
     p_run.set_defaults(func=cmd_run)
 
     p_replay = sub.add_parser("replay", help="Replay saved result (by --trace or --last)")
     p_replay.add_argument("--trace", required=False, help="trace id，例如 t-xxxx")
     p_replay.add_argument("--last", action="store_true", help="使用最新的 trace 进行回放")
     p_replay.add_argument("--rerun", action="store_true", help="根据保存的 plan 使用本地 skills 重新生成报告")
+    p_replay.add_argument("--llm", action="store_true", help="与 --rerun 同用：以录制的 LLM 响应完整复跑整条轨迹")
     p_replay.add_argument("--out", required=False, help="复跑输出路径(可选)")
     p_replay.add_argument("--list", action="store_true", help="列出最近的 trace 文件")
     p_replay.add_argument("--config", help="配置文件路径，默认 ./config.json")
@@ -842,15 +908,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-def emit_progress(stage: str, status: str, message: str | None = None, extra: Dict[str, Any] | None = None) -> None:
-    payload: Dict[str, Any] = {
-        "kind": "progress",
-        "stage": stage,
-        "status": status,
-        "ts": datetime.utcnow().isoformat() + "Z",
-    }
-    if message:
-        payload["message"] = message
-    if extra:
-        payload["extra"] = extra
-    print(json.dumps(payload, ensure_ascii=False), flush=True)
@@ -10,6 +10,7 @@ SPEC:
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import json
 import os
 from datetime import datetime
@@ -30,14 +31,16 @@ except Exception as e:  # pragma: no cover
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 
 
+def _config_service(path: str | None = None) -> Any:
+    from packages.config.service import get_service  # type: ignore
+
+    # 管理台读取原始 config.json（不合并默认值），保持页面/接口展示与文件一致
+    return get_service(path or os.path.join(BASE_DIR, "config.json"), defaults=None)
+
+
 def load_config(path: str | None = None) -> Dict[str, Any]:
-    p = path or os.path.join(BASE_DIR, "config.json")
-    if os.path.exists(p):
-        try:
-            return json.load(open(p, "r", encoding="utf-8"))
-        except Exception:
-            pass
-    return {}
+    """返回只读配置快照（按 mtime 缓存，文件变化后自动换新）；需修改时先 json 深拷贝或 thaw()。"""
+    return _config_service(path).snapshot()
 
 
 JOBS: Dict[str, Any] = {}
@@ -120,7 +123,59 @@ def _run_job(job_id: str, cmd: list[str]) -> None:
 def create_app() -> Any:
     if FastAPI is None:
         raise RuntimeError("请安装 fastapi/uvicorn/jinja2 后再运行管理台")
-    app = FastAPI(title="AgentOS Console")
+    @contextlib.asynccontextmanager
+    async def _lifespan(_app: Any):
+        yield
+        # 退出时关闭 MCP 持久会话（stdio 子进程/HTTP 连接）
+        try:
+            from packages.providers.mcp_pool import shutdown_pools  # type: ignore
+
+            await shutdown_pools()
+        except Exception:
+            pass
+
+    app = FastAPI(title="AgentOS Console", lifespan=_lifespan)
+    # 配置段变化时重建相关的进程级资源
+    try:
+        from packages.providers.router import on_llm_config_change  # type: ignore
+
+        _config_service().subscribe("llm", on_llm_config_change)
+    except Exception:
+        pass
+    try:
+        from packages.providers.mcp_pool import close_all_pools  # type: ignore
+        from packages.providers.mcp_meta import meta_cache  # type: ignore
+
+        def _on_mcp_change(new: Any, old: Any) -> None:
+            # server 列表或池参数变化：丢弃旧会话与元数据缓存，下次调用按新配置重连
+            close_all_pools()
+            meta_cache().invalidate()
+
+        _config_service().subscribe("mcp", _on_mcp_change)
+    except Exception:
+        pass
+    try:
+        from packages.tools.result_cache import configure_result_cache  # type: ignore
+        from packages.tools.datasets import configure_datasets  # type: ignore
+        from packages.data.dataset_cache import configure_dataset_cache  # type: ignore
+        from packages.data.incremental import configure_incremental  # type: ignore
+        from packages.agents.step_memo import configure_step_memo  # type: ignore
+
+        def _on_tools_change(new: Any, old: Any) -> None:
+            configure_result_cache({"tools": new or {}})
+            configure_datasets({"tools": new or {}})
+            configure_dataset_cache({"tools": new or {}})
+            configure_incremental({"tools": new or {}})
+            configure_step_memo({"tools": new or {}})
+
+        configure_result_cache(_config_service().snapshot())
+        configure_datasets(_config_service().snapshot())
+        configure_dataset_cache(_config_service().snapshot())
+        configure_incremental(_config_service().snapshot())
+        configure_step_memo(_config_service().snapshot())
+        _config_service().subscribe("tools", _on_tools_change)
+    except Exception:
+        pass
     tpl_dir = os.path.join(os.path.dirname(__file__), "templates")
     templates = Jinja2Templates(directory=tpl_dir)
     # 挂载本地静态资源（CSS/JS），离线可用
@@ -425,6 +480,8 @@ def create_app() -> Any:
             shutil.copyfile(cfg_path, cfg_path + f'.bak')
         with open(cfg_path, 'w', encoding='utf-8') as f:
             json.dump(cfg, f, ensure_ascii=False, indent=2)
+        # 立即换新快照并通知订阅者（不等 mtime 轮询间隔）
+        _config_service().reload(force=True)
         # 计算 diff & 写变更日志
         def _flatten(d: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
             out: Dict[str, Any] = {}
@@ -905,8 +962,11 @@ def create_app() -> Any:
                 from kernel.bus import OutboxBus  # type: ignore
                 bus = OutboxBus(episodes_dir=os.path.join(BASE_DIR, 'episodes'))
                 trace = bus.new_trace(goal=f"chat.mcp_call {mcp_exec['server']}.{mcp_exec['tool']}")
-                bus.append('mcp.call.request', {'server': mcp_exec['server'], 'tool': mcp_exec['tool'], 'args': mcp_exec.get('args'), 'labels': {'source': 'chat', 'session': sid}})
-                bus.append('mcp.call.result', {'server': mcp_exec['server'], 'tool': mcp_exec['tool'], 'result': mcp_exec.get('result')})
+                # 批量调用（actions）逐个记录请求/结果
+                for ex in (mcp_exec.get('batch') or [mcp_exec]):
+                    bus.append('mcp.call.request', {'server': ex['server'], 'tool': ex['tool'], 'args': ex.get('args'), 'labels': {'source': 'chat', 'session': sid}})
+                    res = ex.get('result')
+                    bus.append('mcp.call.result', {'server': ex['server'], 'tool': ex['tool'], 'result': res, 'route': ex.get('route'), 'cache': res.get('cache') if isinstance(res, dict) else None})
                 bus.finalize('ok', {'result': mcp_exec.get('result')})
             except Exception:
                 pass
@@ -914,7 +974,7 @@ def create_app() -> Any:
         # 若代理声明 managed=True，则不在这里自动执行建议动作，避免与代理策略冲突。
         if (not (isinstance(result, dict) and result.get('managed'))) and isinstance(action, dict) and action.get("type") == "mcp_call" and (not mcp_exec or mcp_exec.get("error")):
             try:
-                from packages.providers.mcp_client import MCPClient  # type: ignore
+                from packages.tools.runtime import ToolRuntime  # type: ignore
                 from kernel.bus import OutboxBus  # type: ignore
                 server_id = str(action.get("server") or "api")
                 tool = str(action.get("tool") or "")
@@ -927,18 +987,12 @@ def create_app() -> Any:
                 bus = OutboxBus(episodes_dir=os.path.join(BASE_DIR, 'episodes'))
                 trace = bus.new_trace(goal=f"chat.mcp_call {server_id}.{tool_canonical}")
                 bus.append('mcp.call.request', {'server': server_id, 'tool': tool_canonical, 'args': args, 'labels': {'source': 'chat', 'session': sid}})
-                mcp = MCPClient(cfg)
-                try:
-                    res = await mcp.call_tool_async(server_id, tool_canonical, args if isinstance(args, dict) else {})
-                except Exception as e_remote:
-                    # 远程不可用时回退到本地内置实现（除非强制 require_remote）
-                    cfg2 = load_config(None)
-                    if (cfg2.get('mcp', {}) or {}).get('require_remote'):
-                        raise
-                    res = _local_mcp_call(tool_canonical, args if isinstance(args, dict) else {})
+                # 本地工具进程内直达；远程不可用时回退到本地内置实现（除非强制 require_remote）
+                rec = await ToolRuntime(cfg, base_dir=BASE_DIR).call_async(server_id, tool_canonical, args)
+                res = rec['result']
                 res_text = res.get("text") or (json.dumps(res.get("structured"), ensure_ascii=False) if res.get("structured") is not None else "<no result>")
                 mcp_exec = {"server": server_id, "tool": tool_canonical, "args": args, "result": res, 'trace_id': trace}
-                bus.append('mcp.call.result', {'server': server_id, 'tool': tool_canonical, 'result': res})
+                bus.append('mcp.call.result', {'server': server_id, 'tool': tool_canonical, 'result': res, 'route': rec.get('route'), 'cache': res.get('cache')})
                 bus.finalize('ok', {'result': res})
                 content = (content or "").rstrip() + f"\n\n[MCP] {server_id}.{tool_canonical} 执行结果:\n" + str(res_text)
             except Exception as e:
@@ -982,6 +1036,20 @@ def create_app() -> Any:
             pass
         return JSONResponse({"ok": True, "reply": content, "session": sid, "llm": meta, "action": action, "mcp": mcp_exec, "srs_path": srs_saved})
 
+    # LLM 路由指标（single-flight 在途等待者等）
+    @app.get('/api/llm/metrics')
+    async def api_llm_metrics():
+        from packages.providers.router import router_metrics  # type: ignore
+        from packages.providers.mcp_pool import pools_stats  # type: ignore
+        from packages.providers.mcp_meta import meta_cache  # type: ignore
+        from packages.tools.result_cache import result_cache  # type: ignore
+        from packages.tools.runtime import health_snapshot  # type: ignore
+        from packages.tools.datasets import datasets  # type: ignore
+        from packages.data.dataset_cache import dataset_cache  # type: ignore
+        from packages.data.incremental import incremental_store  # type: ignore
+        from packages.agents.step_memo import step_memo  # type: ignore
+        return JSONResponse({'ok': True, **router_metrics(), 'mcp_sessions': pools_stats(), 'mcp_meta_cache': meta_cache().stats(), 'tool_result_cache': result_cache().stats(), 'datasets': datasets().stats(), 'dataset_cache': dataset_cache().stats(), 'incremental': incremental_store().stats(), 'step_memo': step_memo().stats(), 'mcp_down': health_snapshot()})
+
     @app.get("/api/chat/history")
     async def api_chat_history(session: str):
         hx = get_history(CHAT_CONN, session, limit=200)
@@ -994,29 +1062,31 @@ def create_app() -> Any:
 
     # MCP 工具列表
     @app.get('/api/mcp/tools')
-    async def api_mcp_tools(server: str | None = None):
+    async def api_mcp_tools(server: str | None = None, refresh: bool = False):
+        from packages.tools.runtime import ToolRuntime, server_down  # type: ignore
+        cfg = load_config(None)
+        runtime = ToolRuntime(cfg, base_dir=BASE_DIR)
+        sid = server or 'api'
         try:
-            from packages.providers.mcp_client import MCPClient  # type: ignore
-            cfg = load_config(None)
-            mcp = MCPClient(cfg)
-            sid = server or 'api'
-            tools = await mcp.list_tools_async(sid)
+            # 已知不可用的 server 直接返回内置清单，不再等待连接超时
+            if server_down(sid) and not refresh:
+                raise RuntimeError(f'MCP server {sid} 暂不可用（最近连接失败）')
+            mcp = runtime.client
+            if refresh:
+                mcp.invalidate_meta(sid)
+            try:
+                tools = await mcp.list_tools_async(sid)
+            except Exception as e_remote:
+                runtime.note_remote_error(sid, type(e_remote).__name__)
+                raise
             # 排序并限制字段
             tools = sorted([{ 'name': t.get('name'), 'description': t.get('description') } for t in tools if isinstance(t, dict) ], key=lambda x: x.get('name') or '')
             return JSONResponse({'ok': True, 'server': sid, 'tools': tools})
         except Exception as e:
-            cfg2 = load_config(None)
-            if (cfg2.get('mcp', {}) or {}).get('require_remote'):
+            if runtime.require_remote:
                 return JSONResponse({'ok': False, 'error': f'MCP remote not available: {e}'}, status_code=502)
             # 回退到内置工具清单（无 MCP Server 时仍可用）
-            local_tools = [
-                {'name': 'fs.read_text', 'description': '读取文本文件(最多32KB)'},
-                {'name': 'fs.list_dir', 'description': '列出目录内容和元信息(限制在仓库根内)'},
-                {'name': 'data.csv_head', 'description': '读取 CSV 前 N 行'},
-                {'name': 'skills.csv_clean', 'description': '清洗 CSV 行(去空值等)'},
-                {'name': 'stats.aggregate', 'description': '按字段聚合并选 TopN'},
-                {'name': 'report.md_render', 'description': '将统计结果渲染为 Markdown'},
-            ]
+            local_tools = [{'name': t['name'], 'description': t['description']} for t in runtime.available_tools()]
             return JSONResponse({'ok': True, 'server': server or 'local', 'tools': local_tools, 'fallback': True, 'error': str(e)})
 
     # MCP 工具调用（写入 Outbox）
@@ -1035,23 +1105,16 @@ def create_app() -> Any:
         except Exception:
             trace = None
         try:
-            from packages.providers.mcp_client import MCPClient  # type: ignore
-            cfg = load_config(None)
-            mcp = MCPClient(cfg)
+            from packages.tools.runtime import ToolRuntime  # type: ignore
             # 工具别名映射（兼容简写）
             alias = { 'ls': 'fs.list_dir', 'cat': 'fs.read_text' }
             tool_canonical = alias.get(tool, tool)
-            try:
-                res = await mcp.call_tool_async(server, tool_canonical, args if isinstance(args, dict) else {})
-            except Exception as e_remote:
-                # 回退到本地实现（允许关闭回退）
-                cfg2 = load_config(None)
-                if (cfg2.get('mcp', {}) or {}).get('require_remote'):
-                    raise
-                res = _local_mcp_call(tool_canonical, args if isinstance(args, dict) else {})
+            # 统一工具运行时：本地工具进程内直达；已知不可用的远程 server 直接跳过（require_remote 时报错）
+            rec = await ToolRuntime(load_config(None), base_dir=BASE_DIR).call_async(server, tool_canonical, args)
+            res = rec['result']
             if trace:
                 try:
-                    bus.append('mcp.call.result', {'server': server, 'tool': tool_canonical, 'result': res})
+                    bus.append('mcp.call.result', {'server': server, 'tool': tool_canonical, 'result': res, 'route': rec.get('route'), 'cache': res.get('cache') if isinstance(res, dict) else None})
                     bus.finalize('ok', {'result': res})
                 except Exception:
                     pass
@@ -1065,85 +1128,6 @@ def create_app() -> Any:
                     pass
             return JSONResponse({'ok': False, 'error': str(e), 'trace_id': trace}, status_code=500)
 
-    # 本地 MCP 工具实现（作为无远程 MCP Server 的回退）
-    def _local_mcp_call(tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
-        try:
-            if tool == 'fs.read_text':
-                p = os.path.join(BASE_DIR, str(args.get('path') or ''))
-                if not os.path.isfile(p):
-                    raise FileNotFoundError(p)
-                with open(p, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read(32768)
-                return {'text': content}
-            if tool == 'fs.list_dir':
-                base = BASE_DIR
-                req = str(args.get('path') or '.')
-                p = os.path.abspath(os.path.join(base, req))
-                # 限制在 BASE_DIR 内
-                if os.path.commonpath([p, base]) != os.path.commonpath([base]):
-                    return {'structured': {'error': 'forbidden'}}
-                if not os.path.isdir(p):
-                    return {'structured': {'error': f'not a directory: {req}'}}
-                dirs, files = [], []
-                for name in (os.listdir(p)[:500] if os.path.isdir(p) else []):
-                    full = os.path.join(p, name)
-                    try:
-                        st = os.stat(full)
-                        info = {
-                            'name': name,
-                            'size': int(st.st_size),
-                            'mtime': __import__('datetime').datetime.utcfromtimestamp(st.st_mtime).isoformat()+'Z'
-                        }
-                        if os.path.isdir(full):
-                            dirs.append(info)
-                        else:
-                            files.append(info)
-                    except Exception:
-                        pass
-                rel = os.path.relpath(p, base)
-                return {'structured': {'cwd': '/' if rel == '.' else rel, 'dirs': dirs, 'files': files}}
-            if tool == 'data.csv_head':
-                import itertools
-                n = int(args.get('n') or 50)
-                p = os.path.join(BASE_DIR, str(args.get('path') or ''))
-                if not os.path.isfile(p):
-                    raise FileNotFoundError(p)
-                with open(p, 'r', encoding='utf-8', errors='ignore') as f:
-                    head = ''.join(list(itertools.islice(f, n)))
-                return {'text': head}
-            if tool == 'skills.csv_clean':
-                from skills.csv_clean import csv_clean  # type: ignore
-                import csv as _csv
-                p = os.path.join(BASE_DIR, str(args.get('path') or ''))
-                rows = []
-                with open(p, newline='', encoding='utf-8') as f:
-                    reader = _csv.DictReader(f)
-                    rows = list(reader)
-                cleaned = csv_clean(rows, **(args.get('options') or {}))
-                return {'structured': {'cleaned_count': len(cleaned)}}
-            if tool == 'stats.aggregate':
-                from skills.stats_aggregate import stats_aggregate  # type: ignore
-                rows = (args.get('rows') or [])
-                if not rows:
-                    # 尝试从 path 读取
-                    import csv as _csv
-                    p = os.path.join(BASE_DIR, str(args.get('path') or ''))
-                    with open(p, newline='', encoding='utf-8') as f:
-                        reader = _csv.DictReader(f)
-                        rows = list(reader)
-                result = stats_aggregate(rows, **({k:v for k,v in args.items() if k!='rows' and k!='path'}))
-                return {'structured': result}
-            if tool == 'report.md_render':
-                from skills.md_render import md_render  # type: ignore
-                summary = args.get('summary') or {}
-                top = args.get('top') or []
-                md = md_render(summary=summary, top=top, **({k:v for k,v in args.items() if k not in ('summary','top')}))
-                return {'text': md}
-            # 未知工具
-            return {'text': f'<unknown tool: {tool}>'}
-        except Exception as e:
-            return {'text': f'Error: {e}'}
-
     # 轻量鉴权（Admin Token + 可选 IP 白名单 + 可选 Basic Auth）
     def _require_admin(req: Request) -> None:
         cfgs = load_config(None)
@@ -2,7 +2,7 @@
 """
 SPEC:
   模块: apps.server.mcp_host
-  目标: 将本项目技能以 MCP Server 暴露（同进程可启动）
+  目标: 将本项目技能以 MCP Server 暴露（同进程可启动，或独立多进程部署）
   传输: 优先 streamable-http(:/mcp)，若不可用则提供 stdio 启动方式
   工具域划分:
     - fs.*         （工作区文件访问）
@@ -10,163 +10,280 @@ SPEC:
     - skills.*     （凝练技能卡）
     - stats.*      （统计/聚合）
     - report.*     （报告渲染）
+    - host.metrics （各工具并发/延迟指标、CSV 解析磁盘缓存命中情况）
+  实现: 工具体为 packages.tools.builtin 的同一份实现（经 tools.runtime 调用，含结果缓存）；路径相对仓库根解析；
+        data.load_csv / skills.csv_clean 返回 ds:// 句柄，stats.aggregate 等可用 dataset 参数引用（句柄仅在本进程有效）
+  执行: 工具均为 async，实际计算经 ToolHost 放到事件循环之外：
+    - cost=light → 有界线程池（--io-threads，默认 8）
+    - cost=heavy → 有界线程池（默认）或进程池（--heavy-pool process，--heavy-workers 个进程；绕开 GIL，
+                   但 ds:// 句柄落在进程池子进程内，链式调用请用线程池）
+    单个大 stats.aggregate 不再阻塞其它客户端；每工具记录 in_flight/峰值并发/次数/错误/延迟(p50/p95/max)
   运行:
-    - 单独运行: uv run python -m apps.server.mcp_host --transport streamable-http --port 3001
+    - 单独运行: uv run python -m apps.server.mcp_host --transport streamable-http --port 3001 [--workers N]
+        workers>1 时由 uvicorn 以 N 个进程共享同一端口（无状态 streamable-http，请求可落到任一进程）
     - 作为子线程: 由 apps.server.main 读取 config 后调用 start_in_background
+  约束: 启动路径只导入 MCP SDK 与 tools 层（不加载 Web 服务/LLM 提供方）；SDK 缺失时给出安装提示
 """
 
 from __future__ import annotations
 
 import argparse
 import asyncio
+import collections
 import os
-from typing import Any
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Optional
 
+from packages.data.dataset_cache import dataset_cache
 
-def create_fastmcp_server():
+
+# 多进程模式下 uvicorn 以工厂方式在子进程内重建应用，执行参数经环境变量传递
+_ENV_HEAVY_POOL = "MCP_HOST_HEAVY_POOL"
+_ENV_HEAVY_WORKERS = "MCP_HOST_HEAVY_WORKERS"
+_ENV_IO_THREADS = "MCP_HOST_IO_THREADS"
+
+_RUNTIME: Any = None
+
+
+def _call_local(tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """在当前进程（线程池线程或进程池子进程）内执行工具；进程内复用同一 ToolRuntime 与结果缓存。"""
+    global _RUNTIME
+    if _RUNTIME is None:
+        from packages.tools.runtime import ToolRuntime  # type: ignore
+
+        _RUNTIME = ToolRuntime({})
+    return _RUNTIME.call_local(tool, args)
+
+
+class _ToolStats:
+    __slots__ = ("calls", "errors", "in_flight", "peak", "total_ms", "max_ms", "recent")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent: Deque[float] = collections.deque(maxlen=512)
+
+    def snapshot(self) -> Dict[str, Any]:
+        lat = sorted(self.recent)
+
+        def _pct(q: float) -> float:
+            return round(lat[min(len(lat) - 1, int(q * len(lat)))], 1) if lat else 0.0
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_concurrency": self.peak,
+            "avg_ms": round(self.total_ms / self.calls, 1) if self.calls else 0.0,
+            "p50_ms": _pct(0.5),
+            "p95_ms": _pct(0.95),
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class ToolHost:
+    """按工具成本级别把调用派发到有界线程池/进程池，并记录每工具并发与延迟。"""
+
+    def __init__(self, heavy_pool: str = "thread", heavy_workers: Optional[int] = None, io_threads: int = 8) -> None:
+        self.heavy_pool = "process" if str(heavy_pool) == "process" else "thread"
+        self.heavy_workers = int(heavy_workers or min(4, os.cpu_count() or 1))
+        self.io_threads = int(io_threads)
+        self._executors: Dict[str, Executor] = {}
+        self._stats: Dict[str, _ToolStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ToolHost":
+        return cls(
+            heavy_pool=os.environ.get(_ENV_HEAVY_POOL, "thread"),
+            heavy_workers=int(os.environ.get(_ENV_HEAVY_WORKERS) or 0) or None,
+            io_threads=int(os.environ.get(_ENV_IO_THREADS) or 8),
+        )
+
+    def _executor(self, cost: str) -> Executor:
+        kind = "heavy" if cost == "heavy" else "light"
+        with self._lock:
+            ex = self._executors.get(kind)
+            if ex is None:
+                if kind == "heavy" and self.heavy_pool == "process":
+                    ex = ProcessPoolExecutor(max_workers=self.heavy_workers)
+                elif kind == "heavy":
+                    ex = ThreadPoolExecutor(max_workers=self.heavy_workers, thread_name_prefix="mcp-heavy")
+                else:
+                    ex = ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="mcp-io")
+                self._executors[kind] = ex
+            return ex
+
+    def _tool_stats(self, tool: str) -> _ToolStats:
+        with self._lock:
+            st = self._stats.get(tool)
+            if st is None:
+                st = self._stats[tool] = _ToolStats()
+            return st
+
+    async def call(self, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        from packages.tools.registry import get_tool_spec  # type: ignore
+
+        spec = get_tool_spec(tool)
+        args = {k: v for k, v in (args or {}).items() if v is not None}
+        st = self._tool_stats(tool)
+        with self._lock:
+            st.in_flight += 1
+            st.peak = max(st.peak, st.in_flight)
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            loop = asyncio.get_running_loop()
+            res = await loop.run_in_executor(self._executor(spec.cost if spec else "light"), _call_local, tool, args)
+            ok = not str(res.get("text") or "").startswith("Error:")
+            return res
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                st.in_flight -= 1
+                st.calls += 1
+                st.errors += 0 if ok else 1
+                st.total_ms += ms
+                st.max_ms = max(st.max_ms, ms)
+                st.recent.append(ms)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            tools = {name: st.snapshot() for name, st in sorted(self._stats.items())}
+        return {
+            "pid": os.getpid(),
+            "heavy_pool": self.heavy_pool,
+            "heavy_workers": self.heavy_workers,
+            "io_threads": self.io_threads,
+            "tools": tools,
+            # 仅本进程的计数；heavy 进程池内的命中不在此统计
+            "dataset_cache": dataset_cache().stats(),
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for ex in executors:
+            try:
+                ex.shutdown(wait=False, cancel_futures=True)
+            except Exception:
+                pass
+
+
+def create_fastmcp_server(host: Optional[ToolHost] = None, stateless_http: bool = False):
     try:
         from mcp.server.fastmcp import FastMCP  # type: ignore
     except Exception as e:
         raise RuntimeError("未安装 MCP SDK，请先: uv pip install mcp") from e
 
-    mcp = FastMCP("AgentOS Skills")
+    try:
+        mcp = FastMCP("AgentOS Skills", stateless_http=stateless_http)
+    except TypeError:
+        # 旧版 SDK 无 stateless_http 参数
+        mcp = FastMCP("AgentOS Skills")
+    th = host or ToolHost.from_env()
+
+    async def _run(tool: str, **args: Any) -> Any:
+        res = await th.call(tool, args)
+        return res["structured"] if res.get("structured") is not None else res.get("text")
 
     # fs.*
     @mcp.tool("fs.read_text")
-    def fs_read_text(path: str, max_bytes: int = 32768) -> str:
-        p = os.path.abspath(path)
-        if not os.path.isfile(p):
-            return f"<not found: {path}>"
-        with open(p, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read(int(max_bytes))
+    async def fs_read_text(path: str, max_bytes: int = 32768) -> str:
+        return await _run("fs.read_text", path=path, max_bytes=max_bytes)
 
     @mcp.tool("fs.list_dir")
-    def fs_list_dir(path: str = ".") -> dict:
+    async def fs_list_dir(path: str = ".") -> dict:
         """列出目录内容与元信息（限制在仓库根内）。"""
-        try:
-            base = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-            p = os.path.abspath(os.path.join(base, path))
-            # 安全限制：必须在 base 之内
-            if os.path.commonpath([p, base]) != os.path.commonpath([base]):
-                return {"error": "forbidden"}
-            if not os.path.isdir(p):
-                return {"error": f"not a directory: {path}"}
-            items = os.listdir(p)
-            dirs = []
-            files = []
-            for name in items[:500]:  # 限制最多 500 项
-                full = os.path.join(p, name)
-                try:
-                    st = os.stat(full)
-                    info = {
-                        "name": name,
-                        "size": int(st.st_size),
-                        "mtime": __import__("datetime").datetime.utcfromtimestamp(st.st_mtime).isoformat() + "Z",
-                    }
-                    if os.path.isdir(full):
-                        dirs.append(info)
-                    else:
-                        files.append(info)
-                except Exception:
-                    pass
-            rel = os.path.relpath(p, base)
-            return {"cwd": "/" if rel == "." else rel, "dirs": dirs, "files": files}
-        except Exception as e:
-            return {"error": str(e)}
+        return await _run("fs.list_dir", path=path)
 
     # data.*
     @mcp.tool("data.csv_head")
-    def data_csv_head(path: str, n: int = 50) -> str:
-        try:
-            out = []
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                for i, line in enumerate(f):
-                    out.append(line)
-                    if i + 1 >= int(n):
-                        break
-            return "".join(out)
-        except Exception as e:
-            return f"<error: {e}>"
+    async def data_csv_head(path: str, n: int = 50) -> str:
+        return await _run("data.csv_head", path=path, n=n)
+
+    @mcp.tool("data.load_csv")
+    async def data_load_csv(path: str) -> dict:
+        """解析 CSV，返回数据集句柄 ds://...（同进程内后续工具可直接引用）。"""
+        return await _run("data.load_csv", path=path)
 
     # skills.*
     @mcp.tool("skills.csv_clean")
-    def skills_csv_clean(path: str) -> str:
-        try:
-            import csv
-            from skills.csv_clean import csv_clean  # type: ignore
-            with open(path, newline="", encoding="utf-8") as f:
-                rows = list(csv.DictReader(f))
-            cleaned = csv_clean(rows)
-            return f"cleaned_count={len(cleaned)}"
-        except Exception as e:
-            return f"<error: {e}>"
+    async def skills_csv_clean(path: str = "", dataset: str = "", options: dict | None = None) -> dict:
+        return await _run("skills.csv_clean", path=path or None, dataset=dataset or None, options=options)
 
     # stats.*
     @mcp.tool("stats.aggregate")
-    def stats_aggregate_tool(path: str, top_n: int = 10, score_by: str = "views", title_field: str = "title") -> str:
-        try:
-            import csv
-            from skills.stats_aggregate import stats_aggregate  # type: ignore
-            with open(path, newline="", encoding="utf-8") as f:
-                rows = list(csv.DictReader(f))
-            res = stats_aggregate(rows, top_n=top_n, score_by=score_by, title_field=title_field)
-            return f"top={len(res.get('top', []))} score_by={score_by}"
-        except Exception as e:
-            return f"<error: {e}>"
+    async def stats_aggregate_tool(path: str = "", dataset: str = "", top_n: int = 10, score_by: str = "views", title_field: str = "title") -> dict:
+        return await _run("stats.aggregate", path=path or None, dataset=dataset or None, top_n=top_n, score_by=score_by, title_field=title_field)
 
     # report.*
     @mcp.tool("report.md_render")
-    def report_md_render(summary: dict, top: list, include_table: bool = True) -> str:
-        try:
-            from skills.md_render import md_render  # type: ignore
-            return md_render(summary=summary, top=top, include_table=include_table)
-        except Exception as e:
-            return f"<error: {e}>"
+    async def report_md_render(summary: dict, top: list, include_table: bool = True) -> str:
+        return await _run("report.md_render", summary=summary, top=top, include_table=include_table)
+
+    # host.*
+    @mcp.tool("host.metrics")
+    async def host_metrics() -> dict:
+        """本进程各工具的并发与延迟指标。"""
+        return th.metrics()
 
     return mcp
 
 
-async def serve_stdio():
-    # 低开销 stdio server（用于调试）
-    try:
-        import mcp.server.stdio as mcp_stdio  # type: ignore
-        from mcp.server.lowlevel import Server  # type: ignore
-        from mcp.server.models import InitializationOptions  # type: ignore
-        from mcp.server.lowlevel import NotificationOptions  # type: ignore
-    except Exception as e:
-        raise RuntimeError("未安装 MCP SDK，请先: uv pip install mcp") from e
+def create_http_app():
+    """uvicorn 工厂（--workers N 时每个子进程各自调用）：无状态 streamable-http 应用。"""
+    mcp = create_fastmcp_server(stateless_http=True)
+    return mcp.streamable_http_app()
 
-    # 使用 FastMCP 提供工具，但以低级 server 运行更灵活；简单起见直接用 stdio 快速跑通
-    mcp = create_fastmcp_server()
 
-    # FastMCP 暴露为底层 Server 的能力由 SDK 提供；此处直接运行 FastMCP 内置 run()（如有）
-    # 为兼容性，这里采用最简单路径：调用 FastMCP 对象暴露的 run_stdio()（若存在），否则提示
+async def serve_stdio():
+    mcp = create_fastmcp_server()
+    if hasattr(mcp, "run_stdio_async"):
+        return await mcp.run_stdio_async()
     if hasattr(mcp, "run_stdio"):
         # type: ignore[attr-defined]
         return await mcp.run_stdio()
-    # 回退：提示仅支持通过 CLI 启动 streamable-http
     raise RuntimeError("当前环境不支持以编程方式运行 stdio，请使用官方 CLI 或升级 SDK")
 
 
+def serve_http(host: str = "127.0.0.1", port: int = 3001, workers: int = 1) -> None:
+    """前台运行 streamable-http；workers>1 时 uvicorn 以工厂方式启动 N 个进程共享端口。"""
+    try:
+        import uvicorn  # type: ignore
+    except Exception as e:
+        raise RuntimeError("未安装 uvicorn，请先: uv pip install uvicorn") from e
+    if int(workers) > 1:
+        uvicorn.run("apps.server.mcp_host:create_http_app", factory=True, host=host, port=int(port), workers=int(workers), log_level="warning")
+    else:
+        uvicorn.run(create_fastmcp_server().streamable_http_app(), host=host, port=int(port), log_level="warning")
+
+
 def start_in_background(port: int = 3001) -> None:
     """尝试在后台启动 streamable-http Server（同进程不同端口）。"""
     try:
-        import threading
 
         def _run() -> None:
             try:
-                # 优先尝试 streamable-http 服务器
-                # 注意：具体 API 以 SDK 版本为准，以下调用可能需要按实际 SDK 调整
-                from mcp.server.streamable_http import serve  # type: ignore
+                import uvicorn  # type: ignore
 
-                mcp = create_fastmcp_server()
-                # 假设 serve(mcp, host, port) 风格；若不同请据实际 SDK 修改
-                serve(mcp, host="127.0.0.1", port=int(port))
+                app = create_fastmcp_server().streamable_http_app()
+                server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=int(port), log_level="warning"))
+                # 子线程内不安装信号处理
+                server.install_signal_handlers = lambda: None  # type: ignore[method-assign]
+                server.run()
             except Exception:
                 # 回退日志，不影响主进程
                 pass
 
-        threading.Thread(target=_run, daemon=True).start()
+        threading.Thread(target=_run, daemon=True, name="mcp-host").start()
     except Exception:
         pass
 
@@ -174,20 +291,29 @@ def start_in_background(port: int = 3001) -> None:
 def main() -> None:
     ap = argparse.ArgumentParser()
     ap.add_argument("--transport", choices=["streamable-http", "stdio"], default="streamable-http")
+    ap.add_argument("--host", default="127.0.0.1")
     ap.add_argument("--port", type=int, default=3001)
+    ap.add_argument("--workers", type=int, default=1, help="服务进程数（共享同一端口，无状态 HTTP）")
+    ap.add_argument("--heavy-pool", choices=["thread", "process"], default="thread", help="cost=heavy 工具的执行池")
+    ap.add_argument("--heavy-workers", type=int, default=0, help="heavy 执行池大小（默认 min(4, CPU)）")
+    ap.add_argument("--io-threads", type=int, default=8, help="cost=light 工具的线程池大小")
+    ap.add_argument("--dataset-cache-dir", default=None, help="CSV 解析结果磁盘缓存目录（默认 .cache/datasets，多进程共享）")
     args = ap.parse_args()
 
+    os.environ[_ENV_HEAVY_POOL] = args.heavy_pool
+    if args.heavy_workers:
+        os.environ[_ENV_HEAVY_WORKERS] = str(args.heavy_workers)
+    os.environ[_ENV_IO_THREADS] = str(args.io_threads)
+    if args.dataset_cache_dir:
+        # 经环境变量传给 uvicorn 工作进程与 heavy 进程池
+        os.environ["DATASET_CACHE_DIR"] = args.dataset_cache_dir
+
     if args.transport == "stdio":
         asyncio.run(serve_stdio())
     else:
-        # 尝试直接启动 streamable-http；若 SDK 暂不支持此编程接口，请改用官方 CLI
-        start_in_background(args.port)
-        print(f"[MCP] streamable-http on 127.0.0.1:{args.port}")
+        print(f"[MCP] streamable-http on {args.host}:{args.port} (workers={args.workers}, heavy={args.heavy_pool})")
         try:
-            # 阻塞等待（保持进程存活）
-            import time
-            while True:
-                time.sleep(3600)
+            serve_http(args.host, args.port, args.workers)
         except KeyboardInterrupt:
             pass
 
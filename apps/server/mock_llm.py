@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: apps.server.mock_llm
+  目标: 独立的 OpenAI 兼容本地 HTTP 服务（标准库实现），用 Mock 提供方生成回复，
+        以便离线压测完整 HTTP 客户端路径（连接池、限流、429/5xx 重试、端点切换）。
+  接口:
+    - POST /v1/chat/completions 与 /api/v1/chat/completions（OpenRouter 路径）
+      请求体 {model, messages, temperature?, max_tokens?, stream?}；stream=true 时以 SSE 返回 chunk
+    - GET  /v1/models
+    - GET  /metrics  -> {requests, errors, rate_limited, inflight}
+  用法:
+    python -m apps.server.mock_llm --port 8799 --latency-mean 200 --latency-sigma 0.5 --dist lognormal --rate-limit-rate 0.05
+    客户端: llm.provider=openai, llm.base_url=http://127.0.0.1:8799/v1，OPENAI_API_KEY 任意非空值
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from packages.providers.interfaces import ProviderHTTPError  # type: ignore  # noqa: E402
+from packages.providers.mock_client import MockLLMClient  # type: ignore  # noqa: E402
+
+
+class _Metrics:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.data = {"requests": 0, "errors": 0, "rate_limited": 0, "inflight": 0}
+
+    def inc(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.data[key] += n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.data)
+
+
+def make_handler(client: MockLLMClient, metrics: _Metrics) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive，便于测量客户端连接复用
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            return
+
+        def _json(self, status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> None:
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path.rstrip("/").endswith("/models"):
+                self._json(200, {"object": "list", "data": [{"id": client.model, "object": "model", "owned_by": "mock"}]})
+            elif self.path.rstrip("/") == "/metrics":
+                self._json(200, metrics.snapshot())
+            else:
+                self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self) -> None:  # noqa: N802
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            try:
+                n = int(self.headers.get("Content-Length") or 0)
+                req = json.loads(self.rfile.read(n) or b"{}")
+            except Exception:
+                self._json(400, {"error": {"message": "invalid json"}})
+                return
+            messages = req.get("messages") or []
+            model = req.get("model") or client.model
+            rid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            metrics.inc("requests")
+            metrics.inc("inflight")
+            try:
+                if req.get("stream"):
+                    self._stream(rid, model, messages, req)
+                    return
+                try:
+                    content, meta = client.chat_with_meta(
+                        messages, temperature=float(req.get("temperature", 0.2)), max_tokens=req.get("max_tokens"), retries=0
+                    )
+                except ProviderHTTPError as e:
+                    self._error(e)
+                    return
+                self._json(
+                    200,
+                    {
+                        "id": rid,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                        "usage": meta.get("usage"),
+                    },
+                    {"x-request-id": rid},
+                )
+            finally:
+                metrics.inc("inflight", -1)
+
+        def _error(self, e: ProviderHTTPError) -> None:
+            metrics.inc("rate_limited" if e.status_code == 429 else "errors")
+            headers = {"Retry-After": str(int(e.retry_after or 1))} if e.status_code == 429 else None
+            self._json(int(e.status_code or 500), {"error": {"message": str(e), "code": e.status_code}}, headers)
+
+        def _stream(self, rid: str, model: str, messages: Any, req: Dict[str, Any]) -> None:
+            chunks = client.stream_chat(messages, temperature=float(req.get("temperature", 0.2)), max_tokens=req.get("max_tokens"))
+            try:
+                first = next(chunks, None)
+            except ProviderHTTPError as e:
+                self._error(e)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def _send(delta: Dict[str, Any], finish: Optional[str] = None) -> None:
+                obj = {
+                    "id": rid,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                }
+                self.wfile.write(f"data: {json.dumps(obj, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            if first is not None:
+                _send({"role": "assistant", "content": first})
+            for c in chunks:
+                _send({"content": c})
+            _send({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def serve(host: str, port: int, options: Dict[str, Any], model: Optional[str] = None) -> ThreadingHTTPServer:
+    """创建（未启动的）服务实例；调用方负责 serve_forever/shutdown。"""
+    client = MockLLMClient(model=model, options=options)
+    httpd = ThreadingHTTPServer((host, port), make_handler(client, _Metrics()))
+    httpd.daemon_threads = True
+    return httpd
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="OpenAI 兼容的本地 Mock LLM 服务")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8799)
+    ap.add_argument("--model", default="mock-1")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--dist", choices=["fixed", "uniform", "normal", "lognormal"], default="fixed", help="延迟分布")
+    ap.add_argument("--latency-mean", type=float, default=0.0, help="延迟均值/中位数(ms)")
+    ap.add_argument("--latency-sigma", type=float, default=0.0, help="normal 为 ms 标准差；lognormal 为对数标准差")
+    ap.add_argument("--latency-min", type=float, default=0.0)
+    ap.add_argument("--latency-max", type=float, default=None)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="注入 503 的概率")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="注入 429 的概率")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="429 的 Retry-After 秒数")
+    ap.add_argument("--chunk-chars", type=int, default=16, help="流式每块字符数")
+    ap.add_argument("--inter-chunk-ms", type=float, default=0.0, help="流式块间间隔(ms)")
+    args = ap.parse_args()
+
+    latency: Dict[str, Any] = {"dist": args.dist, "mean": args.latency_mean, "sigma": args.latency_sigma, "min": args.latency_min}
+    if args.latency_max is not None:
+        latency["max"] = args.latency_max
+    options = {
+        "seed": args.seed,
+        "latency_ms": latency,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "retry_after_sec": args.retry_after,
+        "chunk_chars": args.chunk_chars,
+        "inter_chunk_ms": args.inter_chunk_ms,
+    }
+    httpd = serve(args.host, args.port, options, model=args.model)
+    print(json.dumps({"status": "listening", "url": f"http://{args.host}:{args.port}/v1"}, ensure_ascii=False), flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
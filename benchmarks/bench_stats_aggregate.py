@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: benchmarks/bench_stats_aggregate
+  目标: 对比 stats_aggregate 改写前（两次解析 + 全量排序）与改写后（单次解析 + 有界堆）的耗时
+  运行: python benchmarks/bench_stats_aggregate.py [--sizes 1e5,1e6,1e7] [--top-n 10] [--repeat 3]
+  输出: 每个规模一行 JSON {rows, legacy_s, kernel_s, numpy_s, stream_s, speedup}；stream 为生成器输入（不物化行列表）；
+        numpy_s 仅在可导入 numpy 时给出（backend="numpy"）
+  约束: 仅用标准库；1e7 行的列表约需数 GB 内存，可用 --skip-legacy 只测流式版本
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, Iterator, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from skills.stats_aggregate import _to_number, stats_aggregate, stats_aggregate_stream  # type: ignore
+
+
+def legacy_stats_aggregate(rows: List[Dict[str, str]], top_n: int = 10, score_by: str = "views", title_field: str = "title") -> Dict[str, Any]:
+    n = len(rows)
+    total = sum(_to_number(r.get(score_by, 0)) for r in rows)
+    avg = (total / n) if n else 0.0
+    ranked = sorted(
+        ({"title": r.get(title_field, ""), "score": _to_number(r.get(score_by, 0))} for r in rows),
+        key=lambda x: x["score"],
+        reverse=True,
+    )
+    top = [{"rank": i + 1, **item} for i, item in enumerate(ranked[: max(0, int(top_n))]) if item["title"]]
+    return {"summary": {"count": n, "total": round(total, 2), "avg": round(avg, 2)}, "top": top}
+
+
+def gen_rows(n: int, seed: int = 0) -> Iterator[Dict[str, str]]:
+    rnd = random.Random(seed)
+    for i in range(n):
+        v = rnd.randint(0, 2_000_000)
+        yield {"title": f"Video {i}", "views": f"{v:,}" if i % 7 == 0 else str(v)}
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1e5,1e6,1e7")
+    ap.add_argument("--top-n", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--skip-legacy", action="store_true")
+    args = ap.parse_args()
+
+    for size in [int(float(s)) for s in args.sizes.split(",") if s.strip()]:
+        out: Dict[str, Any] = {"rows": size}
+        stream_s = _best(lambda: stats_aggregate_stream(gen_rows(size), top_n=args.top_n), 1)
+        if not args.skip_legacy:
+            rows = list(gen_rows(size))
+            legacy_s = _best(lambda: legacy_stats_aggregate(rows, top_n=args.top_n), args.repeat)
+            kernel_s = _best(lambda: stats_aggregate(rows, top_n=args.top_n, backend="python"), args.repeat)
+            try:
+                import numpy  # noqa: F401
+
+                out["numpy_s"] = round(_best(lambda: stats_aggregate(rows, top_n=args.top_n, backend="numpy"), args.repeat), 3)
+            except ImportError:
+                pass
+            res = stats_aggregate(rows, top_n=args.top_n, backend="python")
+            res["summary"].pop("parse_errors")
+            assert res == legacy_stats_aggregate(rows, top_n=args.top_n)
+            del rows
+            out.update(legacy_s=round(legacy_s, 3), kernel_s=round(kernel_s, 3), speedup=round(legacy_s / kernel_s, 2))
+        # 流式计时含行生成开销，仅作内存/端到端参考
+        out["stream_s"] = round(stream_s, 3)
+        print(json.dumps(out), flush=True)
+
+
+if __name__ == "__main__":
+    main()
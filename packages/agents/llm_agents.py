@@ -4,22 +4,46 @@ SPEC:
   模块: agents.llm_agents
   目标: LLM 驱动的 Planner/Executor/Critic/Reviser 实现
   依赖: packages.providers.openrouter_client.OpenRouterClient
+  提示词: 各段落经 prompts.budget 按 context.prompt_budget 拟合，估算写入 meta.prompt
 """
 
 from __future__ import annotations
 
-import json
 import time
 import uuid
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple
 
 from packages.agents.interfaces import Planner, Executor, Critic, Reviser
 from packages.agents.registry import register
 from packages.providers.interfaces import LLMChatProvider
 from packages.providers.openrouter_client import extract_json_block
+from packages.prompts.budget import csv_candidates, fit_sections, json_candidates, report_candidates, srs_candidates
 from packages.prompts.loader import load_pair, render
 
 
+def _fit_prompt(
+    client: Any, context: Dict[str, Any], system: str, template: str, candidates: Dict[str, List[Any]]
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """按 context.prompt_budget 拟合各段落，返回 (模板变量, 预算 meta)。"""
+    return fit_sections(candidates, context.get("prompt_budget"), getattr(client, "model", None), fixed_text=system + template)
+
+
+def _csv_section(srs: Dict[str, Any], context: Dict[str, Any]) -> List[Any]:
+    pb = context.get("prompt_budget") or {}
+    return csv_candidates(
+        context.get("csv_excerpt", ""),
+        rows=context.get("rows"),
+        score_by=(srs.get("params", {}) or {}).get("score_by"),
+        sample_rows=int(pb.get("csv_sample_rows", 40)),
+    )
+
+
+def _report_section(client: Any, report_md: str, context: Dict[str, Any]) -> List[Any]:
+    pb = context.get("prompt_budget") or {}
+    limit = (pb.get("sections", {}) or {}).get("REPORT_MD")
+    return report_candidates(report_md, getattr(client, "model", None), int(limit) if limit else None)
+
+
 @register("planner", "llm")
 class PlannerLLM(Planner):
     def __init__(self, client: LLMChatProvider) -> None:
@@ -27,22 +51,24 @@ class PlannerLLM(Planner):
         self.last_meta: Dict[str, Any] = {}
 
     def plan(self, srs: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
-        csv_excerpt: str = context.get("csv_excerpt", "")
         prompts_dir: str = context.get("prompts_dir", "packages/prompts")
         sys_t, usr_t = load_pair(prompts_dir, "planner")
         system = sys_t or (
             "你是 Planner。请仅输出 JSON，不要额外文本。根据给定 SRS 和 CSV 片段，生成一个计划对象。"
         )
-        user = render(
-            usr_t or "SRS:\n{{SRS}}\n\nCSV_Excerpt:\n{{CSV_EXCERPT}}",
-            {"SRS": json.dumps(srs, ensure_ascii=False), "CSV_EXCERPT": csv_excerpt},
-        )
+        template = usr_t or "SRS:\n{{SRS}}\n\nCSV_Excerpt:\n{{CSV_EXCERPT}}"
+        vars_, pmeta = _fit_prompt(self.client, context, system, template, {
+            "SRS": srs_candidates(srs),
+            "CSV_EXCERPT": _csv_section(srs, context),
+        })
+        user = render(template, vars_)
         temp = float(context.get("temperature", 0.2))
         retries = int(context.get("retries", 0))
         content, meta = self.client.chat_with_meta([
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ], temperature=temp, retries=retries)
+        meta = {**(meta or {}), "prompt": pmeta}
         self.last_meta = meta
         obj = extract_json_block(content)
         plan = obj.get("plan") or obj
@@ -57,14 +83,16 @@ class ExecutorLLM(Executor):
         self.last_meta: Dict[str, Any] = {}
 
     def execute(self, srs: Dict[str, Any], plan: Dict[str, Any], context: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
-        csv_excerpt: str = context.get("csv_excerpt", "")
         prompts_dir: str = context.get("prompts_dir", "packages/prompts")
         sys_t, usr_t = load_pair(prompts_dir, "executor")
         system = sys_t or "你是执行器/报告生成器。"
-        user = render(
-            usr_t or "SRS:\n{{SRS}}\n\nPlan:\n{{PLAN}}\n\nCSV:\n{{CSV_EXCERPT}}",
-            {"SRS": json.dumps(srs, ensure_ascii=False), "PLAN": json.dumps(plan, ensure_ascii=False), "CSV_EXCERPT": csv_excerpt},
-        )
+        template = usr_t or "SRS:\n{{SRS}}\n\nPlan:\n{{PLAN}}\n\nCSV:\n{{CSV_EXCERPT}}"
+        vars_, pmeta = _fit_prompt(self.client, context, system, template, {
+            "SRS": srs_candidates(srs),
+            "PLAN": json_candidates(plan, keep=("id", "steps")),
+            "CSV_EXCERPT": _csv_section(srs, context),
+        })
+        user = render(template, vars_)
         t0 = time.time()
         temp = float(context.get("temperature", 0.6))
         retries = int(context.get("retries", 0))
@@ -72,6 +100,7 @@ class ExecutorLLM(Executor):
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ], temperature=temp, retries=retries)
+        meta = {**(meta or {}), "prompt": pmeta}
         self.last_meta = meta
         latency_ms = int((time.time() - t0) * 1000)
         return md, {"metrics": {"latency_ms": latency_ms, "retries": meta.get("attempts", 1) - 1, "cost": 0.0}, "llm": meta}
@@ -87,16 +116,19 @@ class CriticLLM(Critic):
         prompts_dir: str = context.get("prompts_dir", "packages/prompts")
         sys_t, usr_t = load_pair(prompts_dir, "critic")
         system = sys_t or "你是评审器。"
-        user = render(
-            usr_t or "SRS:\n{{SRS}}\n\nREPORT:\n{{REPORT_MD}}",
-            {"SRS": json.dumps(srs, ensure_ascii=False), "REPORT_MD": report_md},
-        )
+        template = usr_t or "SRS:\n{{SRS}}\n\nREPORT:\n{{REPORT_MD}}"
+        vars_, pmeta = _fit_prompt(self.client, context, system, template, {
+            "SRS": srs_candidates(srs, keep_acceptance=True),
+            "REPORT_MD": _report_section(self.client, report_md, context),
+        })
+        user = render(template, vars_)
         temp = float(context.get("temperature", 0.0))
         retries = int(context.get("retries", 0))
         content, meta = self.client.chat_with_meta([
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ], temperature=temp, retries=retries)
+        meta = {**(meta or {}), "prompt": pmeta}
         self.last_meta = meta
         obj = extract_json_block(content)
         obj.setdefault("score", 0.0)
@@ -116,15 +148,19 @@ class ReviserLLM(Reviser):
         prompts_dir: str = context.get("prompts_dir", "packages/prompts")
         sys_t, usr_t = load_pair(prompts_dir, "reviser")
         system = sys_t or "你是审稿改写器。"
-        user = render(
-            usr_t or "SRS:\n{{SRS}}\n\nCRITIC:\n{{CRITIC}}\n\nREPORT:\n{{REPORT_MD}}",
-            {"SRS": json.dumps(srs, ensure_ascii=False), "CRITIC": json.dumps(review_result, ensure_ascii=False), "REPORT_MD": report_md},
-        )
+        template = usr_t or "SRS:\n{{SRS}}\n\nCRITIC:\n{{CRITIC}}\n\nREPORT:\n{{REPORT_MD}}"
+        vars_, pmeta = _fit_prompt(self.client, context, system, template, {
+            "SRS": srs_candidates(srs, keep_acceptance=True),
+            "CRITIC": json_candidates(review_result, keep=("pass", "score", "reasons")),
+            "REPORT_MD": _report_section(self.client, report_md, context),
+        })
+        user = render(template, vars_)
         temp = float(context.get("temperature", 0.4))
         retries = int(context.get("retries", 0))
         revised, meta = self.client.chat_with_meta([
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ], temperature=temp, retries=retries)
+        meta = {**(meta or {}), "prompt": pmeta}
         self.last_meta = meta
         return revised
@@ -5,17 +5,19 @@ SPEC:
   目标: 提供基于 MCP 的执行器，实现通过 MCP 工具完成报告生成等动作。
   说明: 计划格式支持：
     - plan["mcp"] = { server: str, tool: str, args: dict }
-    - 或 steps[*] 中存在 { op: "mcp.tool", server, tool, args }
+    - 或 steps[*] 中存在 { op: "mcp.tool", server, tool, args }（多个步骤时并发执行，结果按步骤顺序拼接）
+  对话: MCPConversationAgent 支持 {"action":{type:'mcp_call',...}} 与批量 {"actions":[...]}；
+        工具调用经 tools.runtime.ToolRuntime（本地工具进程内直达，远程并发 + 失败回退），结果一并注入下一轮
   输出: 返回 (markdown_text, ctx)；若工具返回 structuredContent 则尽量提取 markdown 字段或序列化为文本。
   依赖: packages.providers.mcp_client.MCPClient
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
 import time
 from typing import Any, Dict, Tuple, List, Optional
-import os
 
 from packages.agents.interfaces import Executor
 from packages.agents.registry import register
@@ -41,16 +43,18 @@ class MCPConversationAgent:
 
         self.cfg = cfg
         self.router = LLMRouter(cfg)
+        from packages.tools.runtime import ToolRuntime
+
         self.mcp = MCPClient(cfg)
+        self.runtime = ToolRuntime(cfg, client=self.mcp)
         ms = (cfg.get("mcp", {}) or {}).get("servers", []) or []
         self.default_server: str = (ms[0].get("id") if (isinstance(ms, list) and ms and isinstance(ms[0], dict)) else None) or "api"
         # 是否必须使用远程 MCP（不允许本地回退）
         self.require_remote: bool = bool((cfg.get("mcp", {}) or {}).get("require_remote"))
         # 是否自动连续执行多步（默认开启；可在 config.json 的 agent.auto_proceed 关闭）
         self.auto_proceed: bool = bool((cfg.get("agent", {}) or {}).get("auto_proceed", True))
-        self._cache_ttl: float = float((cfg.get("mcp", {}) or {}).get("cache_ttl_sec", 180.0))
-        self._tools_cache: Dict[str, Tuple[float, str]] = {}
-        self._prompt_cache: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        # 单轮最多并发执行的工具调用数（actions 批量）
+        self.max_batch: int = int(((cfg.get("mcp", {}) or {}).get("batch") or {}).get("max_calls", 8))
 
     @staticmethod
     def _safe_args_preview(args: Any) -> str:
@@ -82,74 +86,41 @@ class MCPConversationAgent:
         except Exception:
             return str(preview)
 
-    def _cache_get(self, store: Dict[Any, Tuple[float, str]], key: Any) -> Optional[str]:
-        item = store.get(key)
-        if not item:
-            return None
-        ts, value = item
-        if (time.time() - ts) > max(0.0, self._cache_ttl):
-            store.pop(key, None)
-            return None
-        return value
-
-    def _cache_put(self, store: Dict[Any, Tuple[float, str]], key: Any, value: str) -> None:
-        store[key] = (time.time(), value)
-
-    def _local_mcp_call(self, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
-        """在远程 MCP 不可用时的最小本地回退实现（仅覆盖常用工具）。"""
-        base = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-        try:
-            if tool == 'fs.read_text':
-                p = os.path.join(base, str(args.get('path') or ''))
-                if not os.path.isfile(p):
-                    return {'text': f'<not found: {args.get("path")!r}>'}
-                with open(p, 'r', encoding='utf-8', errors='ignore') as f:
-                    return {'text': f.read(32768)}
-            if tool == 'fs.list_dir':
-                req = str(args.get('path') or '.')
-                p = os.path.abspath(os.path.join(base, req))
-                # 限制在 base 内
-                if os.path.commonpath([p, base]) != os.path.commonpath([base]):
-                    return {'structured': {'error': 'forbidden'}}
-                if not os.path.isdir(p):
-                    return {'structured': {'error': f'not a directory: {req}'}}
-                dirs, files = [], []
-                for name in (os.listdir(p)[:500] if os.path.isdir(p) else []):
-                    full = os.path.join(p, name)
-                    try:
-                        st = os.stat(full)
-                        info = {
-                            'name': name,
-                            'size': int(st.st_size),
-                            'mtime': __import__('datetime').datetime.utcfromtimestamp(st.st_mtime).isoformat()+'Z',
-                        }
-                        if os.path.isdir(full):
-                            dirs.append(info)
-                        else:
-                            files.append(info)
-                    except Exception:
-                        pass
-                rel = os.path.relpath(p, base)
-                return {'structured': {'cwd': '/' if rel == '.' else rel, 'dirs': dirs, 'files': files}}
-            if tool == 'data.csv_head':
-                import itertools
-                n = int(args.get('n') or 50)
-                p = os.path.join(base, str(args.get('path') or ''))
-                if not os.path.isfile(p):
-                    return {'text': f'<not found: {args.get("path")!r}>'}
-                with open(p, 'r', encoding='utf-8', errors='ignore') as f:
-                    head = ''.join(list(itertools.islice(f, n)))
-                return {'text': head}
-        except Exception as e:
-            return {'text': f'<local fallback error: {e}>'}
-        return {'text': f'<unknown tool: {tool}>'}
+    _ALIAS = {'ls': 'fs.list_dir', 'list_files': 'fs.list_dir', 'cat': 'fs.read_text'}
+
+    def _collect_calls(self, obj: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """从 {"action":{type:'mcp_call',...}} 或 {"actions":[...]} 中收集待执行的工具调用（工具名已规范化）。"""
+        raw: List[Any] = []
+        implied = None  # actions 列表内的条目可省略 type
+        if isinstance(obj.get("actions"), list):
+            raw, implied = list(obj["actions"]), "mcp_call"
+        elif isinstance(obj.get("action"), dict):
+            raw = [obj["action"]]
+        calls: List[Dict[str, Any]] = []
+        for a in raw[: self.max_batch]:
+            if not isinstance(a, dict) or a.get("type", implied) != "mcp_call" or not a.get("tool"):
+                continue
+            tool = str(a.get("tool"))
+            calls.append({
+                "server": str(a.get("server") or self.default_server),
+                "tool": self._ALIAS.get(tool, tool),
+                "args": a.get("args") if isinstance(a.get("args"), dict) else {},
+            })
+        return calls
+
+    async def _execute_calls(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """经统一工具运行时并发执行：本地工具进程内直达，远程失败回退本地；require_remote 时抛出首个错误。"""
+        recs = await self.runtime.call_many_async(calls)
+        out: List[Dict[str, Any]] = []
+        for rec in recs:
+            if "error" in rec:
+                raise RuntimeError(f"{rec['server']}.{rec['tool']}: {rec['error']}")
+            out.append({"server": rec["server"], "tool": rec["tool"], "args": rec["args"], "result": rec["result"], "route": rec.get("route")})
+        return out
 
     async def _list_tools_desc(self) -> str:
-        cache_key = self.default_server
-        cached = self._cache_get(self._tools_cache, cache_key)
-        if cached:
-            return cached
-        desc = "可用 MCP 工具（本地回退）: fs.list_dir, fs.read_text, data.csv_head, skills.csv_clean, stats.aggregate, report.md_render"
+        # 工具清单与提示经 MCPClient 的进程级元数据缓存（跨请求共享，list_changed 时失效）
+        desc = "可用 MCP 工具（本地回退）: " + ", ".join(t["name"] for t in self.runtime.available_tools())
         try:
             tools = await self.mcp.list_tools_async(self.default_server)
             names = [t.get("name") for t in tools if isinstance(t, dict) and t.get("name")]
@@ -157,33 +128,26 @@ class MCPConversationAgent:
                 desc = f"可用 MCP 工具（server={self.default_server}）: " + ", ".join(names[:30])
         except Exception:
             pass
-        self._cache_put(self._tools_cache, cache_key, desc)
         return desc
 
     async def _build_system(self) -> str:
         # 优先使用 MCP 的 prompts: chat.system（若不存在则动态拼接 tools 描述）
-        tools_desc = await self._list_tools_desc()
+        # 工具清单与提示模板互不依赖，并发获取（缓存未命中时省一次往返）
+        tools_desc, prom = await asyncio.gather(
+            self._list_tools_desc(),
+            self.mcp.get_prompt_async(self.default_server, "chat.system", arguments={}),  # type: ignore
+            return_exceptions=True,
+        )
         sys_content = None
-        cache_key = (self.default_server, "chat.system")
-        cached_prompt = self._cache_get(self._prompt_cache, cache_key)
-        if cached_prompt:
-            sys_content = cached_prompt + "\n\n" + tools_desc
-        else:
-            try:
-                # 尝试读取 MCP 提示模板（异步版本，避免事件循环冲突）
-                prom = await self.mcp.get_prompt_async(self.default_server, "chat.system", arguments={})  # type: ignore
-                text = prom.get("text") or ""
-                if text:
-                    self._cache_put(self._prompt_cache, cache_key, text)
-                    sys_content = text + "\n\n" + tools_desc
-            except Exception:
-                sys_content = None
+        if isinstance(prom, dict) and prom.get("text"):
+            sys_content = str(prom["text"]) + "\n\n" + tools_desc
         if not sys_content:
             # 使用单引号包裹，避免 JSON 字段中的双引号转义问题
             sys_content = (
                 '你是 AgentOS 助手。请用简洁中文回答。若识别到可执行任务，返回一个JSON对象：{"action":{...},"srs":{...}}。'
                 '支持两类 action: 1) {type:\'run\', args:{srs_path,data_path,out,planner,executor,critic,reviser,provider}}；'
                 "2) {type:'mcp_call', server:'" + self.default_server + "', tool:'<tool_name>', args:{...}}。"
+                '若需要多个相互独立的读取（如列目录、查看多个文件），可一次返回 {"actions":[{type:\'mcp_call\',...},...]}，将并发执行。'
                 '生成答案时：不要直接粘贴大段原始数据；优先给结论/要点/下一步建议，必要时附少量样例(<=10行)。\n'
                 "JSON 之外可附加说明。\n" + tools_desc
             )
@@ -230,6 +194,7 @@ class MCPConversationAgent:
 
             # 解析 JSON 动作（优先从 LLM 回复，失败时尝试从用户文本）
             action = None
+            calls: List[Dict[str, Any]] = []
             obj: Optional[Dict[str, Any]] = None
             try:
                 obj = extract_json_block(content)
@@ -250,48 +215,43 @@ class MCPConversationAgent:
                     with open(srs_path, "w", encoding="utf-8") as f:
                         json.dump(obj["srs"], f, ensure_ascii=False, indent=2)
                     srs_saved = srs_path
+                calls = self._collect_calls(obj)
                 if obj.get("action"):
                     action = obj["action"]
-                    if isinstance(action, dict) and action.get("type") == "mcp_call":
-                        progress.append(
-                            f"[{loop_idx+1}] 计划调用: "
-                            f"{str(action.get('server') or self.default_server)}.{action.get('tool')} "
-                            f"args={self._safe_args_preview(action.get('args') or {})}"
-                        )
+                elif calls:
+                    action = {"type": "mcp_batch", "actions": calls}
+                for c in calls:
+                    progress.append(
+                        f"[{loop_idx+1}] 计划调用: "
+                        f"{str(c.get('server') or self.default_server)}.{c.get('tool')} "
+                        f"args={self._safe_args_preview(c.get('args') or {})}"
+                    )
 
             # 如无 mcp_call，则把 content 作为最终回复返回
-            if not (isinstance(action, dict) and action.get("type") == "mcp_call"):
+            if not calls:
                 progress.append(f"[{loop_idx+1}] 无需调用工具，直接回答")
                 final_reply = content
                 break
 
-            # 执行 mcp_call，并把结果注入到对话，再进入下一轮
-            server_id = str(action.get("server") or self.default_server)
-            tool = str(action.get("tool") or "")
-            args = action.get("args") or {}
-            if not tool:
-                final_reply = content
-                break
+            # 执行 mcp_call（批量时并发），并把结果一并注入到对话，再进入下一轮
             try:
-                alias = { 'ls': 'fs.list_dir', 'list_files': 'fs.list_dir', 'cat': 'fs.read_text' }
-                tool_canonical = alias.get(tool, tool)
-                try:
-                    res = await self.mcp.call_tool_async(server_id, tool_canonical, args if isinstance(args, dict) else {})
-                except Exception:
-                    if self.require_remote:
-                        raise
-                    # 本地回退
-                    res = self._local_mcp_call(tool_canonical, args if isinstance(args, dict) else {})
-                mcp_exec = {"server": server_id, "tool": tool_canonical, "args": args, "result": res}
-                res_text = res.get("text") or (json.dumps(res.get("structured"), ensure_ascii=False) if res.get("structured") is not None else "<no result>")
-                # 减少噪音：限制注入长度
-                if isinstance(res_text, str) and len(res_text) > 1200:
-                    res_text = res_text[:1200] + "\n...[truncated]..."
-                snippet = (res_text[:160] + ("…" if isinstance(res_text, str) and len(res_text) > 160 else "")) if isinstance(res_text, str) else str(res_text)
-                progress.append(f"[{loop_idx+1}] 工具完成: {server_id}.{tool_canonical} → {snippet}")
+                execs = await self._execute_calls(calls)
+                observations: List[str] = []
+                for ex in execs:
+                    res = ex["result"]
+                    res_text = res.get("text") or (json.dumps(res.get("structured"), ensure_ascii=False) if res.get("structured") is not None else "<no result>")
+                    # 减少噪音：限制注入长度
+                    if isinstance(res_text, str) and len(res_text) > 1200:
+                        res_text = res_text[:1200] + "\n...[truncated]..."
+                    snippet = (res_text[:160] + ("…" if isinstance(res_text, str) and len(res_text) > 160 else "")) if isinstance(res_text, str) else str(res_text)
+                    progress.append(f"[{loop_idx+1}] 工具完成: {ex['server']}.{ex['tool']} → {snippet}")
+                    observations.append(f"[工具执行结果] {ex['server']}.{ex['tool']}:\n{res_text}")
+                mcp_exec = dict(execs[0])
+                if len(execs) > 1:
+                    mcp_exec["batch"] = execs
                 # 将工具执行结果作为“观察”注入上下文，并提示 LLM 给出下一步/最终答案
                 msgs.append({"role": "assistant", "content": content})
-                msgs.append({"role": "user", "content": f"[工具执行结果] {server_id}.{tool_canonical}:\n{res_text}\n\n请基于该结果继续：若需要更多信息请给出新的 mcp_call；若可以回答，请直接给出最终答案。"})
+                msgs.append({"role": "user", "content": "\n\n".join(observations) + "\n\n请基于该结果继续：若需要更多信息请给出新的 mcp_call；若可以回答，请直接给出最终答案。"})
                 # 若不自动推进，则在得到分析后停止，并以建议形式返回下一步 action（不直接执行）
                 if not self.auto_proceed:
                     # 触发一次分析（第二次 LLM），但不自动执行新的 mcp_call
@@ -337,19 +297,30 @@ class MCPConversationAgent:
         return asyncio.run(self.respond_async(session_id, history, user_text))
 
 
-def _pick_mcp_spec(plan: Dict[str, Any]) -> Dict[str, Any] | None:
+def _pick_mcp_specs(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """plan["mcp"] 或 steps 中全部 op=mcp.tool 的步骤（按出现顺序）。"""
     if isinstance(plan.get("mcp"), dict):
-        return plan["mcp"]
+        return [plan["mcp"]]
+    specs: List[Dict[str, Any]] = []
     steps = plan.get("steps") if isinstance(plan, dict) else None
     if isinstance(steps, list):
         for st in steps:
             if isinstance(st, dict) and (st.get("op") == "mcp.tool" or st.get("type") == "mcp.tool"):
-                return {
+                specs.append({
                     "server": st.get("server"),
                     "tool": st.get("tool"),
                     "args": st.get("args", {}),
-                }
-    return None
+                })
+    return specs
+
+
+def _result_text(res: Dict[str, Any]) -> str:
+    text = res.get("text")
+    if not text and isinstance(res.get("structured"), dict):
+        # 常见约定：structured.markdown / structured.text
+        st = res["structured"]
+        text = st.get("markdown") or st.get("text") or json.dumps(st, ensure_ascii=False)
+    return str(text) if text else "<no content>"
 
 
 @register("executor", "mcp_tool")
@@ -380,27 +351,36 @@ class ExecutorMCPTool(Executor):
 
     def execute(self, srs: Dict[str, Any], plan: Dict[str, Any], context: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
         mcp = self._resolve_client(context)
-        spec = _pick_mcp_spec(plan)
-        if not spec:
+        specs = _pick_mcp_specs(plan)
+        if not specs:
             raise ValueError("计划中未找到 MCP 调用规范(mcp|steps.op=mcp.tool)")
 
-        server = str(spec.get("server") or "api")
-        tool = str(spec.get("tool") or "")
-        args = spec.get("args") or {}
-        if not tool:
+        calls: List[Dict[str, Any]] = []
+        for spec in specs:
+            args = spec.get("args") or {}
+            calls.append({"server": str(spec.get("server") or "api"), "tool": str(spec.get("tool") or ""), "args": args if isinstance(args, dict) else {}})
+        if not all(c["tool"] for c in calls):
             raise ValueError("MCP 工具名缺失")
 
         t0 = time.time()
-        res = mcp.call_tool(server, tool, args if isinstance(args, dict) else {})
+        if len(calls) == 1:
+            c = calls[0]
+            text = _result_text(mcp.call_tool(c["server"], c["tool"], c["args"]))
+            latency_ms = int((time.time() - t0) * 1000)
+            ctx = {"metrics": {"latency_ms": latency_ms, "retries": 0, "cost": 0.0}, "mcp": {"server": c["server"], "tool": c["tool"], "args": specs[0].get("args") or {}}}
+            return text, ctx
+
+        # 多个 mcp.tool 步骤相互独立：一次并发执行，按步骤顺序拼接结果
+        execs = mcp.call_tools(calls)
         latency_ms = int((time.time() - t0) * 1000)
-        # 提取结果文本
-        text = res.get("text")
-        if not text and isinstance(res.get("structured"), dict):
-            # 常见约定：structured.markdown / structured.text
-            st = res["structured"]
-            text = st.get("markdown") or st.get("text") or json.dumps(st, ensure_ascii=False)
-        if not text:
-            text = "<no content>"
-
-        ctx = {"metrics": {"latency_ms": latency_ms, "retries": 0, "cost": 0.0}, "mcp": {"server": server, "tool": tool, "args": args}}
-        return str(text), ctx
+        if all("error" in ex for ex in execs):
+            raise RuntimeError("MCP 批量调用全部失败: " + "; ".join(f"{ex['server']}.{ex['tool']}: {ex['error']}" for ex in execs))
+        parts: List[str] = []
+        for ex in execs:
+            body = f"<error: {ex['error']}>" if "error" in ex else _result_text(ex["result"])
+            parts.append(f"## {ex['server']}.{ex['tool']}\n\n{body}")
+        ctx = {
+            "metrics": {"latency_ms": latency_ms, "retries": 0, "cost": 0.0},
+            "mcp": [{k: ex[k] for k in ("server", "tool", "args", "latency_ms", "error") if k in ex} for ex in execs],
+        }
+        return "\n\n".join(parts), ctx
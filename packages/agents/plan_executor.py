@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: agents.plan_executor
+  目标: 通用计划执行引擎：按步骤 op 在技能算子注册表中查找实现，依据 inputs / depends_on 构建依赖 DAG，
+        相互独立的步骤并发执行（线程池或进程池），中间结果按引用在步骤之间传递；每步计时事件写入 Outbox
+  接口:
+    - register_op(name, fn, needs_input=True, process_ok=True, skills=(), memoize=False)；fn(args: dict, *inputs) -> 结果；list_ops()
+    - build_dag(plan) -> List[Node]（校验引用与环，补全/融合见下）
+    - execute_plan(plan, source, workers=None, pool="thread", max_parallel=4, emit=None, fallback=False, memo=None) -> (md_text, info)
+        source: CSV 路径 / 列式 Dataset / 行字典可迭代对象；无 inputs 的步骤以 source 为输入
+        emit(event_type, payload)：每步完成时调用（min_loop 传入 bus.append），事件类型 exec.step
+        info: {"steps": [事件载荷...], "outputs": {step_id: 结果}, "agg": 第一个 stats.aggregate 的结果, "latency_ms", "cache"}
+    - PlanError；canonical_plan(plan) -> 旧版 s1/s2/s3 语义的规范三步计划（fallback=True 时构建/执行失败后改用它）
+  依赖: 步骤 inputs（str 或 list）为数据依赖，按顺序作为位置参数传入；depends_on 仅约束先后。
+        整个计划都未声明 inputs/depends_on 时视为线性链（每步输入为前一步），并按规范链 csv.clean → stats.aggregate → md.render
+        补全缺失的环节（与旧版按 s1/s2/s3 兜底一致）
+  融合: 以 source 为输入的 csv.clean 若只被一个 stats.aggregate 消费，两步融合为一个节点，交由 agents.skills_pipeline
+        （流式 / 多进程分块 / 增量 / 磁盘解析缓存），事件中 fused 列出原步骤 id
+  执行: 未注册的 op 记为 skipped 并透传第一个输入；任一步失败则取消未开始的步骤并抛出 PlanError；
+        pool="process" 时 process_ok 的算子在进程池执行（输入按值序列化），其余仍在线程池
+  记忆化: memoize 的算子按 agents.step_memo 的键（op、args、输入指纹、技能 sha256）跨运行复用结果；memo 缺省为进程级
+        step_memo()（未启用时不记忆化），memo=False 关闭。执行前先解析命中，命中步骤事件 cache="hit" 并带原耗时 saved_ms；
+        只被命中步骤消费的上游步骤不再执行（status="pruned"）；其余步骤 cache="miss"（已写入）或 "bypass"（不可记忆化）
+        融合节点内的清洗结果另按独立 csv.clean 步骤的键缓存：只改聚合参数（如 top_n）时复用清洗结果、只重做聚合，
+        事件 clean_cache="hit"|"miss"|"bypass"（命中时 saved_ms 为当初清洗的耗时）；只有走单次列式解析的文件才拆开，
+        增量 / 多进程分块的大文件仍整体融合执行，清洗结果不缓存（clean_cache="bypass"）
+  输出: Markdown 取计划顺序中最后一个已注册算子产出的字符串结果（透传值与 source 本身不算，避免把 CSV 路径当作报告）；
+        没有时用默认参数渲染最后一个已注册算子产出的聚合形态（含 summary）结果；两者都没有则抛出 PlanError
+        （fallback=True 时改按规范三步计划执行，如 LLM 计划把 op 写错时）
+  约束: 步骤 args 中的执行选项（workers）不会传给算子
+"""
+
+from __future__ import annotations
+
+import collections.abc
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from packages.agents.step_memo import StepMemo, source_print, step_key, step_memo
+from packages.agents.skills_pipeline import _DEFAULTS, _EXEC_KEYS, aggregate_csv, aggregate_rows, plan_step_args, resolve_workers, single_parse_applies
+from packages.data.dataset_cache import load_csv_cached
+
+
+SOURCE = "$source"
+
+# 规范链：旧版计划固定为 s1/s2/s3 三步
+_CANONICAL = (("s1", "csv.clean"), ("s2", "stats.aggregate"), ("s3", "md.render"))
+
+_FUSED_OP = "csv.clean+stats.aggregate"
+
+
+class PlanError(RuntimeError):
+    pass
+
+
+class OpSpec:
+    __slots__ = ("name", "fn", "needs_input", "process_ok", "skills", "memoize")
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        needs_input: bool = True,
+        process_ok: bool = True,
+        skills: Sequence[str] = (),
+        memoize: bool = False,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.needs_input = needs_input
+        self.process_ok = process_ok
+        # 实现所依赖的技能名（skills/registry.json），其 sha256 参与记忆化键
+        self.skills = tuple(skills)
+        self.memoize = memoize
+
+
+_OPS: Dict[str, OpSpec] = {}
+
+
+def register_op(
+    name: str,
+    fn: Callable[..., Any],
+    needs_input: bool = True,
+    process_ok: bool = True,
+    skills: Sequence[str] = (),
+    memoize: bool = False,
+) -> None:
+    _OPS[name] = OpSpec(name, fn, needs_input, process_ok, skills, memoize)
+
+
+def list_ops() -> List[str]:
+    return sorted(_OPS)
+
+
+# ---- 内置算子（模块级函数，可被进程池序列化）----
+def _rows(x: Any) -> Any:
+    return load_csv_cached(x) if isinstance(x, str) else x
+
+
+def op_csv_load(args: Dict[str, Any], source: Any = None) -> Any:
+    return load_csv_cached(str(args.get("path") or source))
+
+
+def op_csv_clean(args: Dict[str, Any], rows: Any) -> Any:
+    from skills.csv_clean import csv_clean
+
+    return csv_clean(_rows(rows), **args)
+
+
+def op_stats_aggregate(args: Dict[str, Any], rows: Any) -> Any:
+    from skills.stats_aggregate import stats_aggregate
+
+    return stats_aggregate(_rows(rows), **args)
+
+
+def op_md_render(args: Dict[str, Any], agg: Any) -> Any:
+    from skills.md_render import md_render
+
+    agg = agg if isinstance(agg, dict) else {}
+    return md_render(agg.get("summary", {}), agg.get("top", []), **args)
+
+
+def op_clean_aggregate(args: Dict[str, Any], source: Any) -> Any:
+    """融合节点：args = {"clean": ..., "aggregate": ..., "workers": n}。"""
+    if isinstance(source, str):
+        return aggregate_csv(source, args["clean"], args["aggregate"], int(args.get("workers") or 1))
+    return aggregate_rows(source, args["clean"], args["aggregate"])
+
+
+def _fused_memo_step(args: Dict[str, Any], source: Any, cleaned: Any = None) -> Tuple[Any, Any]:
+    """记忆化开启时的融合节点：返回 (聚合结果, 本次产出的清洗结果或 None)。
+    已有缓存的清洗结果时只做聚合；文件本就走单次列式解析时拆成清洗 + 聚合（结果逐字节一致），清洗结果另行缓存。"""
+    if cleaned is not None:
+        return op_stats_aggregate(args["aggregate"], cleaned), None
+    if isinstance(source, str) and single_parse_applies(source, int(args.get("workers") or 1)):
+        cleaned = op_csv_clean(args["clean"], source)
+        return op_stats_aggregate(args["aggregate"], cleaned), cleaned
+    return op_clean_aggregate(args, source), None
+
+
+register_op("csv.load", op_csv_load, needs_input=False)
+register_op("csv.clean", op_csv_clean, skills=("csv_clean",), memoize=True)
+register_op("stats.aggregate", op_stats_aggregate, skills=("stats_aggregate",), memoize=True)
+register_op("md.render", op_md_render, skills=("md_render",), memoize=True)
+# 融合节点自行管理并行度（可能再起进程池），只在线程中执行
+register_op(_FUSED_OP, op_clean_aggregate, process_ok=False, skills=("csv_clean", "stats_aggregate"), memoize=True)
+
+
+# ---- DAG ----
+class Node:
+    __slots__ = ("id", "op", "args", "inputs", "after", "fused")
+
+    def __init__(self, sid: str, op: str, args: Dict[str, Any], inputs: List[str], after: List[str], fused: Optional[List[str]] = None) -> None:
+        self.id = sid
+        self.op = op
+        self.args = args
+        self.inputs = inputs
+        self.after = after
+        self.fused = fused
+
+    @property
+    def deps(self) -> List[str]:
+        return [d for d in dict.fromkeys(self.inputs + self.after) if d != SOURCE]
+
+
+def _as_list(v: Any) -> List[str]:
+    if v is None:
+        return []
+    if isinstance(v, str):
+        return [v]
+    return [str(x) for x in v]
+
+
+def _steps(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [s for s in (plan or {}).get("steps", []) or [] if isinstance(s, dict)]
+
+
+def _linear(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """无显式依赖的旧式计划：补全规范链缺失的环节后串成线性链。"""
+    ops = [s.get("op") for s in steps]
+    if all(op in dict(_CANONICAL).values() for op in ops):
+        by_op = {s.get("op"): s for s in steps}
+        steps = [by_op.get(op) or {"id": sid, "op": op, "args": dict(_DEFAULTS[sid])} for sid, op in _CANONICAL]
+    out = []
+    prev = SOURCE
+    for i, s in enumerate(steps):
+        sid = str(s.get("id") or f"s{i + 1}")
+        out.append(dict(s, id=sid, inputs=[prev]))
+        prev = sid
+    return out
+
+
+def build_dag(plan: Dict[str, Any]) -> List[Node]:
+    steps = _steps(plan)
+    if not any("inputs" in s or "depends_on" in s for s in steps):
+        steps = _linear(steps)
+    nodes: List[Node] = []
+    seen = set()
+    for i, s in enumerate(steps):
+        sid = str(s.get("id") or f"s{i + 1}")
+        if sid in seen or sid == SOURCE:
+            raise PlanError(f"步骤 id 重复或非法: {sid}")
+        seen.add(sid)
+        args = {k: v for k, v in (s.get("args") or {}).items() if k not in _EXEC_KEYS}
+        spec = _OPS.get(str(s.get("op")))
+        inputs = _as_list(s.get("inputs"))
+        if not inputs and (spec is None or spec.needs_input):
+            inputs = [SOURCE]
+        nodes.append(Node(sid, str(s.get("op")), args, inputs, _as_list(s.get("depends_on"))))
+    for n in nodes:
+        for d in n.deps:
+            if d not in seen:
+                raise PlanError(f"步骤 {n.id} 引用了不存在的步骤: {d}")
+    nodes = _fuse(nodes)
+    _check_acyclic(nodes)
+    return nodes
+
+
+def _fuse(nodes: List[Node]) -> List[Node]:
+    consumers: Dict[str, List[str]] = {}
+    for n in nodes:
+        for d in n.deps:
+            consumers.setdefault(d, []).append(n.id)
+    by_id = {n.id: n for n in nodes}
+    drop = set()
+    for n in nodes:
+        if n.op != "stats.aggregate" or len(n.inputs) != 1 or n.inputs[0] == SOURCE:
+            continue
+        c = by_id[n.inputs[0]]
+        if c.op == "csv.clean" and c.inputs == [SOURCE] and not c.after and consumers.get(c.id) == [n.id]:
+            n.op = _FUSED_OP
+            n.args = {"clean": c.args, "aggregate": n.args}
+            n.inputs = [SOURCE]
+            n.after = [d for d in n.after if d != c.id]
+            n.fused = [c.id, n.id]
+            drop.add(c.id)
+    return [n for n in nodes if n.id not in drop]
+
+
+def _check_acyclic(nodes: List[Node]) -> List[str]:
+    """返回一个拓扑序（步骤 id）。"""
+    pending = {n.id: set(n.deps) for n in nodes}
+    topo: List[str] = []
+    while pending:
+        ready = [k for k, deps in pending.items() if not deps]
+        if not ready:
+            raise PlanError(f"计划存在依赖环: {sorted(pending)}")
+        for k in ready:
+            del pending[k]
+        topo.extend(ready)
+        for deps in pending.values():
+            deps.difference_update(ready)
+    return topo
+
+
+def _step_keys(nodes: List[Node], source: Any) -> Dict[str, Optional[str]]:
+    """按拓扑序计算各步骤的记忆化键；上游键即下游的输入指纹，任一输入不可指纹化则为 None。"""
+    by_id = {n.id: n for n in nodes}
+    keys: Dict[str, Optional[str]] = {SOURCE: source_print(source)}
+    for sid in _check_acyclic(nodes):
+        n = by_id[sid]
+        spec = _OPS.get(n.op)
+        prints = [keys.get(i) for i in n.inputs]
+        if spec is None or not spec.memoize or any(p is None for p in prints):
+            keys[sid] = None
+            continue
+        keys[sid] = step_key(n.op, n.args, prints, spec.skills)  # type: ignore[arg-type]
+    return keys
+
+
+def _clean_keys(nodes: List[Node], keys: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """融合节点内清洗结果的记忆化键：与未融合时独立 csv.clean 步骤的键相同。"""
+    spec = _OPS["csv.clean"]
+    src = keys.get(SOURCE)
+    return {n.id: step_key("csv.clean", n.args["clean"], [src], spec.skills) for n in nodes if n.op == _FUSED_OP and keys.get(n.id) is not None and src is not None}
+
+
+# ---- 执行 ----
+def _run_step(fn: Callable[..., Any], args: Dict[str, Any], inputs: Sequence[Any]) -> Tuple[Any, float, float]:
+    started = time.time()
+    t0 = time.perf_counter()
+    value = fn(args, *inputs)
+    return value, started, (time.perf_counter() - t0) * 1000.0
+
+
+def _passthrough(args: Dict[str, Any], *inputs: Any) -> Any:
+    return inputs[0] if inputs else None
+
+
+def canonical_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """旧版语义：按 s1/s2/s3 的 args 组成规范三步计划（缺省步骤用默认参数）。"""
+    args = plan_step_args(plan)
+    return {"steps": [{"id": sid, "op": op, "args": a} for (sid, op), a in zip(_CANONICAL, args)]}
+
+
+def execute_plan(
+    plan: Dict[str, Any],
+    source: Any,
+    workers: Optional[int] = None,
+    pool: str = "thread",
+    max_parallel: int = 4,
+    emit: Optional[Callable[[str, Dict[str, Any]], Any]] = None,
+    fallback: bool = False,
+    memo: Any = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """fallback=True 时，计划无法构建/执行（PlanError）则记录 exec.plan_fallback 并按规范三步计划执行。
+
+    memo: StepMemo 实例；None 取进程级 step_memo()（未启用则不记忆化）；False 关闭记忆化。
+    """
+    if memo is None:
+        memo = step_memo()
+        memo = memo if memo.enabled else None
+    memo = memo or None
+    try:
+        return _execute(plan, source, workers, pool, max_parallel, emit, memo)
+    except PlanError as e:
+        if not fallback:
+            raise
+        if emit is not None:
+            try:
+                emit("exec.plan_fallback", {"error": str(e)})
+            except Exception:
+                pass
+        return _execute(canonical_plan(plan), source, resolve_workers(plan, workers), pool, max_parallel, emit, memo)
+
+
+def _execute(
+    plan: Dict[str, Any],
+    source: Any,
+    workers: Optional[int],
+    pool: str,
+    max_parallel: int,
+    emit: Optional[Callable[[str, Dict[str, Any]], Any]],
+    memo: Optional[StepMemo],
+) -> Tuple[str, Dict[str, Any]]:
+    t_start = time.perf_counter()
+    nodes = build_dag(plan)
+    n_workers = resolve_workers(plan, workers)
+    if not isinstance(source, (str, collections.abc.Sequence)) and sum(SOURCE in n.inputs for n in nodes) > 1:
+        # 一次性迭代器被多个步骤消费：先物化
+        source = list(source)
+    results: Dict[str, Any] = {SOURCE: source}
+    events: List[Dict[str, Any]] = []
+    order = {n.id: i for i, n in enumerate(nodes)}
+    waiting = {n.id: n for n in nodes}
+    done: set = set()
+    running: Dict[Future, Node] = {}
+    keys: Dict[str, Optional[str]] = _step_keys(nodes, source) if memo is not None else {}
+    clean_keys = _clean_keys(nodes, keys)
+    # 融合节点未命中时可复用的清洗结果：{step_id: (Dataset, meta)}
+    cleaned: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+
+    def _emit(payload: Dict[str, Any]) -> None:
+        events.append(payload)
+        if emit is not None:
+            try:
+                emit("exec.step", payload)
+            except Exception:
+                pass
+
+    def _payload(n: Node) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"id": n.id, "op": n.op, "inputs": [i for i in n.inputs if i != SOURCE], "depends_on": n.after}
+        if n.fused:
+            payload["fused"] = n.fused
+        return payload
+
+    if memo is not None:
+        # 自汇点按逆拓扑序解析命中：只有未命中的步骤才需要其上游（数据或先后依赖），
+        # 因此只被命中步骤消费的上游既不查找也不执行
+        by_id = {n.id: n for n in nodes}
+        consumed = {d for n in nodes for d in n.deps}
+        # 第一个聚合步骤的结果作为 info["agg"] 对外提供，始终需要
+        first_agg = next((n.id for n in nodes if n.op in ("stats.aggregate", _FUSED_OP)), None)
+        needed = {n.id for n in nodes if n.id not in consumed or n.id == first_agg}
+        hits: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+        for sid in reversed(_check_acyclic(nodes)):
+            if sid not in needed:
+                continue
+            key = keys.get(sid)
+            hit, value, meta = memo.get(key) if key is not None else (False, None, {})
+            if hit:
+                hits[sid] = (value, meta)
+            else:
+                needed.update(by_id[sid].deps)
+        for n in nodes:
+            if n.id in hits:
+                value, meta = hits[n.id]
+                results[n.id] = value
+                _emit({**_payload(n), "status": "ok", "cache": "hit", "started_at": round(time.time(), 6), "ms": 0.0, "saved_ms": meta.get("ms")})
+            elif n.id not in needed:
+                _emit({**_payload(n), "status": "pruned", "cache": "pruned"})
+            else:
+                continue
+            del waiting[n.id]
+            done.add(n.id)
+        for sid, ck in clean_keys.items():
+            if sid in waiting:
+                hit, value, meta = memo.get(ck)
+                if hit:
+                    cleaned[sid] = (value, meta)
+
+    threads = ThreadPoolExecutor(max_workers=max(1, int(max_parallel)), thread_name_prefix="plan-step")
+    procs: Optional[Executor] = ProcessPoolExecutor(max_workers=max(1, int(max_parallel))) if pool == "process" else None
+    try:
+        while waiting or running:
+            for n in sorted((n for n in waiting.values() if all(d in done for d in n.deps)), key=lambda n: order[n.id]):
+                del waiting[n.id]
+                spec = _OPS.get(n.op)
+                fn: Callable[..., Any] = _passthrough
+                if spec is not None:
+                    fn = spec.fn
+                args: Dict[str, Any] = dict(n.args, workers=n_workers) if n.op == _FUSED_OP else n.args
+                inputs = [results[i] for i in n.inputs]
+                if n.id in clean_keys:
+                    fn = _fused_memo_step
+                    inputs.append(cleaned[n.id][0] if n.id in cleaned else None)
+                ex: Executor = procs if (procs is not None and spec is not None and spec.process_ok) else threads
+                running[ex.submit(_run_step, fn, args, inputs)] = n
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in sorted(finished, key=lambda f: order[running[f].id]):
+                n = running.pop(fut)
+                payload = _payload(n)
+                try:
+                    value, started, ms = fut.result()
+                except Exception as e:
+                    _emit({**payload, "status": "error", "error": f"{type(e).__name__}: {e}"})
+                    for f in running:
+                        f.cancel()
+                    raise PlanError(f"步骤 {n.id}（{n.op}）失败: {e}") from e
+                if n.id in clean_keys and memo is not None:
+                    value, new_clean = value
+                    if n.id in cleaned:
+                        payload["clean_cache"] = "hit"
+                        payload["saved_ms"] = cleaned[n.id][1].get("ms")
+                    elif new_clean is not None and memo.put(clean_keys[n.id], new_clean, {"op": "csv.clean", "ms": round(ms, 3)}):
+                        payload["clean_cache"] = "miss"
+                    else:
+                        payload["clean_cache"] = "bypass"
+                results[n.id] = value
+                done.add(n.id)
+                status = "ok" if n.op in _OPS else "skipped"
+                if memo is not None:
+                    key = keys.get(n.id)
+                    stored = key is not None and memo.put(key, value, {"op": n.op, "ms": round(ms, 3)})
+                    payload["cache"] = "miss" if stored else "bypass"
+                _emit({**payload, "status": status, "started_at": round(started, 6), "ms": round(ms, 3)})
+    finally:
+        threads.shutdown(wait=False, cancel_futures=True)
+        if procs is not None:
+            procs.shutdown(wait=False, cancel_futures=True)
+
+    outputs: Dict[str, Any] = {n.id: results.get(n.id) for n in nodes}
+    # 只认已注册算子自己产出的结果：未注册 op 的透传值（可能就是 CSV 路径）不能当作报告
+    produced = [outputs[n.id] for n in nodes if n.op in _OPS and outputs[n.id] is not source]
+    md_text = next((v for v in reversed(produced) if isinstance(v, str)), None)
+    aggs = [outputs[n.id] for n in nodes if n.op in ("stats.aggregate", _FUSED_OP)]
+    if md_text is None:
+        last = next((v for v in reversed(produced) if isinstance(v, dict) and "summary" in v), None)
+        if last is None:
+            raise PlanError("计划没有产出 Markdown 或聚合结果的步骤")
+        md_text = op_md_render(dict(_DEFAULTS["s3"]), last)
+    cache: Dict[str, Any] = {"hit": 0, "miss": 0, "bypass": 0, "pruned": 0, "saved_ms": 0.0}
+    for ev in events:
+        if ev.get("cache") in cache:
+            cache[ev["cache"]] += 1
+        cache["saved_ms"] += float(ev.get("saved_ms") or 0.0)
+    cache["saved_ms"] = round(cache["saved_ms"], 3)
+    info = {
+        "steps": events,
+        "outputs": outputs,
+        "agg": next((a for a in aggs if a is not None), None),
+        "latency_ms": int((time.perf_counter() - t_start) * 1000),
+        "cache": cache,
+    }
+    return md_text, info
@@ -7,13 +7,11 @@ SPEC:
 
 from __future__ import annotations
 
-from typing import Any, Dict, Tuple, List
+from typing import Any, Dict, Tuple
 
 from packages.agents.interfaces import Planner, Executor, Critic, Reviser
 from packages.agents.registry import register
-from skills.csv_clean import csv_clean
-from skills.stats_aggregate import stats_aggregate
-from skills.md_render import md_render
+from packages.agents.plan_executor import execute_plan
 
 
 @register("planner", "rules")
@@ -36,16 +34,20 @@ class PlannerRules(Planner):
 @register("executor", "skills")
 class ExecutorSkills(Executor):
     def execute(self, srs: Dict[str, Any], plan: Dict[str, Any], context: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
-        rows: List[Dict[str, str]] = context.get("rows", [])
-        steps = plan.get("steps", [])
-        step_by_id = {s.get("id"): s for s in steps}
-        s1 = step_by_id.get("s1") or {"args": {"drop_empty": True}}
-        cleaned = csv_clean(rows, **(s1.get("args", {}) or {}))
-        s2 = step_by_id.get("s2") or {"args": {"top_n": 10, "score_by": "views", "title_field": "title"}}
-        agg = stats_aggregate(cleaned, **(s2.get("args", {}) or {}))
-        s3 = step_by_id.get("s3") or {"args": {"include_table": True}}
-        md_text = md_render(agg.get("summary", {}), agg.get("top", []), **(s3.get("args", {}) or {}))
-        return md_text, {"artifacts": {"found_top": len(agg.get("top", []))}, "metrics": {"latency_ms": 0, "retries": 0, "cost": 0.0}}
+        # 计划按 DAG 执行；有 csv_path 时始终按文件执行（流式/分块并行/增量/解析缓存/步骤记忆化），
+        # 上下文中的 rows 仅供 LLM 提示词抽样；没有 csv_path 时才使用 rows
+        source: Any = context.get("csv_path") or context.get("rows") or []
+        md_text, info = execute_plan(
+            plan,
+            source,
+            workers=context.get("workers"),
+            pool=str(context.get("pool") or "thread"),
+            max_parallel=int(context.get("max_parallel") or 4),
+            emit=context.get("emit"),
+            fallback=True,
+        )
+        agg = info.get("agg") or {}
+        return md_text, {"artifacts": {"found_top": len(agg.get("top", []))}, "metrics": {"latency_ms": info["latency_ms"], "retries": 0, "cost": 0.0, "steps": len(info["steps"])}}
 
 
 @register("critic", "rules")
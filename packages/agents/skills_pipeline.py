@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: agents.skills_pipeline
+  目标: 将 csv.clean → stats.aggregate → md.render 融合为一条流式管道：CSV 逐行读取、惰性清洗、单遍聚合（有界 Top-N 堆），
+        内存与行数无关（只与 top_n 有关）；计划执行器（agents.plan_executor）的融合步骤即调用此处
+        输入为列式 Dataset（packages.data.dataset）时改走列式路径：按字典项清洗、按列数值聚合
+  并行: run_csv_pipeline(path, plan, workers) 在 workers>1 时走 map-reduce：文件按记录边界切成字节区间（data.csv_chunks），
+        ProcessPoolExecutor 中各块执行 清洗 + 部分聚合（计数/总和/本块 Top-N），再按块序合并（stats_merge）；
+        workers 取自参数（min_loop run --workers），否则取任一计划步骤 args 中的 "workers"（该键不会传给技能）
+        单进程时，不超过磁盘缓存上限的文件经 data.dataset_cache 载入（命中即免解析），更大的文件逐行流式处理
+  增量: 文件不小于 tools.incremental.min_file_mb 时（追加写入的大文件）走 run_incremental_csv：持久化状态记录偏移与前缀哈希，
+        前缀未变只解析新增尾部（尾部同样可分块并行），与全量结果一致（非整数得分的总和末位同并行模式）
+  接口:
+    - iter_csv_rows(path) -> Iterator[dict]（逐行读取，不物化整表）
+    - plan_step_args(plan) -> (clean_args, agg_args, render_args)（缺省步骤按默认参数兜底）
+    - plan_workers(plan) -> int
+    - run_skills_pipeline(rows, plan) -> (md_text, agg, cleaned_count)
+    - run_csv_pipeline(path, plan, workers=None) -> 同上
+    - run_incremental_csv(path, plan, workers=1, store=None) -> 同上
+    - aggregate_rows(rows, clean_args, agg_args) / aggregate_csv(path, clean_args, agg_args, workers) -> agg
+      （只做清洗 + 聚合，供计划执行器 agents.plan_executor 的融合步骤使用）
+    - single_parse_applies(path, workers=1) -> bool（aggregate_csv 是否走单次列式解析；执行器据此把融合步骤拆开以缓存清洗结果）
+  约束: 结果与逐步调用 csv_clean / stats_aggregate / md_render 一致（并行模式下非整数得分的总和末位可能不同）
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from packages.data.csv_chunks import last_record_end, read_chunk_rows, read_header, split_csv
+from packages.data.dataset import Dataset
+from packages.data.dataset_cache import dataset_cache, load_csv_cached
+from packages.data.incremental import IncrementalStore, extend_hash, incremental_store
+from skills.csv_clean import csv_clean, iter_clean
+from skills.md_render import md_render
+from skills.stats_aggregate import stats_aggregate, stats_aggregate_stream, stats_combine, stats_merge, stats_partial
+
+# 执行选项（不属于技能参数）
+_EXEC_KEYS = ("workers",)
+
+# 每块至少这么多字节，过小的文件不值得多进程
+MIN_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "s1": {"drop_empty": True},
+    "s2": {"top_n": 10, "score_by": "views", "title_field": "title"},
+    "s3": {"include_table": True},
+}
+
+
+def iter_csv_rows(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def plan_step_args(plan: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    by_id = {s.get("id"): s for s in (plan or {}).get("steps", []) or [] if isinstance(s, dict)}
+
+    def _args(sid: str) -> Dict[str, Any]:
+        step = by_id.get(sid)
+        if not step:
+            return dict(_DEFAULTS[sid])
+        return {k: v for k, v in (step.get("args", {}) or {}).items() if k not in _EXEC_KEYS}
+
+    return _args("s1"), _args("s2"), _args("s3")
+
+
+def plan_workers(plan: Dict[str, Any]) -> int:
+    for s in (plan or {}).get("steps", []) or []:
+        if isinstance(s, dict) and isinstance(s.get("args"), dict) and s["args"].get("workers"):
+            try:
+                return max(1, int(s["args"]["workers"]))
+            except (TypeError, ValueError):
+                continue
+    return 1
+
+
+def aggregate_rows(rows: Iterable[Dict[str, str]], clean_args: Dict[str, Any], agg_args: Dict[str, Any]) -> Dict[str, Any]:
+    """清洗 + 聚合：列式 Dataset 走列式路径，其它可迭代对象单遍流式。"""
+    if isinstance(rows, Dataset):
+        return stats_aggregate(csv_clean(rows, **clean_args), **agg_args)
+    return stats_aggregate_stream(iter_clean(rows, **clean_args), **agg_args)
+
+
+def run_skills_pipeline(rows: Iterable[Dict[str, str]], plan: Dict[str, Any]) -> Tuple[str, Dict[str, Any], int]:
+    clean_args, agg_args, render_args = plan_step_args(plan)
+    return _finish(aggregate_rows(rows, clean_args, agg_args), render_args)
+
+
+def _map_chunk(path: str, start: int, end: int, header: List[str], clean_args: Dict[str, Any], agg_args: Dict[str, Any]) -> Dict[str, Any]:
+    """子进程内：读取一块记录 → 惰性清洗 → 部分聚合。"""
+    return stats_partial(iter_clean(read_chunk_rows(path, start, end, header), **clean_args), **agg_args)
+
+
+def _finish(agg: Dict[str, Any], render_args: Dict[str, Any]) -> Tuple[str, Dict[str, Any], int]:
+    md_text = md_render(agg.get("summary", {}), agg.get("top", []), **render_args)
+    return md_text, agg, int(agg["summary"]["count"])
+
+
+def _partials(
+    path: str,
+    header: List[str],
+    start: int,
+    end: int,
+    clean_args: Dict[str, Any],
+    agg_args: Dict[str, Any],
+    n: int,
+    min_chunk_bytes: int = MIN_CHUNK_BYTES,
+) -> List[Dict[str, Any]]:
+    """[start, end) 的部分聚合（按块序）；n>1 且区间足够大时多进程分块。"""
+    if end <= start:
+        return []
+    ranges = _fan_out_ranges(path, start, end, n, min_chunk_bytes)
+    if ranges:
+        return _map_parallel(path, header, ranges, clean_args, agg_args, n)
+    return [_map_chunk(path, start, end, header, clean_args, agg_args)]
+
+
+def _fan_out_ranges(path: str, start: int, end: int, n: int, min_chunk_bytes: int) -> List[Tuple[int, int]]:
+    """值得多进程分块时返回各块字节区间（至少两块），否则返回空列表。"""
+    if n <= 1 or end <= start:
+        return []
+    _, ranges = split_csv(path, n * 2, min_chunk_bytes=min_chunk_bytes, start=start, end=end)
+    return ranges if len(ranges) > 1 else []
+
+
+def _map_parallel(
+    path: str,
+    header: List[str],
+    ranges: List[Tuple[int, int]],
+    clean_args: Dict[str, Any],
+    agg_args: Dict[str, Any],
+    n: int,
+) -> List[Dict[str, Any]]:
+    with ProcessPoolExecutor(max_workers=min(n, len(ranges))) as ex:
+        futs = [ex.submit(_map_chunk, path, a, b, header, clean_args, agg_args) for a, b in ranges]
+        return [f.result() for f in futs]
+
+
+def aggregate_incremental(
+    path: str,
+    clean_args: Dict[str, Any],
+    agg_args: Dict[str, Any],
+    workers: int = 1,
+    store: Optional[IncrementalStore] = None,
+    min_chunk_bytes: int = MIN_CHUNK_BYTES,
+) -> Dict[str, Any]:
+    """追加写入文件的增量聚合：前缀未变则只处理上次提交点之后的新增记录，否则全量重算；随后更新持久化状态。"""
+    store = store or incremental_store()
+    top_n = agg_args.get("top_n", 10)
+    key = store.key(path, clean_args, agg_args)
+    size = os.path.getsize(path)
+    state = store.load(key)
+    hasher = store.verify(path, state) if state is not None else None
+    if state is not None and hasher is None:
+        store.counters["reset"] += 1
+    if hasher is None:
+        header, start = read_header(path)
+        base: List[Dict[str, Any]] = []
+        hasher = hashlib.sha256()
+        prefix_end = 0
+        store.counters["full"] += 1
+    else:
+        header, start = list(state["header"]), int(state["offset"])  # type: ignore[index]
+        base = [state["partial"]]  # type: ignore[index]
+        prefix_end = start
+        store.counters["incremental"] += 1
+    # 只提交以换行结束的记录；末尾未完成的一条本次计入结果、但不写入状态（写入方可能仍在追加）
+    commit = last_record_end(path, start, size)
+    store.counters["tail_bytes"] += size - start
+    partial = stats_combine(base + _partials(path, header, start, commit, clean_args, agg_args, workers, min_chunk_bytes), top_n)
+    try:
+        digest = extend_hash(hasher, path, prefix_end, commit)
+        store.save(key, {"path": os.path.abspath(path), "offset": commit, "prefix_sha256": digest, "header": header, "partial": partial})
+    except OSError:
+        pass
+    pending = [_map_chunk(path, commit, size, header, clean_args, agg_args)] if commit < size else []
+    return stats_merge([partial] + pending, top_n=top_n)
+
+
+def run_incremental_csv(
+    path: str,
+    plan: Dict[str, Any],
+    workers: int = 1,
+    store: Optional[IncrementalStore] = None,
+    min_chunk_bytes: int = MIN_CHUNK_BYTES,
+) -> Tuple[str, Dict[str, Any], int]:
+    clean_args, agg_args, render_args = plan_step_args(plan)
+    return _finish(aggregate_incremental(path, clean_args, agg_args, workers, store, min_chunk_bytes), render_args)
+
+
+def aggregate_csv(
+    path: str,
+    clean_args: Dict[str, Any],
+    agg_args: Dict[str, Any],
+    workers: int = 1,
+    min_chunk_bytes: int = MIN_CHUNK_BYTES,
+) -> Dict[str, Any]:
+    """按文件选择执行方式：增量（追加写入的大文件）→ 多进程分块 → 磁盘解析缓存 → 逐行流式。"""
+    if incremental_store().applies(path):
+        return aggregate_incremental(path, clean_args, agg_args, workers=workers, min_chunk_bytes=min_chunk_bytes)
+    if workers > 1:
+        # 先只切分不计算：文件太小不值得分块时直接走下面的单次解析路径，避免串行算一遍后再解析一遍
+        header, body = read_header(path)
+        ranges = _fan_out_ranges(path, body, os.path.getsize(path), workers, min_chunk_bytes)
+        if ranges:
+            return stats_merge(_map_parallel(path, header, ranges, clean_args, agg_args, workers), top_n=agg_args.get("top_n", 10))
+    if dataset_cache().cacheable(path):
+        # 磁盘解析缓存：命中时直接映射列式数据，未命中解析一次并写入
+        return aggregate_rows(load_csv_cached(path), clean_args, agg_args)
+    return aggregate_rows(iter_csv_rows(path), clean_args, agg_args)
+
+
+def single_parse_applies(path: str, workers: int = 1, min_chunk_bytes: int = MIN_CHUNK_BYTES) -> bool:
+    """aggregate_csv 对该文件是否走磁盘解析缓存的单次列式解析（不增量、不分块）；此时先清洗再聚合的结果与之逐字节一致。"""
+    if incremental_store().applies(path) or not dataset_cache().cacheable(path):
+        return False
+    if workers > 1:
+        try:
+            _, body = read_header(path)
+            return not _fan_out_ranges(path, body, os.path.getsize(path), workers, min_chunk_bytes)
+        except OSError:
+            return False
+    return True
+
+
+def resolve_workers(plan: Dict[str, Any], workers: Optional[int] = None) -> int:
+    return max(1, int(workers)) if workers else min(plan_workers(plan), os.cpu_count() or 1)
+
+
+def run_csv_pipeline(path: str, plan: Dict[str, Any], workers: Optional[int] = None, min_chunk_bytes: int = MIN_CHUNK_BYTES) -> Tuple[str, Dict[str, Any], int]:
+    clean_args, agg_args, render_args = plan_step_args(plan)
+    return _finish(aggregate_csv(path, clean_args, agg_args, resolve_workers(plan, workers), min_chunk_bytes), render_args)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: agents.step_memo
+  目标: 计划步骤级记忆化（跨运行）：多次运行共享相同的前缀步骤（同一 CSV 以相同参数清洗、再以不同 top_n 聚合），
+        命中的步骤不再计算，replay --rerun 与离线脚本同样受益
+  接口:
+    - StepMemo(cache_dir, max_bytes)（cache_dir 缺省为环境变量 STEP_MEMO_DIR 或 <repo>/.cache/steps）
+        .get(key) -> (hit, value, meta) / .put(key, value, meta) -> bool（值不可持久化时返回 False）/ .clear() / .stats()
+    - step_key(op, args, input_prints, skills) -> str
+    - source_print(source) -> str|None（CSV 路径 → 文件指纹；其它输入不可指纹化，返回 None，下游步骤不参与记忆化）
+    - skill_sha256(name) -> str|None（取自 skills/registry.json，随注册表 mtime 刷新）
+    - step_memo() 进程级单例；configure_step_memo(cfg) 按 tools.step_memo.{enabled,dir,max_mb} 调整
+  键: sha256(op, 规范化 args JSON, 各输入指纹, 相关技能文件的 sha256)；上游步骤的输入指纹即其记忆化键（Merkle 链），
+      因此上游任一参数/文件/技能变化都会使下游失效
+  存储: <key>.meta.json（op、原计算耗时 ms、值格式）+ 值文件：列式 Dataset → <key>.dsc（data.dataset_cache 格式，mmap 读取），
+        其余 → <key>.json；JSON 不可表示的值不缓存
+  淘汰: 总大小超过 max_bytes 时按最近使用时间（命中时刷新 mtime）整键淘汰
+  约束: 仅标准库；先写临时文件再 os.replace；损坏的条目视为未命中
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from packages.agents.skills_registry import load_registry
+from packages.data.dataset import Dataset
+from packages.data.dataset_cache import dump_dataset, map_dataset
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+REGISTRY_PATH = os.path.join(REPO_ROOT, "skills", "registry.json")
+
+_META = ".meta.json"
+
+_SKILLS: Dict[str, Any] = {"mtime_ns": None, "sha": {}}
+_SKILLS_LOCK = threading.Lock()
+
+
+def skill_sha256(name: str) -> Optional[str]:
+    with _SKILLS_LOCK:
+        try:
+            mtime = os.stat(REGISTRY_PATH).st_mtime_ns
+        except OSError:
+            return None
+        if _SKILLS["mtime_ns"] != mtime:
+            reg = load_registry(REGISTRY_PATH)
+            _SKILLS["sha"] = {str(it.get("name")): it.get("sha256") for it in reg.get("skills", []) if isinstance(it, dict)}
+            _SKILLS["mtime_ns"] = mtime
+        return _SKILLS["sha"].get(name)
+
+
+def source_print(source: Any) -> Optional[str]:
+    if not isinstance(source, str):
+        return None
+    try:
+        st = os.stat(source)
+    except OSError:
+        return None
+    return json.dumps(["file", os.path.abspath(source), int(st.st_ino), int(st.st_size), int(st.st_mtime_ns)])
+
+
+def step_key(op: str, args: Dict[str, Any], input_prints: Sequence[str], skills: Sequence[str] = ()) -> str:
+    raw = json.dumps(
+        {"op": op, "args": args, "inputs": list(input_prints), "skills": {s: skill_sha256(s) for s in skills}},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class StepMemo:
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir or os.environ.get("STEP_MEMO_DIR") or os.path.join(REPO_ROOT, ".cache", "steps")
+        self.max_bytes = int(max_bytes)
+        self.enabled = True
+        self._lock = threading.RLock()
+        self.counters: Dict[str, int] = {"hit": 0, "miss": 0, "put": 0, "skipped_put": 0, "evicted": 0, "saved_ms": 0}
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def get(self, key: str) -> Tuple[bool, Any, Dict[str, Any]]:
+        meta_path = self._path(key, _META)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("format") == "dataset":
+                value = map_dataset(self._path(key, ".dsc"))
+                if value is None:
+                    raise ValueError("bad dataset")
+            else:
+                with open(self._path(key, ".json"), "r", encoding="utf-8") as f:
+                    value = json.load(f)
+        except (OSError, ValueError, KeyError, TypeError):
+            self.counters["miss"] += 1
+            return False, None, {}
+        for suffix in (_META, ".dsc", ".json"):
+            try:
+                os.utime(self._path(key, suffix))
+            except OSError:
+                pass
+        self.counters["hit"] += 1
+        self.counters["saved_ms"] += int(meta.get("ms") or 0)
+        return True, value, meta
+
+    def put(self, key: str, value: Any, meta: Dict[str, Any]) -> bool:
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                if isinstance(value, Dataset):
+                    fmt = "dataset"
+                    dump_dataset(value, self._path(key, ".dsc"))
+                else:
+                    fmt = "json"
+                    try:
+                        raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+                    except (TypeError, ValueError):
+                        self.counters["skipped_put"] += 1
+                        return False
+                    _atomic_write(self._path(key, ".json"), raw)
+                # meta 最后写入：读取方以 meta 存在作为条目完整的标志
+                _atomic_write(self._path(key, _META), json.dumps(dict(meta, format=fmt), ensure_ascii=False).encode("utf-8"))
+            except OSError:
+                self.counters["skipped_put"] += 1
+                return False
+            self.counters["put"] += 1
+            self._evict()
+            return True
+
+    def _groups(self) -> List[Tuple[float, int, str]]:
+        groups: Dict[str, List[float]] = {}
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for e in it:
+                    if e.name.startswith(".tmp-") or "." not in e.name:
+                        continue
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        continue
+                    g = groups.setdefault(e.name.split(".", 1)[0], [0.0, 0])
+                    g[0] = max(g[0], st.st_mtime)
+                    g[1] += int(st.st_size)
+        except OSError:
+            pass
+        return [(m, int(n), key) for key, (m, n) in groups.items()]
+
+    def _evict(self) -> None:
+        groups = sorted(self._groups())
+        total = sum(n for _, n, _ in groups)
+        for _, n, key in groups:
+            if total <= self.max_bytes:
+                break
+            # 先删 meta，使条目立即失效
+            for suffix in (_META, ".dsc", ".json"):
+                try:
+                    os.unlink(self._path(key, suffix))
+                except OSError:
+                    pass
+            total -= n
+            self.counters["evicted"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for _, _, key in self._groups():
+                for suffix in (_META, ".dsc", ".json"):
+                    try:
+                        os.unlink(self._path(key, suffix))
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        groups = self._groups()
+        return {
+            "enabled": self.enabled,
+            "dir": self.cache_dir,
+            "entries": len(groups),
+            "bytes": sum(n for _, n, _ in groups),
+            "max_bytes": self.max_bytes,
+            **self.counters,
+        }
+
+
+_MEMO: Optional[StepMemo] = None
+_MEMO_LOCK = threading.Lock()
+
+
+def step_memo() -> StepMemo:
+    global _MEMO
+    with _MEMO_LOCK:
+        if _MEMO is None:
+            _MEMO = StepMemo()
+        return _MEMO
+
+
+def configure_step_memo(cfg: Optional[Dict[str, Any]]) -> StepMemo:
+    c = ((cfg or {}).get("tools", {}) or {}).get("step_memo") or {}
+    memo = step_memo()
+    with memo._lock:
+        memo.enabled = bool(c.get("enabled", True))
+        if c.get("dir"):
+            memo.cache_dir = str(c["dir"])
+        if c.get("max_mb") is not None:
+            memo.max_bytes = int(float(c["max_mb"]) * 1024 * 1024)
+    return memo
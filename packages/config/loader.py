@@ -3,12 +3,11 @@
 SPEC:
   模块: config.loader
   目标: 从 config.json 读取默认实现与 LLM 参数，CLI 可覆盖
+  缓存: 经 config.service 按 mtime 缓存解析结果；load_config 返回可变副本，config_snapshot 返回只读快照
 """
 
 from __future__ import annotations
 
-import json
-import os
 from typing import Any, Dict, Optional
 
 
@@ -26,6 +25,13 @@ DEFAULTS: Dict[str, Any] = {
         "temperature": {"planner": 0.2, "executor": 0.6, "critic": 0.0, "reviser": 0.4},
         "max_rows": 80,
         "retries": 1,
+        "singleflight": True,
+        "prompt_budget": {
+            "enabled": True,
+            "total": 12000,
+            "sections": {"SRS": 1000, "CSV_EXCERPT": 3000, "PLAN": 1000, "CRITIC": 800, "REPORT_MD": 4000},
+            "csv_sample_rows": 40,
+        },
     },
     "risk": {"check_skills": True, "codegen_mode": "disabled", "capability_token_required": True},
     "scoreboard": {"episodes_dir": "episodes"},
@@ -34,25 +40,25 @@ DEFAULTS: Dict[str, Any] = {
 }
 
 
+def merge_config(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """深度合并（浅简实现）：b 覆盖 a，嵌套 dict 递归合并。"""
+    out = dict(a)
+    for k, v in b.items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = merge_config(out[k], v)  # type: ignore
+        else:
+            out[k] = v
+    return out
+
+
 def load_config(path: Optional[str] = None) -> Dict[str, Any]:
-    path = path or "config.json"
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            try:
-                cfg = json.load(f)
-            except Exception:
-                cfg = {}
-    else:
-        cfg = {}
-
-    # 深度合并（浅简实现）
-    def merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
-        out = dict(a)
-        for k, v in b.items():
-            if isinstance(v, dict) and isinstance(out.get(k), dict):
-                out[k] = merge(out[k], v)  # type: ignore
-            else:
-                out[k] = v
-        return out
-
-    return merge(DEFAULTS, cfg)
+    """返回合并默认值后的可变配置副本；解析与合并由 config.service 缓存（文件变化时自动重载）。
+    只读场景可直接用 config_snapshot() 取不可变快照，避免复制。
+    """
+    return config_snapshot(path).thaw()
+
+
+def config_snapshot(path: Optional[str] = None) -> Any:
+    from packages.config.service import get_service  # 延迟导入，避免循环依赖
+
+    return get_service(path or "config.json").snapshot()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: config.service
+  目标: 进程级配置服务：config.json 解析+合并一次为不可变快照，按 mtime 监测文件变化并原子替换快照，
+        按配置段（llm/mcp/outbox/...）通知订阅者，仅在其段落变化时重建池化资源。
+  接口:
+    - ConfigService(path, defaults=DEFAULTS, check_interval=1.0)
+        .snapshot() -> FrozenDict（热路径：间隔内不做 IO；超过间隔仅 stat 一次）
+        .reload(force=False) -> bool（文件变化或 force 时重新解析，返回是否替换了快照）
+        .subscribe(section|None, fn(new, old)) -> 取消订阅函数
+        .watch(interval) 启动后台轮询线程（无读取时也能推送变化）；.stop()
+    - get_service(path=None, defaults=DEFAULTS) -> ConfigService（同一路径与默认值共享实例）
+    - FrozenDict / FrozenList: dict/list 子类，写操作抛 TypeError；copy.deepcopy / thaw() 得到可变副本
+  约束: 仅标准库；文件无法解析时保留上一份快照（首次加载则为默认值）
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from packages.config.loader import DEFAULTS, merge_config
+
+
+def _readonly(*_a: Any, **_k: Any) -> Any:
+    raise TypeError("配置快照只读；如需修改请先 thaw()/copy.deepcopy()")
+
+
+class FrozenDict(dict):
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    clear = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+    __ior__ = _readonly
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[str, Any]:
+        return thaw(self)
+
+    def __copy__(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def copy(self) -> Dict[str, Any]:  # type: ignore[override]
+        return dict(self)
+
+    def __reduce__(self) -> Any:
+        return (dict, (thaw(self),))
+
+    def thaw(self) -> Dict[str, Any]:
+        return thaw(self)
+
+
+class FrozenList(list):
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    __iadd__ = _readonly
+    __imul__ = _readonly
+    append = _readonly
+    extend = _readonly
+    insert = _readonly
+    pop = _readonly
+    remove = _readonly
+    clear = _readonly
+    sort = _readonly
+    reverse = _readonly
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> List[Any]:
+        return thaw(self)
+
+    def __copy__(self) -> List[Any]:
+        return list(self)
+
+    def copy(self) -> List[Any]:  # type: ignore[override]
+        return list(self)
+
+    def __reduce__(self) -> Any:
+        return (list, (thaw(self),))
+
+
+def freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return FrozenDict({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return FrozenList(freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [thaw(v) for v in obj]
+    return obj
+
+
+Subscriber = Callable[[Any, Any], None]
+
+
+class ConfigService:
+    def __init__(self, path: str, defaults: Optional[Dict[str, Any]] = DEFAULTS, check_interval: float = 1.0) -> None:
+        self.path = path
+        self.defaults = defaults
+        self.check_interval = float(check_interval)
+        self.version = 0
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+        self._snap: FrozenDict = freeze(copy.deepcopy(defaults) if defaults else {})
+        self._subs: List[Tuple[Optional[str], Subscriber]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.reload(force=True)
+
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _parse(self) -> Optional[Dict[str, Any]]:
+        raw: Dict[str, Any] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+            except Exception:
+                return None
+            if not isinstance(raw, dict):
+                return None
+        return merge_config(self.defaults, raw) if self.defaults else raw
+
+    def snapshot(self) -> FrozenDict:
+        if time.monotonic() - self._checked >= self.check_interval:
+            self.reload()
+        return self._snap
+
+    def reload(self, force: bool = False) -> bool:
+        with self._lock:
+            self._checked = time.monotonic()
+            stamp = self._file_stamp()
+            if not force and stamp == self._stamp:
+                return False
+            data = self._parse()
+            self._stamp = stamp
+            if data is None:
+                # 写入过程中或损坏：保留上一份快照，待下次变化再试
+                return False
+            old, new = self._snap, freeze(data)
+            if new == old and self.version:
+                return False
+            self._snap = new
+            self.version += 1
+            subs = list(self._subs)
+        self._notify(subs, old, new)
+        return True
+
+    def _notify(self, subs: List[Tuple[Optional[str], Subscriber]], old: FrozenDict, new: FrozenDict) -> None:
+        for section, fn in subs:
+            o = old if section is None else old.get(section)
+            n = new if section is None else new.get(section)
+            if o == n:
+                continue
+            try:
+                fn(n, o)
+            except Exception:
+                pass
+
+    def subscribe(self, section: Optional[str], fn: Subscriber) -> Callable[[], None]:
+        entry = (section, fn)
+        with self._lock:
+            self._subs.append(entry)
+
+        def _unsubscribe() -> None:
+            with self._lock:
+                if entry in self._subs:
+                    self._subs.remove(entry)
+
+        return _unsubscribe
+
+    def watch(self, interval: Optional[float] = None) -> None:
+        """后台轮询 mtime；适用于长驻进程（服务端），无读请求时也能及时通知订阅者。"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        period = float(interval if interval is not None else self.check_interval)
+        self._stop.clear()
+
+        def _loop() -> None:
+            while not self._stop.wait(period):
+                try:
+                    self.reload()
+                except Exception:
+                    pass
+
+        self._watcher = threading.Thread(target=_loop, name="config-watch", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+_SERVICES: Dict[Tuple[str, int], ConfigService] = {}
+_SERVICES_LOCK = threading.Lock()
+
+
+def get_service(path: Optional[str] = None, defaults: Optional[Dict[str, Any]] = DEFAULTS) -> ConfigService:
+    p = os.path.abspath(path or "config.json")
+    key = (p, id(defaults))
+    with _SERVICES_LOCK:
+        svc = _SERVICES.get(key)
+        if svc is None:
+            svc = ConfigService(p, defaults=defaults)
+            _SERVICES[key] = svc
+        return svc
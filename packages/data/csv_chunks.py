@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: data.csv_chunks
+  目标: 将大 CSV 按字节切分为若干区间，供多进程分块处理；区间起止都落在记录边界上（不会切断带引号字段内的换行）
+  接口:
+    - read_header(path) -> (header, body_offset)
+    - split_csv(path, n_chunks, min_chunk_bytes, start=None, end=None) -> (header: list[str], ranges: list[(start, end)])
+    - last_record_end(path, start, end) -> int（最后一条以换行结束的记录之后的位置；增量聚合的提交点）
+    - read_chunk_rows(path, start, end, header) -> Iterator[dict]（与 csv.DictReader 对同一段记录的结果一致，逐行流式）
+  边界: 引号奇偶计数——从文件头累计 '"' 个数，只有当之前的引号数为偶数（不在引号字段内）时，换行才是记录边界；
+        转义引号 "" 成对出现，不改变奇偶。非引号字段中出现的裸引号会使该判定失效（RFC 4180 不允许此写法）
+  约束: 单遍顺序扫描（按块计数，C 速度）；文件为 UTF-8（换行字节不会出现在多字节字符内部）
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_BLOCK = 4 * 1024 * 1024
+
+
+def _record_end(f, pos: int, parity: int) -> Tuple[Optional[int], int]:
+    """从 pos（其前引号奇偶为 parity）起找第一个引号外的换行，返回 (换行后位置|None, 该位置处的奇偶)。"""
+    f.seek(pos)
+    while True:
+        block = f.read(_BLOCK)
+        if not block:
+            return None, parity
+        i = 0
+        while True:
+            nl = block.find(b"\n", i)
+            if nl < 0:
+                parity = (parity + block.count(b'"', i)) & 1
+                pos += len(block)
+                break
+            parity = (parity + block.count(b'"', i, nl)) & 1
+            if parity == 0:
+                return pos + nl + 1, 0
+            i = nl + 1
+
+
+def _quotes_parity(f, start: int, end: int) -> int:
+    f.seek(start)
+    parity = 0
+    remaining = end - start
+    while remaining > 0:
+        block = f.read(min(_BLOCK, remaining))
+        if not block:
+            break
+        parity = (parity + block.count(b'"')) & 1
+        remaining -= len(block)
+    return parity
+
+
+def read_header(path: str) -> Tuple[List[str], int]:
+    """表头字段与正文起始字节偏移。"""
+    with open(path, "rb") as f:
+        body, _ = _record_end(f, 0, 0)
+        if body is None:
+            body = os.fstat(f.fileno()).st_size
+        f.seek(0)
+        header_text = f.read(body).decode("utf-8")
+    return next(csv.reader(io.StringIO(header_text, newline="")), []), body
+
+
+def split_csv(
+    path: str,
+    n_chunks: int,
+    min_chunk_bytes: int = 4 * 1024 * 1024,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """切分 [start, end)（缺省为整个正文）；start 与 end 须为记录边界。"""
+    header, body = read_header(path)
+    lo = body if start is None else max(body, int(start))
+    hi = os.path.getsize(path) if end is None else int(end)
+    ranges: List[Tuple[int, int]] = []
+    if hi <= lo:
+        return header, ranges
+    n = max(1, min(int(n_chunks), (hi - lo) // max(1, int(min_chunk_bytes)) or 1))
+    with open(path, "rb") as f:
+        cur = lo
+        parity_pos, parity = lo, 0
+        for k in range(1, n):
+            target = lo + (hi - lo) * k // n
+            if target <= cur:
+                continue
+            # 累计到 target 的引号奇偶，再向后找引号外的换行
+            parity = (parity + _quotes_parity(f, parity_pos, target)) & 1
+            cut, parity = _record_end(f, target, parity)
+            if cut is None or cut >= hi:
+                break
+            parity_pos = cut
+            ranges.append((cur, cut))
+            cur = cut
+        if cur < hi:
+            ranges.append((cur, hi))
+    return header, ranges
+
+
+def last_record_end(path: str, start: int, end: int) -> int:
+    """[start, end) 内最后一个引号外换行之后的位置（start 须为记录起点）；其后是未以换行结尾、可能仍在写入的记录。
+    没有完整记录时返回 start。"""
+    with open(path, "rb") as f:
+        total = _quotes_parity(f, start, end)
+        # suffix: [换行位置, end) 内的引号奇偶；[start, 换行) 的奇偶 = total ^ suffix
+        suffix = 0
+        pos = end
+        while pos > start:
+            lo = max(start, pos - _BLOCK)
+            f.seek(lo)
+            block = f.read(pos - lo)
+            i = len(block)
+            while True:
+                nl = block.rfind(b"\n", 0, i)
+                if nl < 0:
+                    suffix = (suffix + block.count(b'"', 0, i)) & 1
+                    break
+                suffix = (suffix + block.count(b'"', nl, i)) & 1
+                if total ^ suffix == 0:
+                    return lo + nl + 1
+                i = nl
+            pos = lo
+    return start
+
+
+def _lines(f, end: int) -> Iterator[str]:
+    pos = f.tell()
+    while pos < end:
+        line = f.readline(end - pos)
+        if not line:
+            break
+        pos += len(line)
+        yield line.decode("utf-8")
+
+
+def read_chunk_rows(path: str, start: int, end: int, header: List[str]) -> Iterator[Dict[str, str]]:
+    """逐行流式读取 [start, end) 内的记录（不整段读入内存）。"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        yield from csv.DictReader(_lines(f, end), fieldnames=header)
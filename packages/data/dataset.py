@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: data.dataset
+  目标: 紧凑的列式数据集：每列一段 array（可零拷贝转 NumPy），类型推断（int/float/date/str），
+        字符串列字典编码，空值位图；同时提供“行字典”兼容视图，现有按 List[Dict[str, str]] 编写的代码无需改动
+  接口:
+    - Column(name, kind, data, nulls, dictionary)（data 为 array，或磁盘缓存映射出的同类型 memoryview，见 data.dataset_cache）
+        .get(i) -> str（规则行与 csv.DictReader 读到的原始文本一致；空值为 ""）/ .iter_str() / .numeric() / .numpy() / .nbytes
+    - Dataset(columns, nrows)
+        序列协议: len(ds) / ds[i] -> dict / ds[a:b] -> list[dict] / iter(ds) -> dict；与 list[dict] 比较相等
+        .names / .column(name) / .cell(i, name) / .take(indices) / .map_str(fn) / .nonempty_indices(names) / .nbytes
+        Dataset.from_rows(rows)
+    - load_csv(path) -> Dataset（csv.reader 直接解析为列，不构造行字典）
+  类型推断: 只有当列内全部非空文本都能由类型值无损还原（int: str(int(s)) == s；float: repr(float(s)) == s；
+        date: ISO YYYY-MM-DD）时才采用该类型，否则为字典编码字符串列；因此兼容视图逐字节还原原文
+  不规则行: 与 csv.DictReader 不同——字段少于表头的行，缺失字段取 ""（DictReader 为 None）；字段多于表头的行，
+        多余字段被丢弃（DictReader 收入键为 None 的列表）。csv_clean / stats_aggregate 对 None 与 "" 的处理相同，
+        故短行的清洗、聚合结果与行字典路径一致
+  约束: 仅依赖标准库；NumPy 可用时 .numpy() 返回零拷贝视图
+"""
+
+from __future__ import annotations
+
+import collections.abc
+import csv
+import datetime
+import re
+import sys
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+_INT_RE = re.compile(r"-?[0-9]+")
+_DATE_RE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+_INT64 = (-(2 ** 63), 2 ** 63 - 1)
+
+# array 类型码：int64 / float64 / int32（日期序数）/ uint32（字典编码）
+_TYPECODE = {"int": "q", "float": "d", "date": "i", "str": "I"}
+
+
+def _is_int(v: str) -> bool:
+    if not _INT_RE.fullmatch(v):
+        return False
+    n = int(v)
+    return str(n) == v and _INT64[0] <= n <= _INT64[1]
+
+
+def _is_float(v: str) -> bool:
+    try:
+        return repr(float(v)) == v
+    except ValueError:
+        return False
+
+
+def _is_date(v: str) -> bool:
+    if not _DATE_RE.fullmatch(v):
+        return False
+    try:
+        return datetime.date.fromisoformat(v).isoformat() == v
+    except ValueError:
+        return False
+
+
+def infer_kind(values: Sequence[str]) -> str:
+    nonnull = [v for v in values if v]
+    if not nonnull:
+        return "str"
+    for kind, ok in (("int", _is_int), ("float", _is_float), ("date", _is_date)):
+        if all(ok(v) for v in nonnull):
+            return kind
+    return "str"
+
+
+class Column:
+    __slots__ = ("name", "kind", "data", "nulls", "dictionary")
+
+    def __init__(self, name: str, kind: str, data: array, nulls: Optional[bytearray] = None, dictionary: Optional[List[str]] = None) -> None:
+        self.name = name
+        self.kind = kind
+        self.data = data
+        # 位图：第 i 位为 1 表示第 i 行为空；无空值时为 None
+        self.nulls = nulls
+        self.dictionary = dictionary
+
+    @classmethod
+    def from_strings(cls, name: str, values: Sequence[str], kind: Optional[str] = None) -> "Column":
+        kind = kind or infer_kind(values)
+        n = len(values)
+        nulls: Optional[bytearray] = None
+        if any(not v for v in values):
+            nulls = bytearray((n + 7) // 8)
+            for i, v in enumerate(values):
+                if not v:
+                    nulls[i >> 3] |= 1 << (i & 7)
+        dictionary: Optional[List[str]] = None
+        data: array
+        if kind == "int":
+            data = array(_TYPECODE[kind], (int(v) if v else 0 for v in values))
+        elif kind == "float":
+            data = array(_TYPECODE[kind], (float(v) if v else 0.0 for v in values))
+        elif kind == "date":
+            data = array(_TYPECODE[kind], (datetime.date.fromisoformat(v).toordinal() if v else 0 for v in values))
+        else:
+            codes: Dict[str, int] = {}
+            dictionary = []
+            data = array(_TYPECODE["str"])
+            append = data.append
+            for v in values:
+                if not v:
+                    append(0)
+                    continue
+                c = codes.get(v)
+                if c is None:
+                    c = codes[v] = len(dictionary)
+                    dictionary.append(sys.intern(v))
+                append(c)
+        return cls(name, kind, data, nulls, dictionary)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __reduce__(self) -> Any:
+        # 映射自磁盘缓存的 memoryview 不可序列化：跨进程传递时复制为 array
+        data = self.data if isinstance(self.data, array) else array(_TYPECODE[self.kind], self.data)
+        nulls = bytearray(self.nulls) if self.nulls is not None else None
+        return (Column, (self.name, self.kind, data, nulls, self.dictionary))
+
+    def is_null(self, i: int) -> bool:
+        return self.nulls is not None and bool(self.nulls[i >> 3] & (1 << (i & 7)))
+
+    def _fmt(self, v: Any) -> str:
+        if self.kind == "int":
+            return str(v)
+        if self.kind == "float":
+            return repr(v)
+        if self.kind == "date":
+            return datetime.date.fromordinal(v).isoformat()
+        return self.dictionary[v]  # type: ignore[index]
+
+    def get(self, i: int) -> str:
+        if self.is_null(i):
+            return ""
+        return self._fmt(self.data[i])
+
+    def iter_str(self) -> Iterator[str]:
+        if self.nulls is None:
+            if self.kind == "str":
+                return map(self.dictionary.__getitem__, self.data)  # type: ignore[index]
+            return map(self._fmt, self.data)
+        return (self.get(i) for i in range(len(self.data)))
+
+    def numeric(self) -> Optional[array]:
+        """int/float 列的数值（空值为 0，与宽松解析 "" → 0.0 一致）；其它类型返回 None。"""
+        return self.data if self.kind in ("int", "float") else None
+
+    def numpy(self) -> Any:
+        import numpy as np  # type: ignore
+
+        return np.frombuffer(self.data, dtype=_TYPECODE[self.kind] if self.kind != "str" else np.uint32)
+
+    def take(self, indices: Sequence[int]) -> "Column":
+        data = array(_TYPECODE[self.kind], (self.data[i] for i in indices))
+        nulls: Optional[bytearray] = None
+        if self.nulls is not None:
+            nulls = bytearray((len(indices) + 7) // 8)
+            for j, i in enumerate(indices):
+                if self.is_null(i):
+                    nulls[j >> 3] |= 1 << (j & 7)
+        return Column(self.name, self.kind, data, nulls, self.dictionary)
+
+    @property
+    def nbytes(self) -> int:
+        n = self.data.itemsize * len(self.data) + (len(self.nulls) if self.nulls is not None else 0)
+        if self.dictionary is not None:
+            n += sum(49 + len(s) for s in self.dictionary) + 8 * len(self.dictionary)
+        return n
+
+
+class Dataset(collections.abc.Sequence):
+    """列式数据集；同时是“行字典”的只读序列（兼容 List[Dict[str, str]]）。"""
+
+    def __init__(self, columns: List[Column], nrows: Optional[int] = None) -> None:
+        self.columns = columns
+        self._by_name = {c.name: c for c in columns}
+        self.nrows = nrows if nrows is not None else (len(columns[0]) if columns else 0)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "Dataset":
+        rows = list(rows)
+        names: List[str] = list(rows[0].keys()) if rows else []
+        cols = [Column.from_strings(n, [_text(r.get(n)) for r in rows]) for n in names]
+        return cls(cols, len(rows))
+
+    @property
+    def names(self) -> List[str]:
+        return [c.name for c in self.columns]
+
+    def column(self, name: str) -> Optional[Column]:
+        return self._by_name.get(name)
+
+    def cell(self, i: int, name: str, default: str = "") -> str:
+        c = self._by_name.get(name)
+        return c.get(i) if c is not None else default
+
+    # ---- 行字典兼容视图 ----
+    def __len__(self) -> int:
+        return self.nrows
+
+    def __getitem__(self, i: Any) -> Any:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.nrows))]
+        if i < 0:
+            i += self.nrows
+        if not 0 <= i < self.nrows:
+            raise IndexError(i)
+        return {c.name: c.get(i) for c in self.columns}
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        names = self.names
+        for vals in zip(*(c.iter_str() for c in self.columns)):
+            yield dict(zip(names, vals))
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (Dataset, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        kinds = ", ".join(f"{c.name}:{c.kind}" for c in self.columns)
+        return f"Dataset(rows={self.nrows}, columns=[{kinds}])"
+
+    # ---- 列式操作 ----
+    def take(self, indices: Sequence[int]) -> "Dataset":
+        return Dataset([c.take(indices) for c in self.columns], len(indices))
+
+    def map_str(self, fn: Callable[[str], str]) -> "Dataset":
+        """对字符串列的字典项逐个应用 fn（代价与不同值个数成正比）；数值/日期列的文本为规范形式，原样保留。"""
+        cols = []
+        for c in self.columns:
+            if c.kind == "str":
+                cols.append(Column(c.name, c.kind, c.data, c.nulls, [fn(s) for s in c.dictionary or []]))
+            else:
+                cols.append(c)
+        return Dataset(cols, self.nrows)
+
+    def nonempty_indices(self, names: Sequence[str]) -> List[int]:
+        """names 中各列均非空（文本不为 ""）的行下标；缺失的列视为全空。"""
+        keep = bytearray(b"\x01") * self.nrows
+        for name in names:
+            c = self._by_name.get(name)
+            if c is None:
+                return []
+            if c.nulls is not None:
+                for i in range(self.nrows):
+                    if c.nulls[i >> 3] & (1 << (i & 7)):
+                        keep[i] = 0
+            if c.kind == "str":
+                empty = {k for k, s in enumerate(c.dictionary or []) if not s}
+                if empty:
+                    for i, code in enumerate(c.data):
+                        if code in empty:
+                            keep[i] = 0
+        return [i for i in range(self.nrows) if keep[i]]
+
+    @property
+    def nbytes(self) -> int:
+        return 64 + sum(c.nbytes for c in self.columns)
+
+
+def _text(v: Any) -> str:
+    return "" if v is None else str(v)
+
+
+def load_csv(path: str) -> Dataset:
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return Dataset([], 0)
+        width = len(header)
+        cols: List[List[str]] = [[] for _ in range(width)]
+        nrows = 0
+        for rec in reader:
+            if not rec:
+                # 与 csv.DictReader 一致：跳过空行
+                continue
+            nrows += 1
+            if len(rec) < width:
+                rec = rec + [""] * (width - len(rec))
+            for j in range(width):
+                cols[j].append(rec[j])
+    return Dataset([Column.from_strings(name, vals) for name, vals in zip(header, cols)], nrows)
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: data.dataset_cache
+  目标: 已解析 CSV 的磁盘缓存：跨进程、跨运行复用 load_csv 的列式结果（定时任务对同一份周报文件反复运行、
+        replay --rerun、mcp_host 工具调用不再每次从头解析）
+  接口:
+    - DatasetCache(cache_dir, max_bytes, max_file_bytes)
+        .load(path) -> Dataset（命中则 mmap 映射缓存文件，列数据零拷贝；未命中则解析并写入）
+        .lookup(path) -> Dataset|None（只查不写）/ .cacheable(path) / .clear() / .stats()
+    - dataset_cache() 进程级单例；configure_dataset_cache(cfg) 按 tools.dataset_cache.{enabled,dir,max_mb,max_file_mb} 调整
+    - load_csv_cached(path) -> Dataset（缓存关闭、文件过大或缓存读写失败时退化为 load_csv）
+  键: 快路径 (绝对路径, size, mtime_ns) → 内容 sha256（index.json）；统计信息不匹配（touch、拷贝、新路径）时才计算 sha256，
+      内容相同仍命中；缓存文件以内容 sha256 命名
+  格式: <sha256>.dsc = magic(8) + 头长度(8, little-endian) + JSON 头（行数/字节序/各列名、类型、数据/空值位图/字典段的偏移与长度）
+        + 8 字节对齐的原始段；数值/日期/字典编码列为 array 原始字节（读取时 memoryview.cast），字典为 JSON 数组
+  淘汰: 缓存文件总大小超过 max_bytes 时按最近使用时间（命中时刷新文件 mtime）淘汰；大于 max_file_bytes 的 CSV 不入缓存
+  约束: 仅标准库；写入先写临时文件再 os.replace，多进程并发的最坏情况是重复解析；文件损坏/版本或字节序不符视为未命中
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from packages.data.dataset import Column, Dataset, _TYPECODE, load_csv
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+MAGIC = b"SFDSC\x00\x01\x00"
+_SUFFIX = ".dsc"
+_INDEX = "index.json"
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def sha256_path(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(4 * 1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def dump_dataset(ds: Dataset, path: str) -> int:
+    """写出二进制列式文件，返回字节数（先写同目录临时文件再原子替换）。"""
+    segments: List[bytes] = []
+    cols: List[Dict[str, Any]] = []
+    pos = 0
+
+    def _seg(raw: bytes) -> List[int]:
+        nonlocal pos
+        at = pos
+        segments.append(raw)
+        pad = _align(len(raw)) - len(raw)
+        if pad:
+            segments.append(b"\x00" * pad)
+        pos += len(raw) + pad
+        return [at, len(raw)]
+
+    for c in ds.columns:
+        meta: Dict[str, Any] = {"name": c.name, "kind": c.kind, "data": _seg(bytes(memoryview(c.data).cast("B")))}
+        if c.nulls is not None:
+            meta["nulls"] = _seg(bytes(c.nulls))
+        if c.dictionary is not None:
+            meta["dictionary"] = _seg(json.dumps(c.dictionary, ensure_ascii=False).encode("utf-8"))
+        cols.append(meta)
+    header = json.dumps({"nrows": ds.nrows, "byteorder": sys.byteorder, "columns": cols}, ensure_ascii=False).encode("utf-8")
+    head_len = _align(len(header))
+    d = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=_SUFFIX, dir=d)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(head_len.to_bytes(8, "little"))
+            f.write(header.ljust(head_len, b" "))
+            for raw in segments:
+                f.write(raw)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return 16 + head_len + pos
+
+
+def map_dataset(path: str) -> Optional[Dataset]:
+    """mmap 映射缓存文件为 Dataset；格式不符返回 None。映射随 Dataset 的列数据存活。"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < 16:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buf = memoryview(mm)
+    if bytes(buf[:8]) != MAGIC:
+        return None
+    head_len = int.from_bytes(buf[8:16], "little")
+    header = json.loads(bytes(buf[16 : 16 + head_len]))
+    if header.get("byteorder") != sys.byteorder:
+        return None
+    base = 16 + head_len
+
+    def _view(seg: List[int]) -> memoryview:
+        at, n = seg
+        return buf[base + at : base + at + n]
+
+    cols = []
+    for meta in header["columns"]:
+        kind = meta["kind"]
+        data = _view(meta["data"]).cast(_TYPECODE[kind])
+        nulls = _view(meta["nulls"]) if "nulls" in meta else None
+        dictionary = json.loads(bytes(_view(meta["dictionary"]))) if "dictionary" in meta else None
+        cols.append(Column(meta["name"], kind, data, nulls, dictionary))  # type: ignore[arg-type]
+    return Dataset(cols, int(header["nrows"]))
+
+
+class DatasetCache:
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 1024 * 1024 * 1024, max_file_bytes: int = 256 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir or os.environ.get("DATASET_CACHE_DIR") or os.path.join(REPO_ROOT, ".cache", "datasets")
+        self.max_bytes = int(max_bytes)
+        self.max_file_bytes = int(max_file_bytes)
+        self.enabled = True
+        self._lock = threading.RLock()
+        self.counters: Dict[str, int] = {"hit": 0, "hash_hit": 0, "miss": 0, "write": 0, "evicted": 0, "error": 0}
+
+    # ---- 索引 ----
+    def _blob(self, sha: str) -> str:
+        return os.path.join(self.cache_dir, sha + _SUFFIX)
+
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.cache_dir, _INDEX), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=self.cache_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.cache_dir, _INDEX))
+
+    def _remember(self, p: str, st: os.stat_result, sha: str) -> None:
+        with self._lock:
+            index = self._read_index()
+            index[p] = {"size": int(st.st_size), "mtime_ns": int(st.st_mtime_ns), "sha256": sha}
+            # 只保留缓存文件仍存在的条目
+            index = {k: v for k, v in index.items() if isinstance(v, dict) and os.path.exists(self._blob(str(v.get("sha256"))))}
+            self._write_index(index)
+
+    def _open(self, sha: str) -> Optional[Dataset]:
+        blob = self._blob(sha)
+        if not os.path.exists(blob):
+            return None
+        try:
+            ds = map_dataset(blob)
+        except (OSError, ValueError, KeyError, TypeError):
+            ds = None
+        if ds is None:
+            self.counters["error"] += 1
+            try:
+                os.unlink(blob)
+            except OSError:
+                pass
+            return None
+        try:
+            # 刷新 mtime 作为 LRU 时间
+            os.utime(blob)
+        except OSError:
+            pass
+        return ds
+
+    # ---- 查询 ----
+    def cacheable(self, path: str) -> bool:
+        try:
+            return self.enabled and os.path.getsize(path) <= self.max_file_bytes
+        except OSError:
+            return False
+
+    def _lookup(self, path: str) -> Tuple[Optional[Dataset], str, Optional[str], os.stat_result]:
+        p = os.path.abspath(path)
+        st = os.stat(p)
+        ent = self._read_index().get(p)
+        if isinstance(ent, dict) and ent.get("size") == st.st_size and ent.get("mtime_ns") == st.st_mtime_ns:
+            ds = self._open(str(ent.get("sha256")))
+            if ds is not None:
+                self.counters["hit"] += 1
+                return ds, p, str(ent["sha256"]), st
+        # 统计信息不匹配：按内容哈希再查一次（touch 过或同内容拷贝）
+        sha = sha256_path(p)
+        ds = self._open(sha)
+        if ds is not None:
+            self.counters["hash_hit"] += 1
+            self._remember(p, st, sha)
+        return ds, p, sha, st
+
+    def lookup(self, path: str) -> Optional[Dataset]:
+        if not self.cacheable(path):
+            return None
+        try:
+            return self._lookup(path)[0]
+        except OSError:
+            return None
+
+    def load(self, path: str) -> Dataset:
+        if not self.cacheable(path):
+            return load_csv(path)
+        try:
+            ds, p, sha, st = self._lookup(path)
+        except OSError:
+            return load_csv(path)
+        if ds is not None:
+            return ds
+        self.counters["miss"] += 1
+        ds = load_csv(p)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            dump_dataset(ds, self._blob(str(sha)))
+            self.counters["write"] += 1
+            self._remember(p, st, str(sha))
+            self._evict()
+        except OSError:
+            self.counters["error"] += 1
+        return ds
+
+    # ---- 淘汰 ----
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        out = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for e in it:
+                    if e.name.endswith(_SUFFIX) and not e.name.startswith(".tmp-"):
+                        try:
+                            st = e.stat()
+                        except OSError:
+                            continue
+                        out.append((st.st_mtime, int(st.st_size), e.path))
+        except OSError:
+            pass
+        return out
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(n for _, n, _ in entries)
+            for _, n, blob in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    # 已映射的文件在 POSIX 上删除后映射仍有效
+                    os.unlink(blob)
+                except OSError:
+                    continue
+                total -= n
+                self.counters["evicted"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for _, _, blob in self._entries():
+                try:
+                    os.unlink(blob)
+                except OSError:
+                    pass
+            try:
+                os.unlink(os.path.join(self.cache_dir, _INDEX))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        return {
+            "enabled": self.enabled,
+            "dir": self.cache_dir,
+            "files": len(entries),
+            "bytes": sum(n for _, n, _ in entries),
+            "max_bytes": self.max_bytes,
+            "max_file_bytes": self.max_file_bytes,
+            **self.counters,
+        }
+
+
+_CACHE: Optional[DatasetCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def dataset_cache() -> DatasetCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = DatasetCache()
+        return _CACHE
+
+
+def configure_dataset_cache(cfg: Optional[Dict[str, Any]]) -> DatasetCache:
+    c = ((cfg or {}).get("tools", {}) or {}).get("dataset_cache") or {}
+    cache = dataset_cache()
+    with cache._lock:
+        cache.enabled = bool(c.get("enabled", True))
+        if c.get("dir"):
+            cache.cache_dir = str(c["dir"])
+        if c.get("max_mb") is not None:
+            cache.max_bytes = int(float(c["max_mb"]) * 1024 * 1024)
+        if c.get("max_file_mb") is not None:
+            cache.max_file_bytes = int(float(c["max_file_mb"]) * 1024 * 1024)
+    return cache
+
+
+def load_csv_cached(path: str) -> Dataset:
+    try:
+        return dataset_cache().load(path)
+    except Exception:
+        return load_csv(path)
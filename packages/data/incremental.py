@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: data.incremental
+  目标: 追加写入型数据文件的增量聚合状态：记住上次处理到的字节偏移、该前缀的 sha256 与部分聚合结果，
+        下次运行校验前缀未变后只解析新增尾部再合并，日常重跑的解析代价与增量成正比
+  接口:
+    - IncrementalStore(state_dir, min_file_bytes)
+        .applies(path) -> bool（启用且文件不小于 min_file_bytes）
+        .key(path, *parts) -> str（绝对路径 + 清洗/聚合参数）
+        .load(key) -> state|None / .save(key, state) / .clear() / .stats()
+        .verify(path, state) -> hasher|None（前缀一致时返回已喂入 [0, offset) 的 sha256 对象，可继续扩展到新的提交点）
+    - extend_hash(hasher, path, start, end) -> hexdigest
+    - incremental_store() 进程级单例；configure_incremental(cfg) 按 tools.incremental.{enabled,dir,min_file_mb} 调整
+  状态: {"path", "offset"（最后一条以换行结束的记录之后）, "prefix_sha256", "header", "partial"（stats_combine 形式）}
+  校验: 文件长度 >= offset 且 [0, offset) 的 sha256 与记录一致才视为追加；截断或改写则全量重算并覆盖状态
+  约束: 仅标准库；前缀校验需顺序读一遍前缀（哈希速度远高于 CSV 解析）；状态为 JSON，先写临时文件再 os.replace
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+_BLOCK = 4 * 1024 * 1024
+
+
+def extend_hash(h: Any, path: str, start: int, end: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(_BLOCK, remaining))
+            if not block:
+                break
+            h.update(block)
+            remaining -= len(block)
+    return h.hexdigest()
+
+
+class IncrementalStore:
+    def __init__(self, state_dir: Optional[str] = None, min_file_bytes: int = 16 * 1024 * 1024) -> None:
+        self.state_dir = state_dir or os.path.join(REPO_ROOT, ".cache", "incremental")
+        self.min_file_bytes = int(min_file_bytes)
+        self.enabled = True
+        self._lock = threading.Lock()
+        # incremental: 前缀一致只解析尾部；full: 无状态全量；reset: 前缀变化后全量
+        self.counters: Dict[str, int] = {"incremental": 0, "full": 0, "reset": 0, "tail_bytes": 0}
+
+    def applies(self, path: str) -> bool:
+        try:
+            return self.enabled and os.path.getsize(path) >= self.min_file_bytes
+        except OSError:
+            return False
+
+    def key(self, path: str, *parts: Any) -> str:
+        raw = json.dumps([os.path.abspath(path), *parts], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.state_dir, key + ".json")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file(key), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or not {"offset", "prefix_sha256", "header", "partial"} <= set(state):
+            return None
+        return state
+
+    def save(self, key: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            os.makedirs(self.state_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=self.state_dir)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp, self._file(key))
+
+    def verify(self, path: str, state: Dict[str, Any]) -> Optional[Any]:
+        offset = int(state.get("offset", 0))
+        try:
+            if os.path.getsize(path) < offset:
+                return None
+            h = hashlib.sha256()
+            digest = extend_hash(h, path, 0, offset)
+        except OSError:
+            return None
+        return h if digest == state.get("prefix_sha256") else None
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                names = os.listdir(self.state_dir)
+            except OSError:
+                return
+            for name in names:
+                if name.endswith(".json"):
+                    try:
+                        os.unlink(os.path.join(self.state_dir, name))
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "dir": self.state_dir, "min_file_bytes": self.min_file_bytes, **self.counters}
+
+
+_STORE: Optional[IncrementalStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def incremental_store() -> IncrementalStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = IncrementalStore()
+        return _STORE
+
+
+def configure_incremental(cfg: Optional[Dict[str, Any]]) -> IncrementalStore:
+    c = ((cfg or {}).get("tools", {}) or {}).get("incremental") or {}
+    store = incremental_store()
+    store.enabled = bool(c.get("enabled", True))
+    if c.get("dir"):
+        store.state_dir = str(c["dir"])
+    if c.get("min_file_mb") is not None:
+        store.min_file_bytes = int(float(c["min_file_mb"]) * 1024 * 1024)
+    return store
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: prompts.budget
+  目标: 提示词 token 预算：按模型族快速估算 token，按段落（SRS/CSV_EXCERPT/PLAN/CRITIC/REPORT_MD）预算逐级压缩
+  接口:
+    - estimate_tokens(text, model=None) -> int（本地启发式，O(n) 且无外部依赖）
+    - srs_candidates / csv_candidates / json_candidates / report_candidates: 由宽到紧的候选渲染
+    - fit_sections(candidates, budget_cfg, model, fixed_text="") -> (vars, meta)
+  压缩策略:
+    - SRS: 紧凑 JSON → 验收条目扁平为文本 → 去掉验收/约束（评审阶段保留验收）→ 仅 goal+params
+    - CSV: 原始片段 → 列 schema + 列统计 + 分层抽样行（按评分列分位数或按位置均匀抽样），逐步减少样本行
+    - 报告: 原文 → 保留首尾、省略中段
+  配置: llm.prompt_budget = {enabled, total, sections: {SRS, CSV_EXCERPT, PLAN, CRITIC, REPORT_MD}, csv_sample_rows}
+  约束: 段落未超预算时保持原样（SRS 仅去空白）；meta 记录各段 token 估算与所用压缩级别
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# 模型族 -> (非 CJK 字符/token, CJK 字符的 token/字)
+_FAMILIES: Dict[str, Tuple[float, float]] = {
+    "openai": (4.0, 0.75),
+    "qwen": (3.7, 0.65),
+    "claude": (3.5, 1.1),
+    "llama": (3.8, 1.3),
+    "default": (4.0, 1.0),
+}
+
+
+def model_family(model: Optional[str]) -> str:
+    m = (model or "").lower()
+    if any(x in m for x in ("gpt", "openai/", "o1", "o3", "o4")):
+        return "openai"
+    if "qwen" in m:
+        return "qwen"
+    if "claude" in m or "anthropic" in m:
+        return "claude"
+    if any(x in m for x in ("llama", "mistral", "mixtral")):
+        return "llama"
+    return "default"
+
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    """启发式估算：UTF-8 多字节字符（主要为 CJK）按字计，其余按字符/比值计。"""
+    if not text:
+        return 0
+    ascii_ratio, cjk_ratio = _FAMILIES[model_family(model)]
+    n_chars = len(text)
+    # CJK 在 UTF-8 中为 3 字节：多出的字节数 / 2 ≈ 非 ASCII 字符数（C 层计算，无 Python 逐字循环）
+    n_wide = (len(text.encode("utf-8")) - n_chars) // 2
+    n_wide = min(n_wide, n_chars)
+    return int((n_chars - n_wide) / ascii_ratio + n_wide * cjk_ratio) + 1
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# ---------- 候选渲染 ----------
+Candidate = Callable[[], str]
+
+
+def srs_candidates(srs: Dict[str, Any], keep_acceptance: bool = False) -> List[Candidate]:
+    def _flat() -> str:
+        s = {k: v for k, v in srs.items() if v not in (None, "", [], {})}
+        acc = s.get("acceptance")
+        if isinstance(acc, list):
+            s["acceptance"] = [a.get("then") if isinstance(a, dict) and a.get("then") else a for a in acc]
+        return _dumps(s)
+
+    def _core() -> str:
+        drop = {"constraints"} if keep_acceptance else {"acceptance", "constraints"}
+        s = {k: v for k, v in srs.items() if k not in drop and v not in (None, "", [], {})}
+        acc = s.get("acceptance")
+        if isinstance(acc, list):
+            s["acceptance"] = [a.get("then") if isinstance(a, dict) and a.get("then") else a for a in acc]
+        return _dumps(s)
+
+    def _min() -> str:
+        s = {k: srs[k] for k in ("goal", "params") if k in srs}
+        return _dumps(s)
+
+    return [lambda: _dumps(srs), _flat, _core, _min]
+
+
+def json_candidates(obj: Any, keep: Sequence[str] = ()) -> List[Candidate]:
+    out: List[Candidate] = [lambda: _dumps(obj)]
+    if keep and isinstance(obj, dict):
+        out.append(lambda: _dumps({k: obj[k] for k in keep if k in obj}))
+    return out
+
+
+def _to_number(x: Any) -> Optional[float]:
+    try:
+        return float(str(x).replace(",", ""))
+    except Exception:
+        return None
+
+
+def _fmt(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else f"{v:.4g}"
+
+
+def csv_profile(rows: List[Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+    """返回 (列名, 每列 schema/统计描述行)。数值列给出 min/max/mean，文本列给出非空数与去重数。"""
+    cols: List[str] = list(rows[0].keys()) if rows else []
+    lines: List[str] = []
+    for c in cols:
+        vals = [r.get(c) for r in rows if r.get(c) not in (None, "")]
+        nums = [n for n in (_to_number(v) for v in vals) if n is not None]
+        if vals and len(nums) == len(vals):
+            lines.append(
+                f"{c}:num non_empty={len(vals)} min={_fmt(min(nums))} max={_fmt(max(nums))} mean={_fmt(sum(nums) / len(nums))}"
+            )
+        else:
+            lines.append(f"{c}:str non_empty={len(vals)} distinct={len(set(map(str, vals)))}")
+    return cols, lines
+
+
+def stratified_sample(rows: List[Dict[str, Any]], k: int, score_by: Optional[str] = None) -> List[Dict[str, Any]]:
+    """分层抽样：有数值评分列时按其分位数均匀取样（覆盖头部/中部/尾部），否则按位置均匀取样。"""
+    n = len(rows)
+    if k <= 0 or n == 0:
+        return []
+    if k >= n:
+        return list(rows)
+    order = list(range(n))
+    if score_by and rows and score_by in rows[0]:
+        order.sort(key=lambda i: (_to_number(rows[i].get(score_by)) or 0.0), reverse=True)
+    if k == 1:
+        picks = [order[0]]
+    else:
+        picks = [order[round(j * (n - 1) / (k - 1))] for j in range(k)]
+    # 去重并恢复原始顺序，保持可读
+    return [rows[i] for i in sorted(set(picks))]
+
+
+def compact_csv(rows: List[Dict[str, Any]], k: int, score_by: Optional[str] = None) -> str:
+    cols, prof = csv_profile(rows)
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=cols, extrasaction="ignore", lineterminator="\n")
+    w.writeheader()
+    sample = stratified_sample(rows, k, score_by)
+    for r in sample:
+        w.writerow(r)
+    head = [f"# rows={len(rows)} sample={len(sample)} (stratified{' by ' + score_by if score_by else ''})"]
+    head += [f"# {p}" for p in prof]
+    return "\n".join(head) + "\n" + buf.getvalue().rstrip("\n")
+
+
+def csv_candidates(
+    excerpt: str,
+    rows: Optional[List[Dict[str, Any]]] = None,
+    score_by: Optional[str] = None,
+    sample_rows: int = 40,
+) -> List[Candidate]:
+    def _rows() -> List[Dict[str, Any]]:
+        if rows:
+            return rows
+        try:
+            return list(csv.DictReader(io.StringIO(excerpt or "")))
+        except Exception:
+            return []
+
+    out: List[Candidate] = [lambda: excerpt]
+    k = max(1, int(sample_rows))
+    ks: List[int] = []
+    while k >= 1:
+        ks.append(k)
+        k //= 2
+    ks.append(0)
+    for kk in ks:
+        out.append(lambda kk=kk: compact_csv(_rows(), kk, score_by))
+    return out
+
+
+def report_candidates(text: str, model: Optional[str] = None, budget: Optional[int] = None) -> List[Candidate]:
+    def _trim(frac: float) -> str:
+        lines = (text or "").split("\n")
+        if budget is None or len(lines) < 8:
+            return text
+        total = estimate_tokens(text, model)
+        keep = max(4, int(len(lines) * min(1.0, budget / max(1, total)) * frac))
+        if keep >= len(lines):
+            return text
+        head, tail = lines[: keep * 2 // 3], lines[-(keep - keep * 2 // 3):]
+        return "\n".join(head + [f"...[省略 {len(lines) - len(head) - len(tail)} 行]..."] + tail)
+
+    return [lambda: text, lambda: _trim(0.9), lambda: _trim(0.6), lambda: _trim(0.3)]
+
+
+# ---------- 预算拟合 ----------
+DEFAULT_SECTIONS: Dict[str, int] = {"SRS": 1000, "CSV_EXCERPT": 3000, "PLAN": 1000, "CRITIC": 800, "REPORT_MD": 4000}
+
+
+def fit_sections(
+    candidates: Dict[str, List[Candidate]],
+    budget_cfg: Optional[Dict[str, Any]],
+    model: Optional[str] = None,
+    fixed_text: str = "",
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """为每个段落选取不超过其预算的最宽候选；若合计仍超 total，则继续压缩当前最大的段落。
+
+    fixed_text: 不可压缩部分（system 提示与模板正文），计入 total。
+    """
+    cfg = budget_cfg or {}
+    enabled = bool(cfg.get("enabled", True)) and bool(budget_cfg)
+    sec_budgets = dict(DEFAULT_SECTIONS)
+    sec_budgets.update(cfg.get("sections", {}) or {})
+    total_budget = cfg.get("total")
+
+    level: Dict[str, int] = {k: 0 for k in candidates}
+    text: Dict[str, str] = {}
+    tokens: Dict[str, int] = {}
+
+    def _eval(name: str) -> None:
+        text[name] = candidates[name][level[name]]()
+        tokens[name] = estimate_tokens(text[name], model)
+
+    for name in candidates:
+        _eval(name)
+        if not enabled:
+            continue
+        limit = int(sec_budgets.get(name, 0) or 0)
+        while limit and tokens[name] > limit and level[name] + 1 < len(candidates[name]):
+            level[name] += 1
+            _eval(name)
+
+    fixed = estimate_tokens(fixed_text, model)
+    if enabled and total_budget:
+        while fixed + sum(tokens.values()) > int(total_budget):
+            shrinkable = [n for n in candidates if level[n] + 1 < len(candidates[n])]
+            if not shrinkable:
+                break
+            name = max(shrinkable, key=lambda n: tokens[n])
+            level[name] += 1
+            _eval(name)
+
+    est = fixed + sum(tokens.values())
+    meta = {
+        "family": model_family(model),
+        "prompt_tokens_est": est,
+        "sections": {n: {"tokens": tokens[n], "level": level[n]} for n in candidates},
+        "budget": int(total_budget) if total_budget else None,
+        "within_budget": (est <= int(total_budget)) if total_budget else True,
+    }
+    return text, meta
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: prompts.template
+  目标: 提示词模板编译与缓存：模板解析一次为 字面量/槽位 片段，单趟拼接渲染
+  接口:
+    - Template(source).render(vars) -> str（缺失变量保留 {{NAME}} 原样；变量值中的 {{X}} 不会被再次替换）
+    - compile_template(source) -> Template（按源文本缓存）
+    - load_template(path) -> Template（按 (path, mtime) 缓存，热更新；文件不存在返回空模板）
+    - set_reload_interval(seconds): 同一路径两次 stat 之间的最短间隔（热路径零 IO）
+  约束: 渲染 O(输出长度)；进程内缓存线程安全
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Tuple
+
+
+_SLOT_RE = re.compile(r"\{\{([A-Za-z_][A-Za-z0-9_]*)\}\}")
+
+
+class Template:
+    __slots__ = ("source", "literals", "slots")
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        literals: List[str] = []
+        slots: List[str] = []
+        pos = 0
+        for m in _SLOT_RE.finditer(source):
+            literals.append(source[pos:m.start()])
+            slots.append(m.group(1))
+            pos = m.end()
+        literals.append(source[pos:])
+        # 不变式: len(literals) == len(slots) + 1
+        self.literals: Tuple[str, ...] = tuple(literals)
+        self.slots: Tuple[str, ...] = tuple(slots)
+
+    def render(self, vars: Mapping[str, str]) -> str:
+        if not self.slots:
+            return self.source
+        lits = self.literals
+        parts: List[str] = [lits[0]]
+        for i, name in enumerate(self.slots):
+            v = vars.get(name)
+            parts.append("{{" + name + "}}" if v is None else str(v))
+            parts.append(lits[i + 1])
+        return "".join(parts)
+
+    def __bool__(self) -> bool:
+        return bool(self.source)
+
+
+@lru_cache(maxsize=256)
+def compile_template(source: str) -> Template:
+    return Template(source)
+
+
+_EMPTY = Template("")
+_RELOAD_INTERVAL = 1.0
+# path -> (mtime, 上次 stat 时间, Template)
+_FILES: Dict[str, Tuple[Optional[float], float, Template]] = {}
+_LOCK = threading.Lock()
+
+
+def set_reload_interval(seconds: float) -> None:
+    global _RELOAD_INTERVAL
+    _RELOAD_INTERVAL = max(0.0, float(seconds))
+
+
+def load_template(path: str) -> Template:
+    now = time.monotonic()
+    with _LOCK:
+        hit = _FILES.get(path)
+    if hit is not None and now - hit[1] < _RELOAD_INTERVAL:
+        return hit[2]
+    try:
+        mtime: Optional[float] = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    if hit is not None and hit[0] == mtime:
+        tpl = hit[2]
+    elif mtime is None:
+        tpl = _EMPTY
+    else:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                tpl = compile_template(f.read())
+        except Exception:
+            tpl = _EMPTY
+    with _LOCK:
+        _FILES[path] = (mtime, now, tpl)
+    return tpl
+
+
+def clear_cache() -> None:
+    with _LOCK:
+        _FILES.clear()
+    compile_template.cache_clear()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: providers.endpoints
+  目标: 描述 LLM 端点（provider/model/base_url）并维护进程级健康度：延迟/错误率 EWMA、p95、熔断。
+  接口:
+    - parse_endpoints(cfg) -> list[Endpoint]（llm.endpoints 未配置时回退为单端点）
+    - health_for(endpoint_id) -> EndpointHealth
+    - health_snapshot() -> dict
+  熔断: 连续失败达到阈值后 open，冷却期后 half-open 放行一次试探请求，成功即 close。
+        试探请求无论以何种方式结束（非可切换错误、被取消）都须 release_probe()，否则端点永久不可用。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    id: str
+    provider: str
+    model: Optional[str] = None
+    base_url: Optional[str] = None
+
+
+def parse_endpoints(cfg: Dict[str, Any]) -> List[Endpoint]:
+    llm = cfg.get("llm", {}) or {}
+    out: List[Endpoint] = []
+    for i, e in enumerate(llm.get("endpoints") or []):
+        if not isinstance(e, dict) or not e.get("provider"):
+            continue
+        provider = str(e["provider"])
+        model = e.get("model")
+        eid = str(e.get("id") or f"{provider}:{model or 'default'}#{i}")
+        out.append(Endpoint(id=eid, provider=provider, model=model, base_url=e.get("base_url")))
+    if not out:
+        provider = str(llm.get("provider", "openrouter"))
+        model = llm.get("model")
+        out.append(Endpoint(id=f"{provider}:{model or 'default'}", provider=provider, model=model, base_url=llm.get("base_url")))
+    return out
+
+
+class EndpointHealth:
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        breaker_failures: int = 3,
+        breaker_cooldown_sec: float = 30.0,
+        window: int = 200,
+    ) -> None:
+        self.alpha = float(alpha)
+        self.breaker_failures = max(1, int(breaker_failures))
+        self.breaker_cooldown_sec = float(breaker_cooldown_sec)
+        self.latency_ewma_ms: Optional[float] = None
+        self.error_ewma = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._half_open_probe = False
+        self._samples: Deque[float] = deque(maxlen=max(10, int(window)))
+        self._lock = threading.Lock()
+
+    def configure(self, alpha: float, breaker_failures: int, breaker_cooldown_sec: float) -> None:
+        with self._lock:
+            self.alpha = float(alpha)
+            self.breaker_failures = max(1, int(breaker_failures))
+            self.breaker_cooldown_sec = float(breaker_cooldown_sec)
+
+    def _ewma(self, prev: Optional[float], value: float) -> float:
+        return value if prev is None else (self.alpha * value + (1 - self.alpha) * prev)
+
+    def available(self, now: Optional[float] = None) -> bool:
+        """熔断关闭时可用；冷却结束后仅放行一次半开试探。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.consecutive_failures < self.breaker_failures:
+                return True
+            if now < self.open_until or self._half_open_probe:
+                return False
+            self._half_open_probe = True
+            return True
+
+    def release_probe(self) -> None:
+        """结束半开试探而不计成败（如 400 等请求本身的错误、对冲败者被取消）；熔断保持，下次 available() 可再试探。"""
+        with self._lock:
+            self._half_open_probe = False
+
+    def record_success(self, latency_ms: float) -> None:
+        with self._lock:
+            self.latency_ewma_ms = self._ewma(self.latency_ewma_ms, float(latency_ms))
+            self.error_ewma = self._ewma(self.error_ewma, 0.0)
+            self._samples.append(float(latency_ms))
+            self.consecutive_failures = 0
+            self._half_open_probe = False
+
+    def record_failure(self, cooldown_sec: Optional[float] = None) -> None:
+        with self._lock:
+            self.error_ewma = self._ewma(self.error_ewma, 1.0)
+            self.consecutive_failures += 1
+            self._half_open_probe = False
+            if self.consecutive_failures >= self.breaker_failures:
+                wait = max(self.breaker_cooldown_sec, float(cooldown_sec or 0.0))
+                self.open_until = time.time() + wait
+
+    def p95_ms(self) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            arr = sorted(self._samples)
+        k = max(0, min(len(arr) - 1, int(round(0.95 * len(arr))) - 1))
+        return arr[k]
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def expected_cost_ms(self) -> float:
+        """延迟感知排序用：期望延迟按错误率放大，未观测的端点视为 0（优先探索）。"""
+        lat = self.latency_ewma_ms or 0.0
+        return lat / max(0.05, 1.0 - self.error_ewma)
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.p95_ms()
+        with self._lock:
+            state = "closed"
+            if self.consecutive_failures >= self.breaker_failures:
+                state = "half_open" if time.time() >= self.open_until else "open"
+            return {
+                "latency_ewma_ms": round(self.latency_ewma_ms, 1) if self.latency_ewma_ms is not None else None,
+                "error_ewma": round(self.error_ewma, 4),
+                "p95_ms": p95,
+                "samples": len(self._samples),
+                "consecutive_failures": self.consecutive_failures,
+                "breaker": state,
+            }
+
+
+_HEALTH: Dict[str, EndpointHealth] = {}
+_HEALTH_LOCK = threading.Lock()
+
+
+def health_for(endpoint_id: str) -> EndpointHealth:
+    with _HEALTH_LOCK:
+        h = _HEALTH.get(endpoint_id)
+        if h is None:
+            h = EndpointHealth()
+            _HEALTH[endpoint_id] = h
+        return h
+
+
+def health_snapshot() -> Dict[str, Any]:
+    with _HEALTH_LOCK:
+        items = list(_HEALTH.items())
+    return {eid: h.snapshot() for eid, h in items}
+
+
+def reset_health() -> None:
+    with _HEALTH_LOCK:
+        _HEALTH.clear()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: providers.http_pool
+  目标: 进程级共享的 requests.Session（HTTP keep-alive 连接池），供 OpenRouter/OpenAI 客户端复用连接
+  接口: get_session() -> requests.Session（首次调用时惰性创建）
+  变量: LLM_HTTP_POOL_MAXSIZE（每主机最大连接数，默认 32）
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Optional
+
+
+_SESSION: Optional[Any] = None
+_LOCK = threading.Lock()
+
+
+def get_session() -> Any:
+    global _SESSION
+    if _SESSION is not None:
+        return _SESSION
+    with _LOCK:
+        if _SESSION is None:
+            import requests  # 依赖 requests
+            from requests.adapters import HTTPAdapter
+
+            try:
+                maxsize = int(os.environ.get("LLM_HTTP_POOL_MAXSIZE", "32"))
+            except Exception:
+                maxsize = 32
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(1, maxsize))
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            _SESSION = s
+    return _SESSION
@@ -5,6 +5,7 @@ SPEC:
   目标: 定义最小 LLM Chat Provider 协议（Protocol），以解耦具体厂商客户端。
   接口:
     - chat_with_meta(messages, temperature, max_tokens, retries) -> (content, meta)
+    - ProviderHTTPError: 上游 HTTP 错误（携带 status_code/retry_after，便于路由器判断是否切换端点）
   说明:
     - 任何实现该方法签名的客户端都可被 agents.llm_agents 注入使用（如 OpenRouterClient、OpenAIClient、LLMRouter）。
 """
@@ -26,3 +27,15 @@ class LLMChatProvider(Protocol):
         """返回 (content, meta)。meta 至少包含 provider/model/attempts，可选 usage/cost/request_id。"""
         ...
 
+
+class ProviderHTTPError(RuntimeError):
+    """上游返回 4xx/5xx。继承 RuntimeError 以兼容既有 except 分支。"""
+
+    def __init__(self, message: str, status_code: int, retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.status_code = int(status_code)
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code == 429 or self.status_code >= 500
@@ -6,8 +6,14 @@ SPEC:
   接口:
     - MCPClient(cfg).list_tools(server_id) -> list[dict]
     - MCPClient(cfg).call_tool(server_id, tool, args) -> dict
+    - MCPClient(cfg).call_tools(calls) / call_tools_async(calls) -> list[dict]（批量并发，每 server 限流、每次调用超时）
   兼容: 若未安装 mcp 依赖，提供清晰错误并安全降级（不崩溃）。
   传输: 支持 stdio(本地进程) 与 streamable-http(HTTP)
+  会话: 经 providers.mcp_pool 复用持久会话（每事件循环一池）；mcp.pool.enabled=false 退回每次调用新建连接
+  缓存: list_tools/list_prompts/list_resources/get_prompt 经 providers.mcp_meta 进程级缓存（TTL + 过期后台刷新，
+        持久会话收到 list_changed 通知时失效）；幂等工具的 call_tool 结果经 tools.result_cache 缓存（按文件指纹失效）
+  同步: 同步接口提交到进程级后台事件循环线程（BackgroundLoop）执行，复用该循环上的会话池，
+        亦可在已有事件循环（FastAPI/异步代理）中安全调用；mcp.sync_timeout_sec 限定等待时长
   配置: config.json -> { "mcp": { "servers": [ {"id":"demo","transport":"stdio","command":"uv","args":["run","mcp-simple-tool"]} ] } }
   参考: modelcontextprotocol/python-sdk — ClientSession, stdio_client, streamablehttp_client
 """
@@ -15,9 +21,20 @@ SPEC:
 from __future__ import annotations
 
 import asyncio
+import atexit
+import concurrent.futures
+import contextlib
+import copy
+import json
+import threading
+import time
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
+from packages.providers.mcp_meta import meta_cache
+from packages.tools.result_cache import cached_call_async
+from packages.providers.mcp_pool import _server_key, default_opener, pool_enabled, pool_for_loop, shutdown_pools
+
 
 class MCPNotAvailable(RuntimeError):
     pass
@@ -47,6 +64,70 @@ def _require_mcp() -> Tuple[Any, Any, Any]:
         ) from e
 
 
+class BackgroundLoop:
+    """常驻事件循环线程：同步调用方经 run_coroutine_threadsafe 提交协程。"""
+
+    def __init__(self, name: str = "mcp-loop") -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._main, name=name, daemon=True)
+        self._thread.start()
+
+    def _main(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive() and not self.loop.is_closed()
+
+    def run(self, coro: Any, timeout: Optional[float] = None) -> Any:
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("不能在 MCP 后台循环线程内同步等待，请改用 *_async 接口")
+        fut = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return fut.result(timeout)
+        except concurrent.futures.TimeoutError:
+            fut.cancel()
+            raise TimeoutError(f"MCP 同步调用超时（{timeout}s）")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if not self.alive:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown_pools(), self.loop).result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.loop.close()
+
+
+_LOOP: Optional[BackgroundLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+
+def background_loop() -> BackgroundLoop:
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None or not _LOOP.alive:
+            _LOOP = BackgroundLoop()
+        return _LOOP
+
+
+def stop_background_loop(timeout: float = 10.0) -> None:
+    """关闭后台循环（先在循环内关闭其会话池）；进程退出时自动调用。"""
+    global _LOOP
+    with _LOOP_LOCK:
+        lp, _LOOP = _LOOP, None
+    if lp is not None:
+        lp.stop(timeout)
+
+
+atexit.register(stop_background_loop)
+
+
 class MCPClient:
     def __init__(self, cfg: Dict[str, Any]):
         self.cfg = cfg or {}
@@ -64,139 +145,152 @@ class MCPClient:
                 url=s.get("url"),
             )
             self.servers[sc.id] = sc
+        self.pool_cfg: Dict[str, Any] = (self.cfg.get("mcp", {}) or {}).get("pool") or {}
+        t = (self.cfg.get("mcp", {}) or {}).get("sync_timeout_sec")
+        self.sync_timeout: Optional[float] = float(t) if t else None
 
     def _get_server(self, server_id: str) -> MCPServerConfig:
         if server_id not in self.servers:
             raise ValueError(f"未知的 MCP server_id: {server_id}")
         return self.servers[server_id]
 
-    async def _with_session(self, sc: MCPServerConfig):  # type: ignore
-        ClientSession, (StdioServerParameters, stdio_client), streamablehttp_client = _require_mcp()
-        if sc.transport in ("stdio", "stdio-stdio"):
-            if not sc.command:
-                raise ValueError("MCP stdio 模式需要 command")
-            server_params = StdioServerParameters(
-                command=sc.command,
-                args=list(sc.args or []),
-                env={**(sc.env or {})},
-            )
-            return stdio_client(server_params), ClientSession
-        elif sc.transport in ("streamable-http", "sse", "http"):
-            if not sc.url:
-                raise ValueError("MCP streamable-http 模式需要 url")
-            return streamablehttp_client(sc.url), ClientSession
-        else:
-            raise ValueError(f"不支持的 MCP 传输: {sc.transport}")
+    def _session(self, sc: MCPServerConfig) -> "contextlib.AbstractAsyncContextManager[Any]":
+        """已 initialize 的会话：默认取自当前事件循环上的会话池（持久连接），mcp.pool.enabled=false 时每次新建。"""
+        if pool_enabled(self.pool_cfg):
+            return pool_for_loop(self.pool_cfg).session(sc)
+        return default_opener(sc)
+
+    async def _cached(self, server_id: str, kind: str, extra: Any, loader: Any) -> Any:
+        """元数据读取经进程级缓存（mcp.cache_ttl_sec / mcp.meta_cache.{enabled,stale_sec,negative_ttl_sec}）。"""
+        mc = (self.cfg.get("mcp", {}) or {}).get("meta_cache") or {}
+        if not mc.get("enabled", True):
+            return await loader()
+        sc = self._get_server(server_id)
+        val = await meta_cache().get(
+            (sc.id, _server_key(sc), kind, extra),
+            loader,
+            ttl=float((self.cfg.get("mcp", {}) or {}).get("cache_ttl_sec", 180.0)),
+            stale_sec=float(mc.get("stale_sec", 600.0)),
+            negative_ttl=float(mc.get("negative_ttl_sec", 30.0)),
+        )
+        # 缓存值跨请求共享，返回副本以免调用方修改
+        return copy.deepcopy(val)
+
+    def invalidate_meta(self, server_id: Optional[str] = None) -> int:
+        return meta_cache().invalidate(server_id)
 
     async def _alist_tools(self, server_id: str) -> List[Dict[str, Any]]:
+        return await self._cached(server_id, "tools", None, lambda: self._fetch_tools(server_id))
+
+    async def _fetch_tools(self, server_id: str) -> List[Dict[str, Any]]:
         sc = self._get_server(server_id)
-        client_ctx, ClientSession = await self._with_session(sc)  # type: ignore
-        async with client_ctx as (read, write, *rest):
-            async with ClientSession(read, write) as session:  # type: ignore
-                await session.initialize()
-                tools = await session.list_tools()
-                out: List[Dict[str, Any]] = []
-                for t in tools.tools:
-                    # 兼容 SDK 的 pydantic 模型
-                    name = getattr(t, "name", None) or getattr(t, "id", None)
-                    desc = getattr(t, "description", None)
-                    out.append({"name": name, "description": desc})
-                return out
+        async with self._session(sc) as session:
+            tools = await session.list_tools()
+            out: List[Dict[str, Any]] = []
+            for t in tools.tools:
+                # 兼容 SDK 的 pydantic 模型
+                name = getattr(t, "name", None) or getattr(t, "id", None)
+                desc = getattr(t, "description", None)
+                out.append({"name": name, "description": desc})
+            return out
 
     async def _acall_tool(self, server_id: str, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        # 幂等工具按 (工具, 参数, 文件指纹) 命中结果缓存；结果中的 cache 字段标注 hit/miss
+        res, state = await cached_call_async(tool, args, lambda: self._fetch_call_tool(server_id, tool, args), scope=f"mcp:{server_id}")
+        if state != "bypass":
+            res = {**res, "cache": state}
+        return res
+
+    async def _fetch_call_tool(self, server_id: str, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
         sc = self._get_server(server_id)
-        client_ctx, ClientSession = await self._with_session(sc)  # type: ignore
-        async with client_ctx as (read, write, *rest):
-            async with ClientSession(read, write) as session:  # type: ignore
-                await session.initialize()
-                res = await session.call_tool(tool, arguments=args)
-                # 尽可能提取文本/结构化结果
-                text = None
+        async with self._session(sc) as session:
+            res = await session.call_tool(tool, arguments=args)
+            # 尽可能提取文本/结构化结果
+            text = None
+            structured = None
+            try:
+                # SDK 返回对象的一致字段：content(list[Content]) / structuredContent
+                content_list = getattr(res, "content", None) or []
+                if content_list:
+                    # 仅取第一块文本
+                    first = content_list[0]
+                    text = getattr(first, "text", None) or getattr(first, "value", None)
+            except Exception:
+                pass
+            try:
+                structured = getattr(res, "structuredContent", None)
+            except Exception:
                 structured = None
-                try:
-                    # SDK 返回对象的一致字段：content(list[Content]) / structuredContent
-                    content_list = getattr(res, "content", None) or []
-                    if content_list:
-                        # 仅取第一块文本
-                        first = content_list[0]
-                        text = getattr(first, "text", None) or getattr(first, "value", None)
-                except Exception:
-                    pass
-                try:
-                    structured = getattr(res, "structuredContent", None)
-                except Exception:
-                    structured = None
-                return {"text": text, "structured": structured}
+            return {"text": text, "structured": structured}
 
     async def _alist_resources(self, server_id: str) -> List[Dict[str, Any]]:
+        return await self._cached(server_id, "resources", None, lambda: self._fetch_resources(server_id))
+
+    async def _fetch_resources(self, server_id: str) -> List[Dict[str, Any]]:
         sc = self._get_server(server_id)
-        client_ctx, ClientSession = await self._with_session(sc)  # type: ignore
-        async with client_ctx as (read, write, *rest):
-            async with ClientSession(read, write) as session:  # type: ignore
-                await session.initialize()
-                resources = await session.list_resources()
-                out: List[Dict[str, Any]] = []
-                for r in resources.resources:
-                    uri = getattr(r, "uri", None)
-                    title = getattr(r, "title", None) or getattr(r, "name", None)
-                    out.append({"uri": str(uri), "title": title})
-                return out
+        async with self._session(sc) as session:
+            resources = await session.list_resources()
+            out: List[Dict[str, Any]] = []
+            for r in resources.resources:
+                uri = getattr(r, "uri", None)
+                title = getattr(r, "title", None) or getattr(r, "name", None)
+                out.append({"uri": str(uri), "title": title})
+            return out
 
     async def _aread_resource(self, server_id: str, uri: str) -> Dict[str, Any]:
         sc = self._get_server(server_id)
-        client_ctx, ClientSession = await self._with_session(sc)  # type: ignore
         from mcp.types import AnyUrl  # type: ignore
-        async with client_ctx as (read, write, *rest):
-            async with ClientSession(read, write) as session:  # type: ignore
-                await session.initialize()
-                res = await session.read_resource(AnyUrl(uri))
-                # 仅取第一块内容展示
-                content = None
-                try:
-                    blk = res.contents[0]
-                    content = getattr(blk, "text", None) or getattr(blk, "value", None)
-                except Exception:
-                    pass
-                return {"uri": uri, "content": content}
+        async with self._session(sc) as session:
+            res = await session.read_resource(AnyUrl(uri))
+            # 仅取第一块内容展示
+            content = None
+            try:
+                blk = res.contents[0]
+                content = getattr(blk, "text", None) or getattr(blk, "value", None)
+            except Exception:
+                pass
+            return {"uri": uri, "content": content}
 
     async def _alist_prompts(self, server_id: str) -> List[Dict[str, Any]]:
+        return await self._cached(server_id, "prompts", None, lambda: self._fetch_prompts(server_id))
+
+    async def _fetch_prompts(self, server_id: str) -> List[Dict[str, Any]]:
         sc = self._get_server(server_id)
-        client_ctx, ClientSession = await self._with_session(sc)  # type: ignore
-        async with client_ctx as (read, write, *rest):
-            async with ClientSession(read, write) as session:  # type: ignore
-                await session.initialize()
-                prompts = await session.list_prompts()
-                out: List[Dict[str, Any]] = []
-                for p in prompts.prompts:
-                    out.append({"name": getattr(p, "name", None), "description": getattr(p, "description", None)})
-                return out
+        async with self._session(sc) as session:
+            prompts = await session.list_prompts()
+            out: List[Dict[str, Any]] = []
+            for p in prompts.prompts:
+                out.append({"name": getattr(p, "name", None), "description": getattr(p, "description", None)})
+            return out
 
     async def _aget_prompt(self, server_id: str, name: str, arguments: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        extra = (name, json.dumps(arguments or {}, sort_keys=True, ensure_ascii=False, default=str))
+        return await self._cached(server_id, "prompt", extra, lambda: self._fetch_prompt(server_id, name, arguments))
+
+    async def _fetch_prompt(self, server_id: str, name: str, arguments: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         sc = self._get_server(server_id)
-        client_ctx, ClientSession = await self._with_session(sc)  # type: ignore
-        async with client_ctx as (read, write, *rest):
-            async with ClientSession(read, write) as session:  # type: ignore
-                await session.initialize()
-                res = await session.get_prompt(name, arguments=arguments or {})
-                # 返回拼接后的消息文本（简单拼接）
-                texts: List[str] = []
-                try:
-                    for m in res.messages:
-                        blk = getattr(m, "content", None)
-                        t = getattr(blk, "text", None) or getattr(blk, "value", None)
-                        if t:
-                            texts.append(str(t))
-                except Exception:
-                    pass
-                return {"name": name, "text": "\n".join(texts)}
-
-    def _run_sync(self, coro: "asyncio.Future[Any]") -> Any:  # type: ignore[name-defined]
-        """在无事件循环时运行协程，存在事件循环则提示改用异步接口。"""
-        try:
-            asyncio.get_running_loop()
-        except RuntimeError:
-            return asyncio.run(coro)
-        raise RuntimeError("检测到正在运行的事件循环，请改用 list_tools_async/call_tool_async 等异步接口")
+        async with self._session(sc) as session:
+            res = await session.get_prompt(name, arguments=arguments or {})
+            # 返回拼接后的消息文本（简单拼接）
+            texts: List[str] = []
+            try:
+                for m in res.messages:
+                    blk = getattr(m, "content", None)
+                    t = getattr(blk, "text", None) or getattr(blk, "value", None)
+                    if t:
+                        texts.append(str(t))
+            except Exception:
+                pass
+            return {"name": name, "text": "\n".join(texts)}
+
+    @property
+    def loop_thread(self) -> BackgroundLoop:
+        # 同步接口经后台循环执行；进程内共享一条循环（首次同步调用时启动），以便各客户端复用同一会话池
+        return background_loop()
+
+    def _run_sync(self, coro: Any) -> Any:
+        """同步接口：提交到客户端持有的后台事件循环线程并阻塞等待（可在异步上下文中调用）。"""
+        return self.loop_thread.run(coro, timeout=self.sync_timeout)
 
     # 对外同步包装
     def list_tools(self, server_id: str) -> List[Dict[str, Any]]:
@@ -208,10 +302,49 @@ class MCPClient:
     def call_tool(self, server_id: str, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
         return self._run_sync(self._acall_tool(server_id, tool, args))
 
-    # 在异步上下文中使用的接口（避免 asyncio.run 冲突）
+    # 在异步上下文中直接 await 的接口（不占用后台线程）
     async def call_tool_async(self, server_id: str, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
         return await self._acall_tool(server_id, tool, args)
 
+    async def call_tools_async(
+        self,
+        calls: List[Dict[str, Any]],
+        timeout: Optional[float] = None,
+        per_server: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """并发执行一批相互独立的工具调用（asyncio.gather）。
+        calls: [{server, tool, args}]；按输入顺序返回 [{server, tool, args, result|error+error_type, latency_ms}]，单个失败不影响其它调用。
+        每 server 并发上限 per_server（默认 mcp.batch.per_server，缺省取池的 max_concurrency），每次调用超时 timeout（默认 mcp.batch.timeout_sec）。
+        """
+        bcfg = (self.cfg.get("mcp", {}) or {}).get("batch") or {}
+        limit = int(per_server or bcfg.get("per_server") or self.pool_cfg.get("max_concurrency", 4))
+        t_out = float(timeout or bcfg.get("timeout_sec") or 30.0)
+        sems: Dict[str, asyncio.Semaphore] = {}
+
+        async def _one(c: Dict[str, Any]) -> Dict[str, Any]:
+            server = str(c.get("server") or "")
+            tool = str(c.get("tool") or "")
+            args = c.get("args") if isinstance(c.get("args"), dict) else {}
+            out: Dict[str, Any] = {"server": server, "tool": tool, "args": args}
+            sem = sems.setdefault(server, asyncio.Semaphore(max(1, limit)))
+            t0 = time.time()
+            try:
+                async with sem:
+                    out["result"] = await asyncio.wait_for(self._acall_tool(server, tool, args), timeout=t_out)
+            except asyncio.TimeoutError:
+                out["error"] = f"timeout after {t_out:g}s"
+                out["error_type"] = "TimeoutError"
+            except Exception as e:
+                out["error"] = str(e) or type(e).__name__
+                out["error_type"] = type(e).__name__
+            out["latency_ms"] = int((time.time() - t0) * 1000)
+            return out
+
+        return list(await asyncio.gather(*(_one(c) for c in calls)))
+
+    def call_tools(self, calls: List[Dict[str, Any]], timeout: Optional[float] = None, per_server: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._run_sync(self.call_tools_async(calls, timeout=timeout, per_server=per_server))
+
     def list_resources(self, server_id: str) -> List[Dict[str, Any]]:
         return self._run_sync(self._alist_resources(server_id))
 
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: providers.mcp_meta
+  目标: 进程级 MCP 元数据缓存（tools/prompts/resources 列表与 prompt 文本），按 server 共享：
+        各请求新建的 MCPClient/MCPConversationAgent 不再每次重新列举工具、拉取 chat.system 提示。
+  接口:
+    - MetaCache(max_entries=512)
+        .get(key, loader, ttl, stale_sec, negative_ttl) -> await 值
+            新鲜: 直接返回；过期但在 stale 窗口内: 立即返回旧值并在后台刷新（stale-while-revalidate）；
+            否则同步加载。加载失败按 negative_ttl 缓存错误（期间直接重抛，避免反复请求不可用的 server）。
+        .invalidate(server_id=None, kinds=None) -> 失效条目数
+        .on_notification(server_id, method): 处理 notifications/{tools,prompts,resources}/list_changed
+        .stats()
+    - meta_cache() -> 进程级单例；notification_handler(server_id) -> 供 ClientSession(message_handler=...) 使用
+  键: (server_id, server 指纹, kind, 附加参数)；kind ∈ tools/prompts/prompt/resources
+  约束: 失效发生在加载途中时丢弃该次加载结果（代际计数），避免写回旧数据
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+
+Loader = Callable[[], Awaitable[Any]]
+
+# 通知方法 -> 受影响的缓存类别
+_NOTIFY_KINDS: Dict[str, Tuple[str, ...]] = {
+    "notifications/tools/list_changed": ("tools",),
+    "notifications/prompts/list_changed": ("prompts", "prompt"),
+    "notifications/resources/list_changed": ("resources",),
+}
+
+
+class _Entry:
+    __slots__ = ("ts", "value", "error")
+
+    def __init__(self, value: Any = None, error: Optional[BaseException] = None) -> None:
+        self.ts = time.monotonic()
+        self.value = value
+        self.error = error
+
+
+class MetaCache:
+    def __init__(self, max_entries: int = 512) -> None:
+        self.max_entries = int(max_entries)
+        self._data: "OrderedDict[Tuple[Any, ...], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing: Set[Tuple[Any, ...]] = set()
+        self._gen: Dict[Any, int] = {}
+        self.counters: Dict[str, int] = {"hit": 0, "stale": 0, "miss": 0, "negative": 0, "refresh": 0, "invalidated": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    async def get(self, key: Tuple[Any, ...], loader: Loader, ttl: float = 180.0, stale_sec: float = 600.0, negative_ttl: float = 30.0) -> Any:
+        with self._lock:
+            e = self._data.get(key)
+            if e is not None:
+                self._data.move_to_end(key)
+        if e is not None:
+            age = time.monotonic() - e.ts
+            if e.error is not None:
+                if age < negative_ttl:
+                    self._count("negative")
+                    raise e.error
+            elif age < ttl:
+                self._count("hit")
+                return e.value
+            elif age < ttl + stale_sec:
+                self._count("stale")
+                self._refresh_bg(key, loader)
+                return e.value
+        self._count("miss")
+        return await self._load(key, loader)
+
+    async def _load(self, key: Tuple[Any, ...], loader: Loader) -> Any:
+        gen = self._gen.get(key[0], 0)
+        try:
+            value = await loader()
+        except Exception as ex:
+            self._store(key, _Entry(error=ex), gen)
+            raise
+        self._store(key, _Entry(value=value), gen)
+        return value
+
+    def _store(self, key: Tuple[Any, ...], entry: _Entry, gen: int) -> None:
+        with self._lock:
+            if self._gen.get(key[0], 0) != gen:
+                return  # 加载期间该 server 已失效
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def _refresh_bg(self, key: Tuple[Any, ...], loader: Loader) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def _run() -> None:
+            try:
+                await self._load(key, loader)
+                self._count("refresh")
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        try:
+            asyncio.get_running_loop().create_task(_run())
+        except RuntimeError:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, server_id: Optional[str] = None, kinds: Optional[Iterable[str]] = None) -> int:
+        ks = set(kinds) if kinds is not None else None
+        with self._lock:
+            drop = [k for k in self._data if (server_id is None or k[0] == server_id) and (ks is None or k[2] in ks)]
+            for k in drop:
+                del self._data[k]
+            for sid in ({server_id} if server_id is not None else set(self._gen) | {k[0] for k in drop}):
+                self._gen[sid] = self._gen.get(sid, 0) + 1
+            self.counters["invalidated"] += len(drop)
+        return len(drop)
+
+    def on_notification(self, server_id: str, method: Optional[str]) -> None:
+        kinds = _NOTIFY_KINDS.get(str(method or ""))
+        if kinds:
+            self.invalidate(server_id, kinds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._data), **self.counters}
+
+
+_CACHE: Optional[MetaCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def meta_cache() -> MetaCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = MetaCache()
+        return _CACHE
+
+
+def notification_handler(server_id: str) -> Callable[[Any], Awaitable[None]]:
+    """ClientSession 的 message_handler：服务端推送 list_changed 时失效对应缓存（仅持久会话能收到）。"""
+
+    async def _handle(message: Any) -> None:
+        root = getattr(message, "root", message)
+        method = getattr(root, "method", None)
+        if method:
+            meta_cache().on_notification(server_id, method)
+
+    return _handle
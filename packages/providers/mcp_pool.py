@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: providers.mcp_pool
+  目标: 每个 MCP server 的持久会话池：惰性连接、健康检查、失败后退避重连、每会话并发上限、空闲驱逐、优雅关闭。
+        工具调用从“每次握手（stdio 甚至每次起进程）”降为纯 RPC。
+  接口:
+    - MCPSessionPool(opener=None, max_concurrency, idle_timeout_sec, health_interval_sec, connect_timeout_sec,
+                     backoff_base_sec, backoff_max_sec)
+        .session(sc) -> async 上下文，产出已 initialize 的 ClientSession
+        .evict_idle() / .aclose() / .stats()
+    - pool_for_loop(pool_cfg) -> 当前事件循环上的共享池（池与事件循环绑定）
+    - shutdown_pools() / close_all_pools(): 关闭当前循环/所有循环上的池（FastAPI lifespan 与配置变化时调用）
+  实现: 每个会话由一个 owner task 进入 transport 与 ClientSession 上下文并持有至关闭
+        （anyio 要求上下文在同一 task 中进入与退出）；opener 可注入以便测试。
+  配置: mcp.pool = {enabled, max_concurrency, idle_timeout_sec, health_interval_sec, connect_timeout_sec, backoff_max_sec}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+
+class MCPServerUnavailable(RuntimeError):
+    """server 处于重连退避期或连接失败。"""
+
+
+Opener = Callable[[Any], "contextlib.AbstractAsyncContextManager[Any]"]
+
+
+@contextlib.asynccontextmanager
+async def default_opener(sc: Any) -> AsyncIterator[Any]:
+    """按传输类型建立 transport 与 ClientSession 并完成 initialize。"""
+    from packages.providers.mcp_client import _require_mcp  # 延迟导入，避免循环依赖
+
+    ClientSession, (StdioServerParameters, stdio_client), streamablehttp_client = _require_mcp()
+    if sc.transport in ("stdio", "stdio-stdio"):
+        if not sc.command:
+            raise ValueError("MCP stdio 模式需要 command")
+        transport = stdio_client(StdioServerParameters(command=sc.command, args=list(sc.args or []), env={**(sc.env or {})}))
+    elif sc.transport in ("streamable-http", "sse", "http"):
+        if not sc.url:
+            raise ValueError("MCP streamable-http 模式需要 url")
+        transport = streamablehttp_client(sc.url)
+    else:
+        raise ValueError(f"不支持的 MCP 传输: {sc.transport}")
+    from packages.providers.mcp_meta import notification_handler
+
+    async with transport as (read, write, *rest):
+        try:
+            # 持久会话接收 list_changed 通知，失效进程级元数据缓存
+            cs = ClientSession(read, write, message_handler=notification_handler(sc.id))  # type: ignore
+        except TypeError:  # 旧版 SDK 无 message_handler 参数
+            cs = ClientSession(read, write)  # type: ignore
+        async with cs as session:
+            await session.initialize()
+            yield session
+
+
+def _server_key(sc: Any) -> Tuple[Any, ...]:
+    return (sc.id, sc.transport, sc.command, tuple(sc.args or ()), tuple(sorted((sc.env or {}).items())), sc.url)
+
+
+def _is_app_error(e: BaseException) -> bool:
+    """服务端返回的协议级错误（McpError 等）不代表连接损坏，无需重连。"""
+    return type(e).__name__ in ("McpError", "ValueError", "KeyError", "TypeError")
+
+
+class PooledSession:
+    def __init__(self, pool: "MCPSessionPool", sc: Any) -> None:
+        self.pool = pool
+        self.sc = sc
+        self.session: Any = None
+        self._owner: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._connect_lock = asyncio.Lock()
+        self._sem = asyncio.Semaphore(max(1, pool.max_concurrency))
+        self.inflight = 0
+        self.last_used = time.monotonic()
+        self.last_ok = 0.0
+        self.failures = 0
+        self.next_connect_at = 0.0
+        self.connects = 0
+        self.calls = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.session is not None and self._owner is not None and not self._owner.done()
+
+    async def _connect(self) -> None:
+        now = time.monotonic()
+        if now < self.next_connect_at:
+            raise MCPServerUnavailable(f"MCP server {self.sc.id} 重连退避中（{self.next_connect_at - now:.1f}s）")
+        ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        closing = asyncio.Event()
+
+        async def _owner() -> None:
+            mine: Any = None
+            try:
+                async with self.pool.opener(self.sc) as session:
+                    mine = session
+                    if not ready.done():
+                        ready.set_result(session)
+                    await closing.wait()
+            except BaseException as e:  # noqa: BLE001 - 需把连接期异常转交给等待方
+                if not ready.done():
+                    ready.set_exception(e if isinstance(e, Exception) else RuntimeError(str(e)))
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+            finally:
+                # 连接断开：仅清理本 owner 建立的会话，避免覆盖重连后的新会话
+                if mine is not None and self.session is mine:
+                    self.session = None
+
+        self._closing = closing
+        self._owner = asyncio.ensure_future(_owner())
+        try:
+            self.session = await asyncio.wait_for(asyncio.shield(ready), timeout=self.pool.connect_timeout_sec)
+        except BaseException as e:
+            await self._shutdown_owner()
+            self.failures += 1
+            delay = min(self.pool.backoff_max_sec, self.pool.backoff_base_sec * (2 ** (self.failures - 1)))
+            self.next_connect_at = time.monotonic() + delay
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise MCPServerUnavailable(f"MCP server {self.sc.id} 连接失败: {e}") from e
+        self.failures = 0
+        self.next_connect_at = 0.0
+        self.last_ok = time.monotonic()
+        if self.connects:
+            # 重连期间可能错过 list_changed 通知（或 server 已重启），丢弃其元数据缓存
+            from packages.providers.mcp_meta import meta_cache
+
+            meta_cache().invalidate(self.sc.id)
+        self.connects += 1
+
+    async def _shutdown_owner(self) -> None:
+        owner, closing = self._owner, self._closing
+        self._owner, self._closing, self.session = None, None, None
+        if owner is None:
+            return
+        if closing is not None:
+            closing.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(owner), timeout=self.pool.close_timeout_sec)
+        except BaseException:
+            owner.cancel()
+            with contextlib.suppress(BaseException):
+                await owner
+
+    async def _healthy(self) -> bool:
+        if time.monotonic() - self.last_ok < self.pool.health_interval_sec:
+            return True
+        ping = getattr(self.session, "send_ping", None)
+        if ping is None:
+            return True
+        try:
+            await asyncio.wait_for(ping(), timeout=self.pool.connect_timeout_sec)
+            self.last_ok = time.monotonic()
+            return True
+        except Exception:
+            return False
+
+    async def ensure(self) -> Any:
+        async with self._connect_lock:
+            if self.connected and not await self._healthy():
+                await self._shutdown_owner()
+            if not self.connected:
+                await self._connect()
+            return self.session
+
+    @contextlib.asynccontextmanager
+    async def lease(self) -> AsyncIterator[Any]:
+        async with self._sem:
+            session = await self.ensure()
+            self.inflight += 1
+            self.calls += 1
+            try:
+                yield session
+                self.last_ok = time.monotonic()
+            except Exception as e:
+                if not _is_app_error(e):
+                    # 传输层异常：丢弃会话，下次调用重新连接
+                    async with self._connect_lock:
+                        await self._shutdown_owner()
+                raise
+            finally:
+                self.inflight -= 1
+                self.last_used = time.monotonic()
+
+    async def close(self) -> None:
+        async with self._connect_lock:
+            await self._shutdown_owner()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "inflight": self.inflight,
+            "calls": self.calls,
+            "connects": self.connects,
+            "failures": self.failures,
+            "idle_sec": round(time.monotonic() - self.last_used, 1),
+        }
+
+
+class MCPSessionPool:
+    def __init__(
+        self,
+        opener: Optional[Opener] = None,
+        max_concurrency: int = 4,
+        idle_timeout_sec: float = 300.0,
+        health_interval_sec: float = 30.0,
+        connect_timeout_sec: float = 15.0,
+        backoff_base_sec: float = 0.5,
+        backoff_max_sec: float = 30.0,
+        close_timeout_sec: float = 5.0,
+    ) -> None:
+        self.opener: Opener = opener or default_opener
+        self.max_concurrency = int(max_concurrency)
+        self.idle_timeout_sec = float(idle_timeout_sec)
+        self.health_interval_sec = float(health_interval_sec)
+        self.connect_timeout_sec = float(connect_timeout_sec)
+        self.backoff_base_sec = float(backoff_base_sec)
+        self.backoff_max_sec = float(backoff_max_sec)
+        self.close_timeout_sec = float(close_timeout_sec)
+        self._sessions: Dict[Tuple[Any, ...], PooledSession] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _get(self, sc: Any) -> PooledSession:
+        key = _server_key(sc)
+        ps = self._sessions.get(key)
+        if ps is None:
+            ps = PooledSession(self, sc)
+            self._sessions[key] = ps
+        return ps
+
+    def _ensure_reaper(self) -> None:
+        if self.idle_timeout_sec <= 0 or (self._reaper is not None and not self._reaper.done()):
+            return
+        period = max(1.0, min(30.0, self.idle_timeout_sec / 2))
+
+        async def _reap() -> None:
+            while not self._closed:
+                await asyncio.sleep(period)
+                with contextlib.suppress(Exception):
+                    await self.evict_idle()
+
+        self._reaper = asyncio.ensure_future(_reap())
+
+    @contextlib.asynccontextmanager
+    async def session(self, sc: Any) -> AsyncIterator[Any]:
+        if self._closed:
+            raise MCPServerUnavailable("MCP 会话池已关闭")
+        self._ensure_reaper()
+        async with self._get(sc).lease() as session:
+            yield session
+
+    def available(self, sc: Any) -> bool:
+        """不阻塞地判断 server 是否处于重连退避期（退避期内调用会立即失败）。"""
+        ps = self._sessions.get(_server_key(sc))
+        return ps is None or ps.connected or time.monotonic() >= ps.next_connect_at
+
+    async def evict_idle(self) -> int:
+        now = time.monotonic()
+        n = 0
+        for ps in list(self._sessions.values()):
+            if ps.connected and ps.inflight == 0 and now - ps.last_used >= self.idle_timeout_sec:
+                await ps.close()
+                n += 1
+        return n
+
+    async def aclose(self) -> None:
+        self._closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+            with contextlib.suppress(BaseException):
+                await self._reaper
+        for ps in list(self._sessions.values()):
+            with contextlib.suppress(Exception):
+                await ps.close()
+        self._sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {ps.sc.id: ps.snapshot() for ps in list(self._sessions.values())}
+
+
+# 事件循环 -> 池（池内的 owner task/信号量均绑定创建时的循环）
+_POOLS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, MCPSessionPool]" = weakref.WeakKeyDictionary()
+_POOLS_LOCK = threading.Lock()
+
+
+def pool_enabled(pool_cfg: Optional[Dict[str, Any]]) -> bool:
+    return bool((pool_cfg or {}).get("enabled", True))
+
+
+def pool_for_loop(pool_cfg: Optional[Dict[str, Any]] = None, opener: Optional[Opener] = None) -> MCPSessionPool:
+    loop = asyncio.get_running_loop()
+    with _POOLS_LOCK:
+        pool = _POOLS.get(loop)
+        if pool is None or pool._closed:
+            c = pool_cfg or {}
+            pool = MCPSessionPool(
+                opener=opener,
+                max_concurrency=int(c.get("max_concurrency", 4)),
+                idle_timeout_sec=float(c.get("idle_timeout_sec", 300.0)),
+                health_interval_sec=float(c.get("health_interval_sec", 30.0)),
+                connect_timeout_sec=float(c.get("connect_timeout_sec", 15.0)),
+                backoff_max_sec=float(c.get("backoff_max_sec", 30.0)),
+            )
+            _POOLS[loop] = pool
+        return pool
+
+
+def pools_stats() -> Dict[str, Any]:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    out: Dict[str, Any] = {}
+    for p in pools:
+        out.update(p.stats())
+    return out
+
+
+async def shutdown_pools() -> None:
+    """关闭当前事件循环上的池（FastAPI lifespan 退出时调用）。"""
+    loop = asyncio.get_running_loop()
+    with _POOLS_LOCK:
+        pool = _POOLS.pop(loop, None)
+    if pool is not None:
+        await pool.aclose()
+
+
+def close_all_pools(timeout: float = 10.0) -> None:
+    """同步关闭所有循环上的池（配置变化或进程退出时）；各池在其所属循环中关闭。"""
+    with _POOLS_LOCK:
+        items = list(_POOLS.items())
+        _POOLS.clear()
+    for loop, pool in items:
+        if loop.is_closed():
+            continue
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.create_task(pool.aclose())
+        elif loop.is_running():
+            fut = asyncio.run_coroutine_threadsafe(pool.aclose(), loop)
+            with contextlib.suppress(Exception):
+                fut.result(timeout)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: providers.mock_client
+  目标: 离线可复现的 Mock LLM 提供方，用于压测真实的 planner/executor/critic/reviser=llm 路径
+  输入: messages[{role, content}]（按系统提示识别阶段，按用户提示中的 SRS/Plan/CSV/REPORT 段落生成内容）
+  输出: 与真实模型同形的 (content, meta)：
+    - planner: {"plan":{id, steps[csv.clean, stats.aggregate, md.render], params, risks, acceptance}}
+    - executor/reviser: Markdown 周报（由 CSV 片段经本地技能计算）
+    - critic: {"pass","score","reasons"}
+  配置: llm.provider=mock，llm.mock = {
+          seed, latency_ms: {dist: fixed|uniform|normal|lognormal, mean, sigma, min, max},
+          error_rate, rate_limit_rate, retry_after_sec, stream, chunk_chars, inter_chunk_ms }
+  约束: 内容仅由 messages 决定（相同输入得到相同输出）；延迟与错误注入由 seed 决定的随机序列产生。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from packages.providers.interfaces import ProviderHTTPError
+from packages.providers.ratelimit import estimate_request_tokens
+
+
+_SECTION_RE = re.compile(r"^([A-Z][A-Za-z_]*)(\([^)\n]*\))?:[ \t]*$", re.M)
+
+
+def _sections(text: str) -> Dict[str, str]:
+    """按 `NAME:` / `NAME(说明):` 行切分提示模板段落；末尾的“请…”指令行不计入段落内容。"""
+    out: Dict[str, str] = {}
+    marks = list(_SECTION_RE.finditer(text or ""))
+    for i, m in enumerate(marks):
+        end = marks[i + 1].start() if i + 1 < len(marks) else len(text)
+        body = text[m.end():end].strip("\n")
+        lines = body.split("\n")
+        while lines and (not lines[-1].strip() or lines[-1].startswith("请") or lines[-1].startswith("通过标准")):
+            lines.pop()
+        out[m.group(1).upper()] = "\n".join(lines).strip()
+    return out
+
+
+def _loads(text: str) -> Dict[str, Any]:
+    try:
+        obj = json.loads(text)
+        return obj if isinstance(obj, dict) else {}
+    except Exception:
+        return {}
+
+
+def _csv_rows(text: str) -> List[Dict[str, str]]:
+    import csv
+    import io
+
+    try:
+        # 跳过预算压缩产生的 `# schema/统计` 注释行
+        body = "\n".join(ln for ln in (text or "").split("\n") if not ln.startswith("#"))
+        return [dict(r) for r in csv.DictReader(io.StringIO(body))]
+    except Exception:
+        return []
+
+
+def detect_stage(messages: List[Dict[str, str]]) -> str:
+    system = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "system")
+    if "Planner" in system:
+        return "planner"
+    if "评审器" in system:
+        return "critic"
+    if "改写器" in system:
+        return "reviser"
+    if "执行器" in system or "报告生成器" in system:
+        return "executor"
+    return "chat"
+
+
+def mock_completion(messages: List[Dict[str, str]]) -> Tuple[str, str]:
+    """由 messages 确定性地生成 (stage, content)。"""
+    # 延迟导入：规则/技能实现仅用于生成内容，避免 providers 与 agents 的导入环
+    from packages.agents.rule_agents import CriticRules, PlannerRules, ReviserRules
+    from skills.csv_clean import csv_clean
+    from skills.md_render import md_render
+    from skills.stats_aggregate import stats_aggregate
+
+    stage = detect_stage(messages)
+    user = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "user")
+    sec = _sections(user)
+    srs = _loads(sec.get("SRS", ""))
+    digest = hashlib.sha256(user.encode("utf-8")).hexdigest()
+
+    if stage == "planner":
+        plan = PlannerRules().plan(srs, {})
+        plan["id"] = f"plan-mock-{digest[:8]}"
+        plan["params"] = dict(srs.get("params", {}) or {})
+        plan["risks"] = ["mock provider: 计划由规则生成"]
+        plan["acceptance"] = list(srs.get("acceptance", []) or [])
+        return stage, json.dumps({"plan": plan}, ensure_ascii=False)
+
+    if stage == "critic":
+        report = sec.get("REPORT_MARKDOWN") or sec.get("REPORT") or ""
+        return stage, json.dumps(CriticRules().review(srs, report, {}), ensure_ascii=False)
+
+    if stage == "reviser":
+        report = sec.get("REPORT_MARKDOWN") or sec.get("REPORT") or ""
+        return stage, ReviserRules().revise(srs, report, _loads(sec.get("CRITIC", "")), {})
+
+    if stage == "executor":
+        plan = _loads(sec.get("PLAN", ""))
+        args: Dict[str, Dict[str, Any]] = {}
+        for s in plan.get("steps", []) or []:
+            if isinstance(s, dict) and s.get("op"):
+                args[str(s["op"])] = dict(s.get("args", {}) or {})
+        rows = _csv_rows(sec.get("CSV_EXCERPT") or sec.get("CSV") or "")
+        params = srs.get("params", {}) or {}
+        agg_args = args.get("stats.aggregate") or {
+            "top_n": int(params.get("top_n", 10)),
+            "score_by": params.get("score_by", "views"),
+            "title_field": params.get("title_field", "title"),
+        }
+        try:
+            cleaned = csv_clean(rows, **(args.get("csv.clean") or {"drop_empty": True}))
+            agg = stats_aggregate(cleaned, **agg_args)
+            md = md_render(agg.get("summary", {}), agg.get("top", []), **(args.get("md.render") or {"include_table": True}))
+        except Exception:
+            md = md_render({"count": 0, "total": 0.0, "avg": 0.0}, [], include_table=True)
+        return stage, md
+
+    last = user.strip().splitlines()[-1] if user.strip() else ""
+    return stage, f"（mock）已收到：{last[:80]}"
+
+
+def _sample_latency_ms(rng: random.Random, spec: Any) -> float:
+    if spec is None:
+        return 0.0
+    if isinstance(spec, (int, float)):
+        return max(0.0, float(spec))
+    dist = str(spec.get("dist", "fixed"))
+    mean = float(spec.get("mean", 0.0))
+    sigma = float(spec.get("sigma", 0.0))
+    lo = float(spec.get("min", 0.0))
+    hi = float(spec["max"]) if spec.get("max") is not None else float("inf")
+    if dist == "uniform":
+        v = rng.uniform(lo, hi)
+    elif dist == "normal":
+        v = rng.gauss(mean, sigma)
+    elif dist == "lognormal":
+        # mean 视为中位数，sigma 为对数标准差（长尾）
+        v = rng.lognormvariate(math.log(max(mean, 1e-3)), sigma)
+    else:
+        v = mean
+    return min(max(lo, v), hi) if hi >= lo else lo
+
+
+class MockLLMClient:
+    def __init__(self, model: Optional[str] = None, base_url: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> None:
+        self.model = model or "mock-1"
+        self.base_url = base_url or "mock://local"
+        self.options: Dict[str, Any] = dict(options or {})
+        self._rng = random.Random(self.options.get("seed", 0))
+        self._rng_lock = threading.Lock()
+        # 可选的共享限流器（由 LLMRouter 按 llm.rate_limit 注入）
+        self.rate_limiter: Optional[Any] = None
+
+    def _draw(self) -> Tuple[float, float]:
+        """取 (延迟毫秒, 故障骰子)；加锁保证并发下序列仍由 seed 决定。"""
+        with self._rng_lock:
+            return _sample_latency_ms(self._rng, self.options.get("latency_ms")), self._rng.random()
+
+    def _fault(self, roll: float) -> Optional[ProviderHTTPError]:
+        rl = float(self.options.get("rate_limit_rate", 0.0))
+        er = float(self.options.get("error_rate", 0.0))
+        if roll < rl:
+            ra = float(self.options.get("retry_after_sec", 1.0))
+            return ProviderHTTPError("Mock 调用失败: 429 rate limited", 429, ra)
+        if roll < rl + er:
+            return ProviderHTTPError("Mock 调用失败: 503 injected error", 503)
+        return None
+
+    def stream_chat(self, messages: List[Dict[str, str]], temperature: float = 0.2, max_tokens: Optional[int] = None) -> Iterator[str]:
+        """按 chunk_chars 切片流式产出内容；首块前等待采样延迟，块间等待 inter_chunk_ms。"""
+        latency_ms, roll = self._draw()
+        err = self._fault(roll)
+        time.sleep(latency_ms / 1000.0)
+        if err is not None:
+            raise err
+        _, content = mock_completion(messages)
+        step = max(1, int(self.options.get("chunk_chars", 16)))
+        gap = float(self.options.get("inter_chunk_ms", 0.0)) / 1000.0
+        for i in range(0, len(content), step):
+            if i and gap:
+                time.sleep(gap)
+            yield content[i:i + step]
+
+    def chat_with_meta(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
+        max_tokens: Optional[int] = None,
+        retries: int = 0,
+    ) -> Tuple[str, Dict[str, Any]]:
+        limiter = self.rate_limiter
+        est_tokens = estimate_request_tokens(messages, max_tokens) if limiter is not None else 0
+        waited = 0.0
+        attempts = 0
+        stream = bool(self.options.get("stream", False))
+        while True:
+            attempts += 1
+            if limiter is not None:
+                waited += limiter.acquire(est_tokens)
+            t0 = time.time()
+            ttft_ms: Optional[int] = None
+            try:
+                if stream:
+                    parts: List[str] = []
+                    for chunk in self.stream_chat(messages, temperature, max_tokens):
+                        if ttft_ms is None:
+                            ttft_ms = int((time.time() - t0) * 1000)
+                        parts.append(chunk)
+                    content = "".join(parts)
+                    stage = detect_stage(messages)
+                else:
+                    latency_ms, roll = self._draw()
+                    err = self._fault(roll)
+                    time.sleep(latency_ms / 1000.0)
+                    if err is not None:
+                        raise err
+                    stage, content = mock_completion(messages)
+            except ProviderHTTPError as e:
+                if attempts > max(0, retries):
+                    raise
+                if limiter is not None and e.status_code == 429:
+                    limiter.pause(e.retry_after or 1.0)
+                else:
+                    time.sleep(min(float(e.retry_after or 0.0), 8.0))
+                continue
+            prompt_tokens = estimate_request_tokens(messages)
+            completion_tokens = max(1, len(content) // 4)
+            meta: Dict[str, Any] = {
+                "provider": "mock",
+                "model": self.model,
+                "stage": stage,
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+                "status_code": 200,
+                "attempts": attempts,
+                "request_id": f"mock-{hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]}",
+                "temperature": temperature,
+            }
+            if ttft_ms is not None:
+                meta["ttft_ms"] = ttft_ms
+            if limiter is not None:
+                limiter.adjust(prompt_tokens + completion_tokens - est_tokens)
+                meta["rate_limit_wait_ms"] = int(waited * 1000)
+            return content, meta
@@ -12,6 +12,10 @@ import json
 import os
 from typing import Any, Dict, List, Optional, Tuple
 
+from packages.providers.http_pool import get_session
+from packages.providers.interfaces import ProviderHTTPError
+from packages.providers.ratelimit import estimate_request_tokens
+
 
 class OpenAIClient:
     def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, model: Optional[str] = None) -> None:
@@ -20,6 +24,8 @@ class OpenAIClient:
         self.model = model or os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
         if not self.api_key:
             raise RuntimeError("缺少 OPENAI_API_KEY")
+        # 可选的共享限流器（由 LLMRouter 按 llm.rate_limit 注入）
+        self.rate_limiter: Optional[Any] = None
 
     def chat_with_meta(
         self,
@@ -28,16 +34,20 @@ class OpenAIClient:
         max_tokens: Optional[int] = None,
         retries: int = 0,
     ) -> Tuple[str, Dict[str, Any]]:
-        import requests
         url = f"{self.base_url.rstrip('/')}/chat/completions"
         headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
         payload: Dict[str, Any] = {"model": self.model, "messages": messages, "temperature": float(temperature)}
         if max_tokens is not None:
             payload["max_tokens"] = int(max_tokens)
+        limiter = self.rate_limiter
+        est_tokens = estimate_request_tokens(messages, max_tokens) if limiter is not None else 0
+        waited = 0.0
         attempts = 0
         while True:
             attempts += 1
-            resp = requests.post(url, headers=headers, json=payload, timeout=120)
+            if limiter is not None:
+                waited += limiter.acquire(est_tokens)
+            resp = get_session().post(url, headers=headers, json=payload, timeout=120)
             status = resp.status_code
             try:
                 data = resp.json()
@@ -54,7 +64,19 @@ class OpenAIClient:
                     "request_id": resp.headers.get("x-request-id"),
                     "temperature": temperature,
                 }
+                if limiter is not None:
+                    used = (data.get("usage") or {}).get("total_tokens")
+                    if isinstance(used, (int, float)):
+                        limiter.adjust(int(used) - est_tokens)
+                    meta["rate_limit_wait_ms"] = int(waited * 1000)
                 return content, meta
+            retry_after = resp.headers.get("Retry-After")
+            try:
+                delay = float(retry_after) if retry_after else None
+            except Exception:
+                delay = None
+            if limiter is not None and status == 429:
+                limiter.pause(delay if delay is not None else 1.0)
             if attempts > max(0, retries) or status < 500 and status != 429:
-                raise RuntimeError(f"OpenAI 调用失败: {status} {resp.text[:200]}")
+                raise ProviderHTTPError(f"OpenAI 调用失败: {status} {resp.text[:200]}", status, delay)
 
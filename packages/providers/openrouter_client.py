@@ -15,6 +15,10 @@ import json
 import os
 from typing import Any, Dict, List, Optional
 
+from packages.providers.http_pool import get_session
+from packages.providers.interfaces import ProviderHTTPError
+from packages.providers.ratelimit import estimate_request_tokens
+
 
 def _load_dotenv_if_available() -> None:
     try:
@@ -47,13 +51,13 @@ class OpenRouterClient:
 
         if not self.api_key:
             raise RuntimeError("缺少 OPENROUTER_API_KEY，请在环境变量或 .env 中配置")
+        # 可选的共享限流器（由 LLMRouter 按 llm.rate_limit 注入）
+        self.rate_limiter: Optional[Any] = None
 
     def chat(self, messages: List[Dict[str, str]], temperature: float = 0.2, max_tokens: Optional[int] = None) -> str:
         """调用 OpenRouter 的 chat/completions 接口，返回第一条回复文本。
         messages: [ {"role":"system|user|assistant", "content":"..."}, ... ]
         """
-        import requests  # 依赖 requests
-
         url = f"{self.base_url.rstrip('/')}/chat/completions"
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -69,9 +73,9 @@ class OpenRouterClient:
         if self.seed is not None:
             payload["seed"] = self.seed
 
-        resp = requests.post(url, headers=headers, json=payload, timeout=120)
+        resp = get_session().post(url, headers=headers, json=payload, timeout=120)
         if resp.status_code >= 400:
-            raise RuntimeError(f"OpenRouter 调用失败: {resp.status_code} {resp.text[:200]}")
+            raise ProviderHTTPError(f"OpenRouter 调用失败: {resp.status_code} {resp.text[:200]}", resp.status_code)
         data = resp.json()
         try:
             return data["choices"][0]["message"]["content"]
@@ -87,8 +91,8 @@ class OpenRouterClient:
     ) -> (str, Dict[str, Any]):
         """同 chat，但返回 (content, meta)。包含 provider/model/usage/status/attempts/request_id。
         增强：对 429/5xx 实施指数退避重试，并尊重 Retry-After 头。
+        若注入了 rate_limiter，则每次发送前排队取令牌，429 时经限流器让所有调用方共同暂停。
         """
-        import requests
         import time
         import random
 
@@ -107,11 +111,16 @@ class OpenRouterClient:
         if self.seed is not None:
             payload["seed"] = self.seed
 
+        limiter = self.rate_limiter
+        est_tokens = estimate_request_tokens(messages, max_tokens) if limiter is not None else 0
+        waited = 0.0
         attempts = 0
         last_err: Optional[str] = None
         while True:
             attempts += 1
-            resp = requests.post(url, headers=headers, json=payload, timeout=120)
+            if limiter is not None:
+                waited += limiter.acquire(est_tokens)
+            resp = get_session().post(url, headers=headers, json=payload, timeout=120)
             status = resp.status_code
             try:
                 data = resp.json()
@@ -128,14 +137,12 @@ class OpenRouterClient:
                     "request_id": resp.headers.get("x-request-id"),
                     "temperature": temperature,
                 }
+                if limiter is not None:
+                    used = (data.get("usage") or {}).get("total_tokens")
+                    if isinstance(used, (int, float)):
+                        limiter.adjust(int(used) - est_tokens)
+                    meta["rate_limit_wait_ms"] = int(waited * 1000)
                 return content, meta
-            # 非可重试错误（4xx 除 429）
-            if status < 500 and status != 429:
-                raise RuntimeError(f"OpenRouter 调用失败: {status} {resp.text[:200]}")
-            # 可重试错误（429/5xx）：若超过重试次数则抛出
-            if attempts > max(0, retries):
-                raise RuntimeError(f"OpenRouter 调用失败: {status} {resp.text[:200]}")
-            # 指数退避，尊重 Retry-After
             retry_after = resp.headers.get("Retry-After")
             delay = None
             try:
@@ -143,9 +150,20 @@ class OpenRouterClient:
                     delay = float(retry_after)
             except Exception:
                 delay = None
-            if delay is None:
-                delay = min(8.0, (2 ** (attempts - 1))) + random.uniform(0, 0.5)
-            time.sleep(delay)
+            # 非可重试错误（4xx 除 429）
+            if status < 500 and status != 429:
+                raise ProviderHTTPError(f"OpenRouter 调用失败: {status} {resp.text[:200]}", status)
+            # 指数退避，尊重 Retry-After
+            backoff = delay if delay is not None else min(8.0, (2 ** (attempts - 1))) + random.uniform(0, 0.5)
+            if limiter is not None and status == 429:
+                # 共享暂停（含最后一次尝试）：其它线程/进程同样会避让；本调用的下一轮 acquire 负责等待
+                limiter.pause(backoff)
+            # 可重试错误（429/5xx）：若超过重试次数则抛出
+            if attempts > max(0, retries):
+                raise ProviderHTTPError(f"OpenRouter 调用失败: {status} {resp.text[:200]}", status, delay)
+            if limiter is not None and status == 429:
+                continue
+            time.sleep(backoff)
 
 
 def extract_json_block(text: str) -> Dict[str, Any]:
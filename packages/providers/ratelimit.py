@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: providers.ratelimit
+  目标: 按 provider/model 共享的令牌桶限流（每分钟请求数 rpm + 每分钟 token 数 tpm），
+        线程间共享；backend=sqlite 时借助 SQLite 事务跨进程共享（server 派生的 min_loop 子进程）。
+  接口:
+    - RateLimiter(key, rpm, tpm, state_path).acquire(tokens) -> 等待秒数（阻塞直到放行）
+    - RateLimiter.pause(seconds): 收到 Retry-After 时让所有调用方暂停
+    - RateLimiter.adjust(delta_tokens): 以实际 usage 校正预估 token
+    - limiter_for(cfg, provider, model) -> RateLimiter | None（未配置 llm.rate_limit 时为 None）
+    - limiter_stats() -> dict（排队等待时间等指标）
+  配置: llm.rate_limit = {rpm, tpm, backend: sqlite|memory, state_path, models: {"<provider>:<model>": {rpm, tpm}}}
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+  key TEXT PRIMARY KEY,
+  req REAL,
+  tok REAL,
+  ts REAL,
+  paused_until REAL
+);
+"""
+
+# 单次等待的最长睡眠片段：睡醒后重新读取共享状态，及时感知他人的 pause/释放
+_MAX_SLEEP = 1.0
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        key: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        state_path: Optional[str] = None,
+    ) -> None:
+        self.key = key
+        self.rpm = float(rpm) if rpm else None
+        self.tpm = float(tpm) if tpm else None
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._mem: Optional[Tuple[float, float, float, float]] = None
+        self._local = threading.local()
+        self._stats = {"acquired": 0, "waited": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "pauses": 0}
+        if state_path:
+            os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+            conn = self._conn()
+            conn.executescript(_SCHEMA)
+
+    # -- 状态读写（memory: 线程锁；sqlite: BEGIN IMMEDIATE 跨进程互斥） --
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.state_path, timeout=30, isolation_level=None)  # type: ignore[arg-type]
+            self._local.conn = conn
+        return conn
+
+    def _full(self, now: float) -> Tuple[float, float, float, float]:
+        return (self.rpm or 0.0, self.tpm or 0.0, now, 0.0)
+
+    def _transact(self, fn: Any) -> Any:
+        """在互斥区内读取 (req, tok, ts, paused_until)，由 fn 返回 (new_state, result)。"""
+        now = time.time()
+        if not self.state_path:
+            with self._lock:
+                state = self._mem or self._full(now)
+                new_state, result = fn(state, now)
+                self._mem = new_state
+                return result
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT req, tok, ts, paused_until FROM buckets WHERE key=?", (self.key,)).fetchone()
+                state = tuple(row) if row else self._full(now)
+                new_state, result = fn(state, now)
+                conn.execute(
+                    "REPLACE INTO buckets(key, req, tok, ts, paused_until) VALUES (?,?,?,?,?)",
+                    (self.key, *new_state),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return result
+
+    def _refill(self, state: Tuple[float, float, float, float], now: float) -> Tuple[float, float]:
+        req, tok, ts, _ = state
+        dt = max(0.0, now - ts)
+        if self.rpm:
+            req = min(self.rpm, req + dt * self.rpm / 60.0)
+        if self.tpm:
+            tok = min(self.tpm, tok + dt * self.tpm / 60.0)
+        return req, tok
+
+    # -- 对外接口 --
+    def acquire(self, tokens: int = 0) -> float:
+        """阻塞直到 rpm/tpm 均有余量且不处于暂停期；返回累计等待秒数。"""
+        need = float(max(0, int(tokens)))
+        if self.tpm:
+            # 超过桶容量的单次请求按容量计，避免永久等待
+            need = min(need, self.tpm)
+        t0 = time.time()
+
+        def _take(state: Tuple[float, float, float, float], now: float) -> Tuple[Tuple[float, float, float, float], float]:
+            req, tok = self._refill(state, now)
+            paused_until = state[3]
+            if now < paused_until:
+                return (req, tok, now, paused_until), paused_until - now
+            wait = 0.0
+            if self.rpm and req < 1.0:
+                wait = max(wait, (1.0 - req) * 60.0 / self.rpm)
+            if self.tpm and tok < need:
+                wait = max(wait, (need - tok) * 60.0 / self.tpm)
+            if wait > 0:
+                return (req, tok, now, paused_until), wait
+            if self.rpm:
+                req -= 1.0
+            if self.tpm:
+                tok -= need
+            return (req, tok, now, paused_until), 0.0
+
+        while True:
+            wait = self._transact(_take)
+            if wait <= 0:
+                break
+            time.sleep(min(wait, _MAX_SLEEP))
+        waited = time.time() - t0
+        with self._lock:
+            self._stats["acquired"] += 1
+            if waited > 0.001:
+                self._stats["waited"] += 1
+                self._stats["wait_ms_total"] += waited * 1000
+                self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited * 1000)
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        """上游返回 Retry-After：共享状态内设置暂停截止时间，所有进程的 acquire 都会等待。"""
+        seconds = max(0.0, float(seconds))
+
+        def _set(state: Tuple[float, float, float, float], now: float) -> Tuple[Tuple[float, float, float, float], None]:
+            req, tok = self._refill(state, now)
+            return (req, tok, now, max(state[3], now + seconds)), None
+
+        self._transact(_set)
+        with self._lock:
+            self._stats["pauses"] += 1
+
+    def adjust(self, delta_tokens: int) -> None:
+        """按实际 usage 与预估的差值校正 token 桶（可为负，即归还）。"""
+        if not self.tpm or not delta_tokens:
+            return
+
+        def _adj(state: Tuple[float, float, float, float], now: float) -> Tuple[Tuple[float, float, float, float], None]:
+            req, tok = self._refill(state, now)
+            tok = min(self.tpm or 0.0, tok - float(delta_tokens))
+            return (req, tok, now, state[3]), None
+
+        self._transact(_adj)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+        s["wait_ms_total"] = round(s["wait_ms_total"], 1)
+        s["wait_ms_max"] = round(s["wait_ms_max"], 1)
+        s["wait_ms_avg"] = round(s["wait_ms_total"] / s["waited"], 1) if s["waited"] else 0.0
+        s.update({"rpm": self.rpm, "tpm": self.tpm, "shared": bool(self.state_path)})
+        return s
+
+
+def estimate_request_tokens(messages: Any, max_tokens: Optional[int] = None) -> int:
+    """粗略预估请求 token：约 4 字符/token，加上期望输出上限。"""
+    chars = 0
+    for m in messages or []:
+        if isinstance(m, dict):
+            chars += len(str(m.get("content") or ""))
+    return chars // 4 + int(max_tokens or 0)
+
+
+_LIMITERS: Dict[str, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def limiter_for(cfg: Dict[str, Any], provider: str, model: Optional[str]) -> Optional[RateLimiter]:
+    rl = ((cfg.get("llm", {}) or {}).get("rate_limit") or {})
+    if not isinstance(rl, dict):
+        return None
+    key = f"{provider}:{model or 'default'}"
+    per_model = (rl.get("models") or {}).get(key) or {}
+    rpm = per_model.get("rpm", rl.get("rpm"))
+    tpm = per_model.get("tpm", rl.get("tpm"))
+    if not rpm and not tpm:
+        return None
+    state_path = None
+    if str(rl.get("backend", "sqlite")) == "sqlite":
+        state_path = os.path.abspath(str(rl.get("state_path") or os.path.join("workspace", "ratelimit.db")))
+    ident = f"{key}|{rpm}|{tpm}|{state_path}"
+    with _LIMITERS_LOCK:
+        lim = _LIMITERS.get(ident)
+        if lim is None:
+            lim = RateLimiter(key, rpm=rpm, tpm=tpm, state_path=state_path)
+            _LIMITERS[ident] = lim
+        return lim
+
+
+def reset_limiters() -> None:
+    with _LIMITERS_LOCK:
+        _LIMITERS.clear()
+
+
+def limiter_stats() -> Dict[str, Any]:
+    with _LIMITERS_LOCK:
+        items = list(_LIMITERS.values())
+    return {lim.key: lim.stats() for lim in items}
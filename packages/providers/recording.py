@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: providers.recording
+  目标: LLM 调用的录制与回放，使整条 LLM 轨迹（plan → execute → review → revise）可离线、确定性复跑
+  接口:
+    - RecordingProvider(inner): 包装任意 LLMChatProvider；调用方设置 .stage 后调用，
+      每次请求/响应以 {stage, seq, key, request, response, latency_ms} 记录；save(path) 写 JSONL
+    - ReplayProvider(records, strict=False): 按 (stage, key) 返回录制的响应；key 未命中时按该阶段的录制顺序回退
+      （strict=True 时抛 ReplayMissError）；meta.replay 标注命中方式
+    - load_recording(path) -> list[dict]; recording_path(episodes_dir, trace_id) -> str
+  约束: key 与 provider/端点无关（仅由 messages/temperature/max_tokens 决定），换端点录制的轨迹仍可回放
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from packages.providers.singleflight import request_fingerprint
+
+
+class ReplayMissError(KeyError):
+    pass
+
+
+def request_key(messages: List[Dict[str, str]], temperature: float, max_tokens: Optional[int]) -> str:
+    return request_fingerprint("", None, messages, temperature, max_tokens)
+
+
+def recording_path(episodes_dir: str, trace_id: str) -> str:
+    return os.path.join(episodes_dir, f"{trace_id}.llm.jsonl")
+
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                out.append(json.loads(line))
+            except Exception:
+                continue
+    return out
+
+
+class RecordingProvider:
+    def __init__(self, inner: Any) -> None:
+        self.inner = inner
+        self.stage = "unknown"
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        # 透传 model/base_url 等属性，便于上层读取
+        return getattr(self.inner, name)
+
+    def chat_with_meta(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
+        max_tokens: Optional[int] = None,
+        retries: int = 0,
+    ) -> Tuple[str, Dict[str, Any]]:
+        stage = self.stage
+        t0 = time.time()
+        content, meta = self.inner.chat_with_meta(messages, temperature=temperature, max_tokens=max_tokens, retries=retries)
+        latency_ms = int((time.time() - t0) * 1000)
+        with self._lock:
+            self.records.append({
+                "stage": stage,
+                "seq": len(self.records),
+                "key": request_key(messages, temperature, max_tokens),
+                "request": {"messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+                "response": {"content": content, "meta": meta},
+                "latency_ms": latency_ms,
+            })
+        return content, meta
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with self._lock:
+            records = list(self.records)
+        with open(tmp, "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+        return path
+
+
+class ReplayProvider:
+    def __init__(self, records: List[Dict[str, Any]], strict: bool = False) -> None:
+        self.stage = "unknown"
+        self.strict = strict
+        self.model = None
+        self._by_key: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = {}
+        self._by_stage: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._used: set = set()
+        self._lock = threading.Lock()
+        for r in records:
+            st = str(r.get("stage", "unknown"))
+            self._by_key.setdefault((st, str(r.get("key"))), deque()).append(r)
+            self._by_stage.setdefault(st, deque()).append(r)
+            meta = (r.get("response") or {}).get("meta") or {}
+            self.model = self.model or meta.get("model")
+        self.stats = {"exact": 0, "stage": 0, "miss": 0}
+
+    @classmethod
+    def from_file(cls, path: str, strict: bool = False) -> "ReplayProvider":
+        return cls(load_recording(path), strict=strict)
+
+    def stages(self) -> List[str]:
+        return list(self._by_stage)
+
+    def _take(self, stage: str, key: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        with self._lock:
+            q = self._by_key.get((stage, key))
+            while q:
+                r = q.popleft()
+                if id(r) not in self._used:
+                    self._used.add(id(r))
+                    return r, "exact"
+            if self.strict:
+                return None, "miss"
+            q = self._by_stage.get(stage)
+            while q:
+                r = q.popleft()
+                if id(r) not in self._used:
+                    self._used.add(id(r))
+                    return r, "stage"
+            return None, "miss"
+
+    def chat_with_meta(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
+        max_tokens: Optional[int] = None,
+        retries: int = 0,
+    ) -> Tuple[str, Dict[str, Any]]:
+        key = request_key(messages, temperature, max_tokens)
+        rec, match = self._take(self.stage, key)
+        with self._lock:
+            self.stats[match] += 1
+        if rec is None:
+            raise ReplayMissError(f"录制中无匹配响应: stage={self.stage} key={key[:12]}")
+        resp = rec.get("response") or {}
+        meta = dict(resp.get("meta") or {})
+        meta["replay"] = {"key": key[:12], "match": match, "recorded_latency_ms": rec.get("latency_ms")}
+        return str(resp.get("content") or ""), meta
@@ -2,32 +2,242 @@
 # -*- coding: utf-8 -*-
 SPEC:
   模块: providers.router
-  目标: 简单路由器骨架，按配置选择 OpenRouter 或 OpenAI 客户端
-  说明: 仅骨架，不影响现有 CLI 默认行为
+  目标: 多端点 LLM 路由：按 llm.endpoints 有序列表选择 OpenRouter/OpenAI/Mock 端点，失败时切换
+  配置:
+    llm.endpoints: [{id?, provider, model?, base_url?}, ...]（未配置时回退为 llm.provider/model/base_url 单端点）
+    llm.routing: {strategy: ordered|latency, hedge: bool, hedge_min_samples, hedge_max_delay_ms, hedge_pool_size,
+                  ewma_alpha, breaker_failures, breaker_cooldown_sec}
+  行为:
+    - 每端点维护进程级延迟/错误率 EWMA 与熔断（见 providers.endpoints）
+    - 429/5xx/网络错误时切换到下一个可用端点；非末位端点不做客户端内重试，尽快切换
+    - hedge=true 时，首个请求开始执行后超过该端点 p95 仍未返回则向备用端点发第二个请求，先成功者胜出，另一个结果丢弃；
+      对冲请求在按 hedge_pool_size（默认 64）划分的进程级线程池中执行，在池中排队的时间不计入对冲延迟
+  限流: llm.rate_limit 配置时，为各端点客户端注入按 provider/model 共享的令牌桶（见 providers.ratelimit）
+  合并: 进程内相同指纹的并发请求经 single-flight 合并为一次上游调用（llm.singleflight=false 可关闭）
 """
 
 from __future__ import annotations
 
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from typing import Any, Dict, List, Optional, Tuple
 
+from packages.providers.endpoints import Endpoint, health_for, health_snapshot, parse_endpoints, reset_health
+from packages.providers.interfaces import ProviderHTTPError
+from packages.providers.mock_client import MockLLMClient
 from packages.providers.openrouter_client import OpenRouterClient
 from packages.providers.openai_client import OpenAIClient
+from packages.providers.ratelimit import limiter_for, limiter_stats, reset_limiters
+from packages.providers.singleflight import SingleFlight, request_fingerprint
+
+
+# 进程级共享：服务端按请求构造 LLMRouter，合并需跨实例生效
+_FLIGHT = SingleFlight()
+# 对冲请求使用的共享线程池，按配置的大小区分（同步 HTTP 客户端无法真正取消，败者结果被丢弃）
+_HEDGE_POOLS: Dict[int, ThreadPoolExecutor] = {}
+_HEDGE_POOLS_LOCK = threading.Lock()
+
+
+def _hedge_pool(size: int) -> ThreadPoolExecutor:
+    size = max(2, int(size))
+    with _HEDGE_POOLS_LOCK:
+        pool = _HEDGE_POOLS.get(size)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="llm-hedge")
+            _HEDGE_POOLS[size] = pool
+        return pool
+
+
+def router_metrics() -> Dict[str, Any]:
+    """返回进程内路由指标：single-flight 在途等待者计数、各端点健康度与限流排队等待。"""
+    return {"singleflight": _FLIGHT.stats(), "endpoints": health_snapshot(), "rate_limits": limiter_stats()}
+
+
+_ROUTING_KEYS = ("provider", "model", "base_url", "endpoints", "routing", "rate_limit")
+
+
+def on_llm_config_change(new: Any, old: Any) -> None:
+    """配置服务订阅回调：仅当端点/路由/限流相关键变化时，丢弃按旧配置建立的健康度与限流器。"""
+    new, old = new or {}, old or {}
+    if any(new.get(k) != old.get(k) for k in _ROUTING_KEYS):
+        reset_health()
+        reset_limiters()
+
+
+def _build_client(ep: Endpoint, cfg: Dict[str, Any]) -> Any:
+    if ep.provider == "mock":
+        opts = (cfg.get("llm", {}) or {}).get("mock") or {}
+        client: Any = MockLLMClient(model=ep.model, base_url=ep.base_url, options=opts)
+    elif ep.provider == "openai":
+        client = OpenAIClient(base_url=ep.base_url, model=ep.model)
+    else:
+        client = OpenRouterClient(base_url=ep.base_url, model=ep.model)
+    client.rate_limiter = limiter_for(cfg, ep.provider, getattr(client, "model", ep.model))
+    return client
+
+
+def _should_failover(e: BaseException) -> bool:
+    """429/5xx 与网络层异常可切换端点；其余 4xx 属请求本身问题，直接抛出。"""
+    if isinstance(e, ProviderHTTPError):
+        return e.retryable
+    return True
 
 
 class LLMRouter:
     def __init__(self, cfg: Dict[str, Any]) -> None:
         self.cfg = cfg
-        self.provider = cfg.get("llm", {}).get("provider", "openrouter")
-        if self.provider == "openai":
-            self.client = OpenAIClient(
-                base_url=cfg.get("llm", {}).get("base_url"),
-                model=cfg.get("llm", {}).get("model"),
-            )
-        else:
-            self.client = OpenRouterClient(
-                base_url=cfg.get("llm", {}).get("base_url"),
-                model=cfg.get("llm", {}).get("model"),
+        llm = cfg.get("llm", {}) or {}
+        self.provider = llm.get("provider", "openrouter")
+        self.singleflight = bool(llm.get("singleflight", True))
+        routing = llm.get("routing", {}) or {}
+        self.strategy = str(routing.get("strategy", "ordered"))
+        self.hedge = bool(routing.get("hedge", False))
+        self.hedge_min_samples = int(routing.get("hedge_min_samples", 20))
+        self.hedge_max_delay_ms = float(routing.get("hedge_max_delay_ms", 30000))
+        self.hedge_pool_size = int(routing.get("hedge_pool_size", 64))
+
+        self.endpoints: List[Tuple[Endpoint, Any]] = []
+        errors: List[Exception] = []
+        for ep in parse_endpoints(cfg):
+            try:
+                client = _build_client(ep, cfg)
+            except Exception as e:
+                # 多端点时单个端点缺少密钥等不致命；全部失败时抛出首个错误
+                errors.append(e)
+                continue
+            health_for(ep.id).configure(
+                alpha=float(routing.get("ewma_alpha", 0.2)),
+                breaker_failures=int(routing.get("breaker_failures", 3)),
+                breaker_cooldown_sec=float(routing.get("breaker_cooldown_sec", 30.0)),
             )
+            self.endpoints.append((ep, client))
+        if not self.endpoints:
+            raise errors[0] if errors else RuntimeError("未配置可用的 LLM 端点")
+        self.client = self.endpoints[0][1]
+        self._route_key = "|".join(f"{ep.id}@{ep.base_url or getattr(c, 'base_url', '')}" for ep, c in self.endpoints)
+
+    def _ordered(self) -> List[Tuple[Endpoint, Any]]:
+        eps = list(self.endpoints)
+        if self.strategy == "latency":
+            eps.sort(key=lambda ec: health_for(ec[0].id).expected_cost_ms())
+        return eps
+
+    def _attempt(
+        self,
+        ep: Endpoint,
+        client: Any,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int],
+        retries: int,
+    ) -> Tuple[str, Dict[str, Any]]:
+        h = health_for(ep.id)
+        t0 = time.time()
+        try:
+            content, meta = client.chat_with_meta(messages, temperature=temperature, max_tokens=max_tokens, retries=retries)
+        except Exception as e:
+            if _should_failover(e):
+                h.record_failure(getattr(e, "retry_after", None))
+            raise
+        finally:
+            # 非可切换错误不计成败，但半开试探必须结束
+            h.release_probe()
+        h.record_success((time.time() - t0) * 1000)
+        return content, meta
+
+    def _hedge_delay_ms(self, ep: Endpoint) -> Optional[float]:
+        h = health_for(ep.id)
+        if h.sample_count() < self.hedge_min_samples:
+            return None
+        p95 = h.p95_ms()
+        return min(p95, self.hedge_max_delay_ms) if p95 is not None else None
+
+    def _routed(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int],
+        retries: int,
+    ) -> Tuple[str, Dict[str, Any]]:
+        queue = self._ordered()
+        attempted: List[str] = []
+        hedged = False
+        last_err: Optional[BaseException] = None
+
+        def _next_available() -> Optional[Tuple[Endpoint, Any]]:
+            while queue:
+                ec = queue.pop(0)
+                if health_for(ec[0].id).available():
+                    return ec
+            return None
+
+        def _finish(ep: Endpoint, content: str, meta: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+            meta = dict(meta or {})
+            meta["route"] = {"endpoint": ep.id, "attempted": attempted, "hedged": hedged}
+            return content, meta
+
+        cur = _next_available()
+        if cur is None:
+            # 全部熔断：退化为尝试首选端点，避免单端点配置下整体不可用
+            cur = self._ordered()[0]
+        while cur is not None:
+            ep, client = cur
+            attempted.append(ep.id)
+            # 末位端点保留客户端内重试；其余端点失败即切换
+            r = retries if not queue else 0
+            delay_ms = self._hedge_delay_ms(ep) if (self.hedge and queue) else None
+            if delay_ms is None:
+                try:
+                    content, meta = self._attempt(ep, client, messages, temperature, max_tokens, r)
+                    return _finish(ep, content, meta)
+                except Exception as e:
+                    if not _should_failover(e):
+                        raise
+                    last_err = e
+                    cur = _next_available()
+                    continue
+
+            # 对冲：主请求开始执行后超过 p95 仍未返回时，向下一个可用端点发起第二个请求
+            pool = _hedge_pool(self.hedge_pool_size)
+            started = threading.Event()
+
+            def _primary(ep: Endpoint = ep, client: Any = client, r: int = r) -> Tuple[str, Dict[str, Any]]:
+                started.set()
+                return self._attempt(ep, client, messages, temperature, max_tokens, r)
+
+            pending: Dict[Future, Endpoint] = {pool.submit(_primary): ep}
+            # 池满时主请求排队的时间不计入对冲延迟，避免误触发对冲
+            started.wait()
+            done, _ = wait(list(pending), timeout=delay_ms / 1000.0)
+            if not done:
+                alt = _next_available()
+                if alt is not None:
+                    hedged = True
+                    attempted.append(alt[0].id)
+                    fut_alt = pool.submit(
+                        self._attempt, alt[0], alt[1], messages, temperature, max_tokens, retries if not queue else 0
+                    )
+                    pending[fut_alt] = alt[0]
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    winner = pending.pop(fut)
+                    err = fut.exception()
+                    if err is None:
+                        for loser, loser_ep in pending.items():
+                            # 未开始即取消的请求不会进入 _attempt：在此结束其半开试探
+                            if loser.cancel():
+                                health_for(loser_ep.id).release_probe()
+                        content, meta = fut.result()
+                        return _finish(winner, content, meta)
+                    if not _should_failover(err):
+                        raise err
+                    last_err = err
+            cur = _next_available()
+
+        assert last_err is not None
+        raise last_err
 
     def chat_with_meta(
         self,
@@ -36,5 +246,19 @@ class LLMRouter:
         max_tokens: Optional[int] = None,
         retries: int = 0,
     ) -> Tuple[str, Dict[str, Any]]:
-        return self.client.chat_with_meta(messages, temperature=temperature, max_tokens=max_tokens, retries=retries)  # type: ignore
+        def _call() -> Tuple[str, Dict[str, Any]]:
+            return self._routed(messages, temperature, max_tokens, retries)
 
+        if not self.singleflight:
+            return _call()
+        key = request_fingerprint(
+            self._route_key,
+            getattr(self.client, "model", None),
+            messages,
+            temperature,
+            max_tokens,
+        )
+        (content, meta), shared = _FLIGHT.do(key, _call)
+        meta = dict(meta or {})
+        meta["singleflight"] = {"key": key[:12], "shared": shared}
+        return content, meta
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: providers.singleflight
+  目标: 合并进程内“相同指纹、同时在途”的 LLM 请求（single-flight），共享同一结果或异常。
+  接口:
+    - request_fingerprint(provider, model, messages, temperature, max_tokens) -> str
+    - SingleFlight().do(key, fn) -> (result, shared)
+    - SingleFlight().stats() -> dict（在途 key 的等待者数量与累计计数）
+  约束: 仅合并并发在途请求，不做结果缓存；首个调用者完成后 key 即释放。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def request_fingerprint(
+    provider: str,
+    model: Optional[str],
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: Optional[int],
+) -> str:
+    """对影响响应内容的请求字段做稳定哈希（不含 retries 等传输参数）。"""
+    body = {
+        "provider": provider,
+        "model": model,
+        "messages": messages,
+        "temperature": float(temperature),
+        "max_tokens": max_tokens,
+    }
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """执行 fn 或挂接到同 key 的在途调用。返回 (result, shared)，shared=True 表示复用了他人的结果。"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._leaders += 1
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def waiters(self, key: str) -> int:
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            inflight = {k[:12]: c.waiters for k, c in self._calls.items()}
+            return {
+                "inflight": inflight,
+                "leaders": self._leaders,
+                "coalesced": self._coalesced,
+            }
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: tools.builtin
+  目标: 内置工具（fs/data/skills/stats/report）的唯一本地实现；服务端回退、聊天代理与 mcp_host 共用。
+  接口: 每个实现为 fn(args, base_dir) -> {"text": str} | {"structured": dict}，导入本模块即挂接到 tools.registry
+  数据集: data.load_csv / skills.csv_clean 返回句柄 ds://<hash>（见 tools.datasets）；
+        skills.csv_clean / stats.aggregate 接受 dataset 句柄（或在 path/rows 位置传句柄）代替路径与行列表，
+        链式调用时数据只解析一次、在进程内按引用传递
+  约束: 相对路径按 base_dir（仓库根）解析；fs.list_dir 限制在 base_dir 内；异常转为 {"text": "Error: ..."}，不外抛
+"""
+
+from __future__ import annotations
+
+import datetime
+import itertools
+import os
+from typing import Any, Dict, List
+
+from packages.tools.datasets import datasets, is_handle, register_transform
+from packages.tools.registry import bind_handler
+
+
+def _resolve(base_dir: str, path: Any) -> str:
+    return os.path.join(base_dir, str(path or ""))
+
+
+def fs_read_text(args: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    p = _resolve(base_dir, args.get("path"))
+    if not os.path.isfile(p):
+        return {"text": f"<not found: {args.get('path')!r}>"}
+    with open(p, "r", encoding="utf-8", errors="ignore") as f:
+        return {"text": f.read(int(args.get("max_bytes") or 32768))}
+
+
+def fs_list_dir(args: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    base = os.path.abspath(base_dir)
+    req = str(args.get("path") or ".")
+    p = os.path.abspath(os.path.join(base, req))
+    # 限制在 base 内
+    if os.path.commonpath([p, base]) != os.path.commonpath([base]):
+        return {"structured": {"error": "forbidden"}}
+    if not os.path.isdir(p):
+        return {"structured": {"error": f"not a directory: {req}"}}
+    dirs, files = [], []
+    for name in os.listdir(p)[:500]:
+        full = os.path.join(p, name)
+        try:
+            st = os.stat(full)
+            info = {
+                "name": name,
+                "size": int(st.st_size),
+                "mtime": datetime.datetime.utcfromtimestamp(st.st_mtime).isoformat() + "Z",
+            }
+            if os.path.isdir(full):
+                dirs.append(info)
+            else:
+                files.append(info)
+        except Exception:
+            pass
+    rel = os.path.relpath(p, base)
+    return {"structured": {"cwd": "/" if rel == "." else rel, "dirs": dirs, "files": files}}
+
+
+def data_csv_head(args: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    p = _resolve(base_dir, args.get("path"))
+    if not os.path.isfile(p):
+        return {"text": f"<not found: {args.get('path')!r}>"}
+    with open(p, "r", encoding="utf-8", errors="ignore") as f:
+        return {"text": "".join(itertools.islice(f, int(args.get("n") or 50)))}
+
+
+def _source_handle(args: Dict[str, Any], base_dir: str, *keys: str) -> str:
+    """按优先级取 dataset / path / rows 位置上的句柄；都不是句柄时按 path 解析 CSV 得到句柄。"""
+    for k in ("dataset",) + keys:
+        if is_handle(args.get(k)):
+            return str(args[k])
+    return datasets().from_csv(str(args.get("path") or ""), base_dir)
+
+
+def _clean(rows: List[Dict[str, Any]], **options: Any) -> List[Dict[str, Any]]:
+    from skills.csv_clean import csv_clean  # type: ignore
+
+    return csv_clean(rows, **options)
+
+
+register_transform("skills.csv_clean", _clean)
+
+
+def data_load_csv(args: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    return {"structured": datasets().info(datasets().from_csv(str(args.get("path") or ""), base_dir))}
+
+
+def skills_csv_clean(args: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    reg = datasets()
+    handle = reg.derive(_source_handle(args, base_dir, "path"), "skills.csv_clean", **(args.get("options") or {}))
+    with reg.use(handle) as cleaned:
+        return {"structured": {"cleaned_count": len(cleaned), "dataset": handle}}
+
+
+def stats_aggregate(args: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    from skills.stats_aggregate import stats_aggregate as _agg  # type: ignore
+
+    kw = {k: v for k, v in args.items() if k not in ("rows", "path", "dataset")}
+    rows = args.get("rows")
+    if isinstance(rows, list) and rows:
+        return {"structured": _agg(rows, **kw)}
+    reg = datasets()
+    handle = _source_handle(args, base_dir, "rows", "path")
+    with reg.use(handle) as rows:
+        return {"structured": _agg(rows, **kw)}
+
+
+def report_md_render(args: Dict[str, Any], base_dir: str) -> Dict[str, Any]:
+    from skills.md_render import md_render  # type: ignore
+
+    extra = {k: v for k, v in args.items() if k not in ("summary", "top")}
+    return {"text": md_render(summary=args.get("summary") or {}, top=args.get("top") or [], **extra)}
+
+
+BUILTINS = {
+    "fs.read_text": fs_read_text,
+    "fs.list_dir": fs_list_dir,
+    "data.csv_head": data_csv_head,
+    "data.load_csv": data_load_csv,
+    "skills.csv_clean": skills_csv_clean,
+    "stats.aggregate": stats_aggregate,
+    "report.md_render": report_md_render,
+}
+
+for _name, _fn in BUILTINS.items():
+    bind_handler(_name, _fn)
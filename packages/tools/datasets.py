@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: tools.datasets
+  目标: 进程内数据集注册表：工具之间以不透明句柄 ds://<hash> 传递已解析的数据（列式 Dataset 或行列表），
+        csv_clean → stats.aggregate → report 的链路不再在每一跳重新读取/解析 CSV 或把整份 rows 序列化进参数。
+  接口:
+    - DatasetRegistry(max_bytes)
+        .from_csv(path, base_dir) -> handle（同一文件未变化时复用已解析结果）
+        .derive(parent, op, **opts) -> handle（对父数据集应用已注册变换，如 csv_clean）
+        .put_rows(rows) -> handle（按内容哈希）
+        .get(handle) -> rows（CSV 解析为列式 packages.data.dataset.Dataset，可按行字典序列使用；
+                             只读约定：调用方不得原地修改）；被淘汰的句柄按“配方”重新物化
+        .acquire(handle) / .release(handle) / .use(handle) 上下文：引用计数，被引用的数据集不会被淘汰
+        .stats()
+    - datasets() 进程级单例；is_handle(x)；resolve_rows(value, base_dir) -> rows（句柄/行列表/路径 三者皆可）
+    - register_transform(op, fn(rows, **opts) -> rows)
+  句柄: 内容寻址——CSV 由 (绝对路径, inode, size, mtime_ns) 派生，派生数据集由 (父句柄, op, 参数) 派生，
+        行列表由内容 JSON 派生；相同输入得到相同句柄，可安全作为结果缓存的键
+  内存: 按估算字节数计入预算（tools.datasets.max_mb），超出时按 LRU 淘汰引用计数为 0 的数据集；
+        配方（如何重建）单独保留，淘汰后再次 get 会按配方重建（源文件已变化则报错）
+  约束: 句柄仅在创建它的进程内有效；跨进程复用解析结果见磁盘缓存（packages.data.dataset_cache，CSV 解析先查它）
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+from packages.data.dataset_cache import load_csv_cached
+
+
+PREFIX = "ds://"
+
+Rows = Sequence[Dict[str, Any]]
+Transform = Callable[..., Rows]
+
+_TRANSFORMS: Dict[str, Transform] = {}
+
+
+def register_transform(op: str, fn: Transform) -> None:
+    _TRANSFORMS[op] = fn
+
+
+def is_handle(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(PREFIX)
+
+
+def _digest(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def estimate_bytes(rows: Rows) -> int:
+    """粗略估算占用，用于内存预算：列式数据集按列存储大小；行列表按字符串长度 + 每行/每格固定开销。"""
+    if hasattr(rows, "nbytes"):
+        return int(rows.nbytes)  # type: ignore[attr-defined]
+    n = 64
+    for r in rows:
+        n += 232
+        for k, v in r.items():
+            n += 16 + len(str(k)) + (len(v) if isinstance(v, str) else 24)
+    return n
+
+
+class _Entry:
+    __slots__ = ("rows", "nbytes", "refs", "last_used")
+
+    def __init__(self, rows: Rows) -> None:
+        self.rows = rows
+        self.nbytes = estimate_bytes(rows)
+        self.refs = 0
+        self.last_used = time.monotonic()
+
+
+class DatasetRegistry:
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_recipes: int = 4096) -> None:
+        self.max_bytes = int(max_bytes)
+        self.max_recipes = int(max_recipes)
+        self._data: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._recipes: "OrderedDict[str, Tuple[Any, ...]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.counters: Dict[str, int] = {"hit": 0, "load": 0, "rebuild": 0, "evicted": 0}
+
+    # ---- 注册 ----
+    def _store(self, handle: str, rows: Rows, recipe: Optional[Tuple[Any, ...]], pin: bool = False) -> str:
+        with self._lock:
+            if recipe is not None:
+                self._recipes[handle] = recipe
+                self._recipes.move_to_end(handle)
+                while len(self._recipes) > self.max_recipes:
+                    self._recipes.popitem(last=False)
+            e = self._data.get(handle)
+            if e is not None:
+                self._data.move_to_end(handle)
+            else:
+                e = _Entry(rows)
+                self._data[handle] = e
+                self._bytes += e.nbytes
+            if pin:
+                # 先计引用再淘汰，刚物化的数据集不会被自己挤出
+                e.refs += 1
+            self._evict()
+        return handle
+
+    def _evict(self) -> None:
+        if self._bytes <= self.max_bytes:
+            return
+        for h in list(self._data.keys()):
+            if self._bytes <= self.max_bytes:
+                break
+            e = self._data[h]
+            if e.refs > 0:
+                continue
+            del self._data[h]
+            self._bytes -= e.nbytes
+            self.counters["evicted"] += 1
+
+    def put_rows(self, rows: Rows) -> str:
+        rows = list(rows)
+        return self._store(_digest("rows", rows), rows, None)
+
+    def from_csv(self, path: str, base_dir: str = ".") -> str:
+        p = os.path.abspath(os.path.join(base_dir, str(path)))
+        st = os.stat(p)
+        handle = _digest("csv", p, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if handle in self._data:
+                self._data.move_to_end(handle)
+                self.counters["hit"] += 1
+                return handle
+        rows = self._read_csv(p)
+        self.counters["load"] += 1
+        return self._store(handle, rows, ("csv", p, st.st_ino, st.st_size, st.st_mtime_ns))
+
+    @staticmethod
+    def _read_csv(p: str) -> Rows:
+        # 先查磁盘解析缓存（跨进程/跨运行复用），未命中再解析
+        return load_csv_cached(p)
+
+    def derive(self, parent: str, op: str, **opts: Any) -> str:
+        handle = _digest("derive", parent, op, opts)
+        with self._lock:
+            if handle in self._data:
+                self._data.move_to_end(handle)
+                self.counters["hit"] += 1
+                return handle
+        rows = self._apply(parent, op, opts)
+        return self._store(handle, rows, ("derive", parent, op, opts))
+
+    def _apply(self, parent: str, op: str, opts: Dict[str, Any]) -> Rows:
+        fn = _TRANSFORMS.get(op)
+        if fn is None:
+            raise KeyError(f"未注册的数据集变换: {op}")
+        with self.use(parent) as rows:
+            out = fn(rows, **opts)
+            # 列式数据集/列表原样保存；其它可迭代结果物化为列表
+            return out if isinstance(out, (list, Sequence)) else list(out)
+
+    # ---- 读取 ----
+    def _get(self, handle: str, pin: bool) -> Rows:
+        with self._lock:
+            e = self._data.get(handle)
+            if e is not None:
+                self._data.move_to_end(handle)
+                e.last_used = time.monotonic()
+                if pin:
+                    e.refs += 1
+                return e.rows
+            recipe = self._recipes.get(handle)
+        if recipe is None:
+            raise KeyError(f"未知或已失效的数据集句柄: {handle}")
+        rows = self._rebuild(handle, recipe)
+        self.counters["rebuild"] += 1
+        self._store(handle, rows, recipe, pin=pin)
+        return rows
+
+    def get(self, handle: str) -> Rows:
+        return self._get(handle, pin=False)
+
+    def _rebuild(self, handle: str, recipe: Tuple[Any, ...]) -> Rows:
+        if recipe[0] == "csv":
+            _, p, ino, size, mtime_ns = recipe
+            st = os.stat(p)
+            if (st.st_ino, st.st_size, st.st_mtime_ns) != (ino, size, mtime_ns):
+                raise KeyError(f"数据集 {handle} 的源文件已变化: {p}")
+            return self._read_csv(p)
+        _, parent, op, opts = recipe
+        return self._apply(parent, op, opts)
+
+    def acquire(self, handle: str) -> Rows:
+        return self._get(handle, pin=True)
+
+    def release(self, handle: str) -> None:
+        with self._lock:
+            e = self._data.get(handle)
+            if e is not None and e.refs > 0:
+                e.refs -= 1
+            self._evict()
+
+    @contextlib.contextmanager
+    def use(self, handle: str) -> Iterator[Rows]:
+        rows = self.acquire(handle)
+        try:
+            yield rows
+        finally:
+            self.release(handle)
+
+    def info(self, handle: str) -> Dict[str, Any]:
+        rows = self.get(handle)
+        names = getattr(rows, "names", None)
+        return {"dataset": handle, "rows": len(rows), "columns": list(names) if names is not None else (list(rows[0].keys()) if rows else [])}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "datasets": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "pinned": sum(1 for e in self._data.values() if e.refs > 0),
+                **self.counters,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._recipes.clear()
+            self._bytes = 0
+
+
+_REGISTRY: Optional[DatasetRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def datasets() -> DatasetRegistry:
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = DatasetRegistry()
+        return _REGISTRY
+
+
+def configure_datasets(cfg: Optional[Dict[str, Any]]) -> DatasetRegistry:
+    c = ((cfg or {}).get("tools", {}) or {}).get("datasets") or {}
+    reg = datasets()
+    if c.get("max_mb") is not None:
+        with reg._lock:
+            reg.max_bytes = int(float(c["max_mb"]) * 1024 * 1024)
+            reg._evict()
+    return reg
+
+
+def resolve_rows(value: Any, base_dir: str = ".") -> Rows:
+    """句柄 → 注册表中的行；列表 → 原样；其它视为 CSV 路径（经注册表解析并复用）。"""
+    if is_handle(value):
+        return datasets().get(value)
+    if isinstance(value, list):
+        return value
+    return datasets().get(datasets().from_csv(str(value or ""), base_dir))
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: tools.registry
+  目标: 工具声明注册表：按工具名登记参数 schema、是否幂等、成本级别、哪些参数是文件路径、缓存有效期，
+        以及（若有）进程内实现；供工具运行时路由、结果缓存与工具清单共用。
+  接口:
+    - ToolSpec(name, description, schema, idempotent, cost, path_args, ttl_sec, handler)
+    - register_tool(spec) / get_tool_spec(name) -> ToolSpec|None / list_tools() -> list[ToolSpec]
+    - bind_handler(name, fn(args, base_dir) -> dict) : 为已声明工具挂接本地实现（见 tools.builtin）
+  约定: idempotent=True 表示结果只取决于 (参数, path_args 指向文件的内容)，可安全缓存；
+        ttl_sec>0 为额外的时间上限（如目录列表：目录 mtime 不反映子文件大小/时间的变化）；
+        cost: "light"（直接在调用方执行）| "heavy"（整文件解析/聚合，放入线程/进程池）
+"""
+
+from __future__ import annotations
+
+import dataclasses
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+Handler = Callable[[Dict[str, Any], str], Dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    name: str
+    description: str = ""
+    schema: Dict[str, Any] = field(default_factory=dict, compare=False)
+    idempotent: bool = False
+    cost: str = "light"
+    path_args: Tuple[str, ...] = ()
+    ttl_sec: float = 0.0
+    handler: Optional[Handler] = field(default=None, compare=False)
+
+
+_TOOLS: Dict[str, ToolSpec] = {}
+
+
+def register_tool(spec: ToolSpec) -> ToolSpec:
+    _TOOLS[spec.name] = spec
+    return spec
+
+
+def bind_handler(name: str, fn: Handler) -> ToolSpec:
+    spec = _TOOLS.get(name) or ToolSpec(name)
+    return register_tool(dataclasses.replace(spec, handler=fn))
+
+
+def get_tool_spec(name: str) -> Optional[ToolSpec]:
+    return _TOOLS.get(name)
+
+
+def list_tools() -> List[ToolSpec]:
+    return list(_TOOLS.values())
+
+
+def _obj(props: Dict[str, Any], required: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    return {"type": "object", "properties": props, "required": list(required)}
+
+
+_PATH = {"type": "string", "description": "相对仓库根的路径"}
+_DATASET = {"type": "string", "description": "数据集句柄 ds://...（由 data.load_csv / skills.csv_clean 返回），可代替 path/rows"}
+
+# 内置工具（fs/data/skills/stats/report）；远程同名工具沿用同一声明
+register_tool(ToolSpec(
+    "fs.read_text", "读取文本文件(最多32KB)",
+    schema=_obj({"path": _PATH, "max_bytes": {"type": "integer", "default": 32768}}, ("path",)),
+    idempotent=True, path_args=("path",),
+))
+register_tool(ToolSpec(
+    "fs.list_dir", "列出目录内容和元信息(限制在仓库根内)",
+    schema=_obj({"path": {**_PATH, "default": "."}}),
+    idempotent=True, path_args=("path",), ttl_sec=5.0,
+))
+register_tool(ToolSpec(
+    "data.csv_head", "读取 CSV 前 N 行",
+    schema=_obj({"path": _PATH, "n": {"type": "integer", "default": 50}}, ("path",)),
+    idempotent=True, path_args=("path",),
+))
+register_tool(ToolSpec(
+    "data.load_csv", "解析 CSV 并返回数据集句柄(ds://...)、行数与列名",
+    schema=_obj({"path": _PATH}, ("path",)),
+    idempotent=True, cost="heavy", path_args=("path",),
+))
+register_tool(ToolSpec(
+    "skills.csv_clean", "清洗 CSV 行(去空值等)，返回清洗后数据集句柄",
+    schema=_obj({"path": _PATH, "dataset": _DATASET, "options": {"type": "object"}}),
+    idempotent=True, cost="heavy", path_args=("path",),
+))
+register_tool(ToolSpec(
+    "stats.aggregate", "按字段聚合并选 TopN",
+    schema=_obj({
+        "path": _PATH,
+        "dataset": _DATASET,
+        "rows": {"type": "array", "items": {"type": "object"}},
+        "top_n": {"type": "integer", "default": 10},
+        "score_by": {"type": "string", "default": "views"},
+        "title_field": {"type": "string", "default": "title"},
+    }),
+    idempotent=True, cost="heavy", path_args=("path",),
+))
+register_tool(ToolSpec(
+    "report.md_render", "将统计结果渲染为 Markdown",
+    schema=_obj({"summary": {"type": "object"}, "top": {"type": "array"}, "include_table": {"type": "boolean", "default": True}}, ("summary", "top")),
+    idempotent=True,
+))
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: tools.result_cache
+  目标: 幂等工具（本地回退 / 远程 MCP / mcp_host）的结果缓存，避免对同一文件反复读取、解析与聚合。
+  接口:
+    - ToolResultCache(max_bytes).get(key) / .put(key, value, ttl_sec) / .clear() / .stats()
+    - cache_key(tool, args, base_dir, scope) -> key|None（非幂等工具或路径参数指向的文件不存在时为 None）
+    - cached_call(tool, args, fn, base_dir=REPO_ROOT, scope="local") -> (result, "hit"|"miss"|"bypass")；cached_call_async 同上（协程）
+    - result_cache() 进程级单例；configure_result_cache(cfg) 按 tools.result_cache.{enabled,max_mb} 调整
+  键: (scope:tool（scope 区分本地实现与各远程 server，其返回形态可能不同）, sha256(规范化参数 JSON), 各路径参数的文件指纹 (inode, size, mtime_ns)；ds:// 句柄即指纹)
+  内存: 结果以 JSON 文本保存（命中时解析出新对象，调用方修改不会污染缓存），按文本长度计入预算，超出按 LRU 淘汰
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from packages.tools.registry import get_tool_spec
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# (scope:tool, 参数摘要, 各路径参数的指纹元组)
+Key = Tuple[str, str, Tuple[Tuple[Any, ...], ...]]
+
+
+def file_fingerprint(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (int(st.st_ino), int(st.st_size), int(st.st_mtime_ns))
+
+
+def _normalize_args(args: Dict[str, Any]) -> str:
+    return json.dumps(args or {}, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def cache_key(tool: str, args: Dict[str, Any], base_dir: str = REPO_ROOT, scope: str = "local") -> Optional[Key]:
+    spec = get_tool_spec(tool)
+    if spec is None or not spec.idempotent:
+        return None
+    prints: List[Tuple[Any, ...]] = []
+    for name in spec.path_args:
+        v = (args or {}).get(name)
+        if v is None or v == "":
+            if name == "path" and tool == "fs.list_dir":
+                v = "."
+            else:
+                continue
+        if isinstance(v, str) and v.startswith("ds://"):
+            # 数据集句柄按内容寻址，句柄本身即指纹
+            prints.append((name, v))
+            continue
+        p = os.path.abspath(os.path.join(base_dir, str(v)))
+        fp = file_fingerprint(p)
+        if fp is None:
+            # 文件不存在（或位于远端）：无法判断内容是否变化，不缓存
+            return None
+        prints.append((name, p) + fp)
+    digest = hashlib.sha256(_normalize_args(args).encode("utf-8")).hexdigest()
+    return (scope + ":" + tool, digest, tuple(prints))
+
+
+class ToolResultCache:
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_bytes = int(max_bytes)
+        self.enabled = True
+        self._data: "OrderedDict[Key, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Key) -> Tuple[bool, Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] and time.monotonic() > item[1]:
+                self._drop(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            blob = item[0]
+        return True, json.loads(blob)
+
+    def put(self, key: Key, value: Any, ttl_sec: float = 0.0) -> bool:
+        try:
+            blob = json.dumps(value, ensure_ascii=False, default=str)
+        except Exception:
+            return False
+        size = len(blob)
+        if size > self.max_bytes:
+            return False
+        expires = time.monotonic() + ttl_sec if ttl_sec > 0 else 0.0
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (blob, expires)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                old = next(iter(self._data))
+                self._drop(old)
+                self.evictions += 1
+        return True
+
+    def _drop(self, key: Key) -> None:
+        blob, _ = self._data.pop(key)
+        self._bytes -= len(blob)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_CACHE: Optional[ToolResultCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def result_cache() -> ToolResultCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ToolResultCache()
+        return _CACHE
+
+
+def configure_result_cache(cfg: Optional[Dict[str, Any]]) -> ToolResultCache:
+    c = ((cfg or {}).get("tools", {}) or {}).get("result_cache") or {}
+    cache = result_cache()
+    cache.enabled = bool(c.get("enabled", True))
+    if c.get("max_mb") is not None:
+        with cache._lock:
+            cache.max_bytes = int(float(c["max_mb"]) * 1024 * 1024)
+    return cache
+
+
+def cached_call(tool: str, args: Dict[str, Any], fn: Callable[[], Any], base_dir: str = REPO_ROOT, scope: str = "local") -> Tuple[Any, str]:
+    """按 (工具, 参数, 文件指纹) 命中则直接返回；否则执行 fn 并缓存。返回 (结果, 缓存状态)。"""
+    cache = result_cache()
+    key = cache_key(tool, args, base_dir, scope) if cache.enabled else None
+    if key is None:
+        return fn(), "bypass"
+    hit, value = cache.get(key)
+    if hit:
+        return value, "hit"
+    value = fn()
+    spec = get_tool_spec(tool)
+    cache.put(key, value, ttl_sec=spec.ttl_sec if spec else 0.0)
+    return value, "miss"
+
+
+async def cached_call_async(tool: str, args: Dict[str, Any], afn: Callable[[], Any], base_dir: str = REPO_ROOT, scope: str = "local") -> Tuple[Any, str]:
+    """cached_call 的协程版本（远程 MCP 调用）；仅缓存成功返回的结果。"""
+    cache = result_cache()
+    key = cache_key(tool, args, base_dir, scope) if cache.enabled else None
+    if key is None:
+        return await afn(), "bypass"
+    hit, value = cache.get(key)
+    if hit:
+        return value, "hit"
+    value = await afn()
+    spec = get_tool_spec(tool)
+    cache.put(key, value, ttl_sec=spec.ttl_sec if spec else 0.0)
+    return value, "miss"
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+SPEC:
+  模块: tools.runtime
+  目标: 统一工具运行时：一个入口完成 本地/远程 路由、结果缓存与失败回退，取代服务端、聊天代理、mcp_host 各自的本地实现。
+  路由（按调用）:
+    1) require_remote: 只走远程；server 已知不可用时立即抛 MCPServerUnavailable
+    2) 工具有本地实现且 (mcp.local_first 默认开启 | server 未配置 | server 已知不可用): 进程内直接调用（无序列化、无连接）
+    3) 否则调用远程；传输层失败时标记 server 不可用（mcp.down_backoff_sec 内直接跳过），并回退本地实现
+  接口:
+    - ToolRuntime(cfg, client=None, base_dir=REPO_ROOT)
+        .call_local(tool, args) -> dict（结果缓存；cost=heavy 的异步版本放入线程执行）
+        .call_async(server, tool, args) -> 执行记录 {server, tool, args, result, route, latency_ms}
+        .call_many_async(calls) -> [执行记录|{..., error}]（并发；远程部分经 MCPClient.call_tools_async）
+        .available_tools() -> [{name, description, schema, cost, idempotent}]
+        .note_remote_error(server, err_type): 传输层错误时标记 server 不可用（协议级错误不计）
+    - server_down(server_id) / mark_down(server_id, sec) / mark_up(server_id) / health_snapshot()
+  记录: route ∈ local | remote | fallback；结果缓存状态在 result["cache"]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from packages.tools import builtin  # noqa: F401 - 导入即挂接内置工具实现
+from packages.tools.registry import get_tool_spec, list_tools
+from packages.tools.result_cache import REPO_ROOT, cached_call
+
+
+# server_id -> 不可用截止时间（进程级，跨请求共享）
+_DOWN: Dict[str, float] = {}
+_DOWN_LOCK = threading.Lock()
+
+# 服务端协议级错误（工具不存在、参数错误等）不代表 server 不可用
+_APP_ERRORS = ("McpError", "ValueError", "KeyError", "TypeError")
+
+
+def server_down(server_id: str) -> bool:
+    with _DOWN_LOCK:
+        until = _DOWN.get(server_id)
+        if until is None:
+            return False
+        if time.monotonic() >= until:
+            _DOWN.pop(server_id, None)
+            return False
+        return True
+
+
+def mark_down(server_id: str, sec: float) -> None:
+    with _DOWN_LOCK:
+        _DOWN[server_id] = time.monotonic() + max(0.0, float(sec))
+
+
+def mark_up(server_id: str) -> None:
+    with _DOWN_LOCK:
+        _DOWN.pop(server_id, None)
+
+
+def health_snapshot() -> Dict[str, Any]:
+    now = time.monotonic()
+    with _DOWN_LOCK:
+        return {sid: {"down_for_sec": round(until - now, 1)} for sid, until in _DOWN.items() if until > now}
+
+
+class ToolRuntime:
+    def __init__(self, cfg: Dict[str, Any], client: Any = None, base_dir: str = REPO_ROOT) -> None:
+        self.cfg = cfg or {}
+        mc = self.cfg.get("mcp", {}) or {}
+        self.require_remote: bool = bool(mc.get("require_remote"))
+        self.local_first: bool = bool(mc.get("local_first", True))
+        self.down_backoff_sec: float = float(mc.get("down_backoff_sec", 30.0))
+        self.base_dir = base_dir
+        self._client = client
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            from packages.providers.mcp_client import MCPClient
+
+            self._client = MCPClient(self.cfg)
+        return self._client
+
+    # ---- 本地 ----
+    def has_local(self, tool: str) -> bool:
+        spec = get_tool_spec(tool)
+        return spec is not None and spec.handler is not None
+
+    def call_local(self, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        spec = get_tool_spec(tool)
+        if spec is None or spec.handler is None:
+            return {"text": f"<unknown tool: {tool}>"}
+        handler = spec.handler
+
+        def _run() -> Dict[str, Any]:
+            try:
+                return handler(args, self.base_dir)
+            except Exception as e:
+                return {"text": f"Error: {e}"}
+
+        res, state = cached_call(tool, args, _run, base_dir=self.base_dir)
+        return {**res, "cache": state} if state != "bypass" else res
+
+    async def call_local_async(self, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        spec = get_tool_spec(tool)
+        if spec is not None and spec.cost == "heavy":
+            # 整文件解析/聚合不阻塞事件循环
+            return await asyncio.to_thread(self.call_local, tool, args)
+        return self.call_local(tool, args)
+
+    # ---- 路由 ----
+    def _configured(self, server: str) -> bool:
+        try:
+            return server in self.client.servers
+        except Exception:
+            return False
+
+    def route(self, server: str, tool: str) -> str:
+        if self.require_remote:
+            return "remote"
+        if self.has_local(tool) and (self.local_first or not self._configured(server) or server_down(server)):
+            return "local"
+        if not self._configured(server) or server_down(server):
+            return "local"
+        return "remote"
+
+    def note_remote_error(self, server: str, err_type: str) -> None:
+        if err_type not in _APP_ERRORS:
+            mark_down(server, self.down_backoff_sec)
+
+    async def call_async(self, server: str, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        args = args if isinstance(args, dict) else {}
+        t0 = time.time()
+        rec: Dict[str, Any] = {"server": server, "tool": tool, "args": args}
+        if self.route(server, tool) == "local":
+            rec.update(result=await self.call_local_async(tool, args), route="local")
+        else:
+            if self.require_remote and server_down(server):
+                from packages.providers.mcp_pool import MCPServerUnavailable
+
+                raise MCPServerUnavailable(f"MCP server {server} 暂不可用（最近连接失败）")
+            try:
+                rec.update(result=await self.client.call_tool_async(server, tool, args), route="remote")
+                mark_up(server)
+            except Exception as e:
+                self.note_remote_error(server, type(e).__name__)
+                if self.require_remote:
+                    raise
+                rec.update(result=await self.call_local_async(tool, args), route="fallback")
+        rec["latency_ms"] = int((time.time() - t0) * 1000)
+        return rec
+
+    async def call_many_async(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """并发执行一批调用；本地部分进程内执行，远程部分经 MCPClient.call_tools_async（每 server 限流 + 单次超时）。"""
+        norm = [{"server": str(c.get("server") or ""), "tool": str(c.get("tool") or ""), "args": c.get("args") if isinstance(c.get("args"), dict) else {}} for c in calls]
+        out: List[Optional[Dict[str, Any]]] = [None] * len(norm)
+        remote_idx: List[int] = []
+        local_idx: List[int] = []
+        for i, c in enumerate(norm):
+            server, tool = str(c["server"]), str(c["tool"])
+            if self.route(server, tool) == "local":
+                local_idx.append(i)
+            elif self.require_remote and server_down(server):
+                out[i] = {**c, "error": f"MCP server {server} 暂不可用（最近连接失败）", "route": "remote"}
+            else:
+                remote_idx.append(i)
+
+        async def _local(i: int, route: str) -> None:
+            t0 = time.time()
+            c = norm[i]
+            tool, args = str(c["tool"]), c["args"] if isinstance(c["args"], dict) else {}
+            out[i] = {**c, "result": await self.call_local_async(tool, args), "route": route, "latency_ms": int((time.time() - t0) * 1000)}
+
+        async def _remote() -> None:
+            if not remote_idx:
+                return
+            execs = await self.client.call_tools_async([norm[i] for i in remote_idx])
+            fallbacks = []
+            for i, ex in zip(remote_idx, execs):
+                if "error" in ex:
+                    self.note_remote_error(ex["server"], str(ex.get("error_type") or ""))
+                    if self.require_remote:
+                        out[i] = {**norm[i], "error": ex["error"], "route": "remote", "latency_ms": ex.get("latency_ms")}
+                    else:
+                        fallbacks.append(_local(i, "fallback"))
+                else:
+                    mark_up(ex["server"])
+                    out[i] = {**norm[i], "result": ex["result"], "route": "remote", "latency_ms": ex.get("latency_ms")}
+            if fallbacks:
+                await asyncio.gather(*fallbacks)
+
+        await asyncio.gather(_remote(), *(_local(i, "local") for i in local_idx))
+        return [r for r in out if r is not None]
+
+    def available_tools(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": s.name, "description": s.description, "schema": s.schema, "cost": s.cost, "idempotent": s.idempotent}
+            for s in sorted(list_tools(), key=lambda s: s.name)
+            if s.handler is not None
+        ]
@@ -4,24 +4,33 @@ SPEC:
   模块: skills.csv_clean
   目标: 清洗 CSV 行（去空标题/视图值，去除首尾空白）
   输入: rows: list[dict], drop_empty: bool
-  输出: cleaned rows: list[dict]
+  输出: cleaned rows: list[dict]；iter_clean 为惰性版本（逐行产出，不持有整表）
+  列式: 输入为列式数据集（具备 map_str/nonempty_indices，见 packages.data.dataset）时按字典项清洗、按掩码取行，结果仍为数据集
   约束: 纯函数; 无 IO
   测试: 当 drop_empty=True 时应移除空标题/空视图的行
 """
 
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List
 
 
 def _norm(v: str) -> str:
     return (v or "").strip()
 
 
-def csv_clean(rows: List[Dict[str, str]], drop_empty: bool = True) -> List[Dict[str, str]]:
-    out: List[Dict[str, str]] = []
+def iter_clean(rows: Iterable[Dict[str, str]], drop_empty: bool = True) -> Iterator[Dict[str, str]]:
     for r in rows:
         r2 = {k: _norm(v) for k, v in r.items()}
         # 若开启丢弃空值，则过滤掉标题或浏览量为空的记录
         if drop_empty and (not r2.get("title") or not r2.get("views")):
             continue
-        out.append(r2)
-    return out
+        yield r2
+
+
+def csv_clean(rows: List[Dict[str, str]], drop_empty: bool = True) -> List[Dict[str, str]]:
+    if hasattr(rows, "map_str") and hasattr(rows, "nonempty_indices"):
+        ds = rows.map_str(_norm)  # type: ignore[attr-defined]
+        if not drop_empty:
+            return ds
+        keep = ds.nonempty_indices(("title", "views"))
+        return ds if len(keep) == len(ds) else ds.take(keep)
+    return list(iter_clean(rows, drop_empty=drop_empty))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import json
+import os
+
+import pytest
+
+from packages.config.loader import load_config
+from packages.config.service import ConfigService, FrozenDict
+
+
+def _write(path, obj, bump=0):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+    if bump:
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + bump))
+
+
+def test_snapshot_is_frozen_and_merged(tmp_path):
+    p = tmp_path / "config.json"
+    _write(p, {"llm": {"model": "m"}})
+    svc = ConfigService(str(p), check_interval=0)
+    snap = svc.snapshot()
+    assert isinstance(snap, FrozenDict)
+    assert snap["llm"]["model"] == "m" and snap["llm"]["provider"] == "openrouter"
+    with pytest.raises(TypeError):
+        snap["llm"]["model"] = "x"
+    with pytest.raises(TypeError):
+        snap.setdefault("k", 1)
+    mutable = copy.deepcopy(snap)
+    mutable["llm"]["model"] = "x"
+    assert type(mutable) is dict and svc.snapshot()["llm"]["model"] == "m"
+    assert json.loads(json.dumps(snap))["llm"]["model"] == "m"
+
+
+def test_reload_swaps_and_notifies_only_changed_sections(tmp_path):
+    p = tmp_path / "config.json"
+    _write(p, {"llm": {"model": "a"}, "mcp": {"servers": []}})
+    svc = ConfigService(str(p), defaults=None, check_interval=0)
+    first = svc.snapshot()
+    seen = []
+    svc.subscribe("llm", lambda new, old: seen.append(("llm", old["model"], new["model"])))
+    svc.subscribe("mcp", lambda new, old: seen.append(("mcp",)))
+    assert svc.snapshot() is first  # 未变化时不重建
+
+    _write(p, {"llm": {"model": "b"}, "mcp": {"servers": []}}, bump=10**9)
+    assert svc.snapshot()["llm"]["model"] == "b"
+    assert seen == [("llm", "a", "b")]
+
+    # 损坏文件保留旧快照
+    with open(p, "w", encoding="utf-8") as f:
+        f.write("{bad")
+    assert svc.snapshot()["llm"]["model"] == "b"
+
+
+def test_load_config_returns_mutable_copy(tmp_path):
+    p = tmp_path / "config.json"
+    _write(p, {"llm": {"provider": "openai"}})
+    cfg = load_config(str(p))
+    cfg.setdefault("llm", {})["provider"] = "mock"
+    assert load_config(str(p))["llm"]["provider"] == "openai"
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import csv
+import random
+
+from packages.agents.skills_pipeline import plan_step_args, plan_workers, run_csv_pipeline, run_skills_pipeline, iter_csv_rows
+from packages.data.csv_chunks import read_chunk_rows, split_csv
+from skills.stats_aggregate import stats_aggregate, stats_merge, stats_partial
+
+
+def _write_csv(path, n, seed=0):
+    rnd = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["title", "views", "note"])
+        for i in range(n):
+            title = rnd.choice([f"T{i}", f"多行\n标题 {i}", f'含"引号", {i}', "", "dup"])
+            views = rnd.choice([str(rnd.randint(0, 50)), f"{rnd.randint(0, 5000):,}", "x", ""])
+            w.writerow([title, views, rnd.choice(["", "a\r\nb", "c,d"])])
+
+
+def test_split_ranges_cover_records(tmp_path):
+    p = str(tmp_path / "d.csv")
+    _write_csv(p, 2000)
+    expected = list(iter_csv_rows(p))
+    for n in (1, 2, 3, 7, 50):
+        header, ranges = split_csv(p, n, min_chunk_bytes=64)
+        assert header == ["title", "views", "note"]
+        assert len(ranges) <= n
+        assert all(a < b for a, b in ranges)
+        assert all(ranges[k][1] == ranges[k + 1][0] for k in range(len(ranges) - 1))
+        got = [r for a, b in ranges for r in read_chunk_rows(p, a, b, header)]
+        assert got == expected
+
+
+def test_min_chunk_bytes_limits_split(tmp_path):
+    p = str(tmp_path / "d.csv")
+    _write_csv(p, 50)
+    _, ranges = split_csv(p, 8, min_chunk_bytes=1 << 30)
+    assert len(ranges) == 1
+
+
+def test_partial_merge_matches_single_pass():
+    rnd = random.Random(3)
+    rows = [{"title": rnd.choice(["", f"t{i}"]), "views": str(rnd.randint(0, 9))} for i in range(500)]
+    for top_n in (0, 1, 5, 600):
+        parts = [stats_partial(rows[a : a + 70], top_n=top_n) for a in range(0, 500, 70)]
+        assert stats_merge(parts, top_n=top_n) == stats_aggregate(rows, top_n=top_n)
+
+
+def test_parallel_pipeline_matches_sequential(tmp_path):
+    p = str(tmp_path / "d.csv")
+    _write_csv(p, 3000, seed=1)
+    plan = {"steps": [
+        {"id": "s1", "op": "csv.clean", "args": {"drop_empty": True}},
+        {"id": "s2", "op": "stats.aggregate", "args": {"top_n": 15, "score_by": "views", "title_field": "title", "workers": 3}},
+        {"id": "s3", "op": "md.render", "args": {"include_table": True}},
+    ]}
+    assert plan_workers(plan) == 3
+    assert "workers" not in plan_step_args(plan)[1]
+    seq = run_skills_pipeline(iter_csv_rows(p), plan)
+    par = run_csv_pipeline(p, plan, workers=3, min_chunk_bytes=1024)
+    assert par == seq
+
+
+def test_small_file_with_workers_is_parsed_once(tmp_path, monkeypatch):
+    from packages.agents import skills_pipeline as sp
+    from packages.data.dataset_cache import dataset_cache
+
+    monkeypatch.setattr(dataset_cache(), "cache_dir", str(tmp_path / "dataset-cache"))
+    p = str(tmp_path / "d.csv")
+    _write_csv(p, 200, seed=2)
+    plan = {"steps": [{"id": "s2", "op": "stats.aggregate", "args": {"top_n": 5}}]}
+    expect = run_csv_pipeline(p, plan, workers=1)
+    calls = []
+    real = sp._map_chunk
+    monkeypatch.setattr(sp, "_map_chunk", lambda *a: calls.append(a) or real(*a))
+    # 文件小于分块阈值：不分块，也不先串行算一遍再丢弃
+    assert run_csv_pipeline(p, plan, workers=4) == expect
+    assert calls == []
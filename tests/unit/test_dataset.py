@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import csv
+
+from packages.data.dataset import Dataset, infer_kind, load_csv
+from skills.csv_clean import csv_clean
+from skills.stats_aggregate import stats_aggregate
+
+
+def _write(tmp_path, text):
+    p = tmp_path / "d.csv"
+    p.write_text(text, encoding="utf-8")
+    return str(p)
+
+
+def test_inferred_types_and_exact_round_trip(tmp_path):
+    p = _write(tmp_path, (
+        "title,views,ratio,day,code,note\n"
+        " A ,10,0.5,2024-01-02,007,x\n"
+        "B,,1.25,2024-02-30,12,\n"
+        "\n"
+        "C,-3,2.0,,5\n"
+    ))
+    ds = load_csv(p)
+    kinds = {c.name: c.kind for c in ds.columns}
+    # 前导零 / 非法日期 无法无损还原 → 字符串列
+    assert kinds == {"title": "str", "views": "int", "ratio": "float", "day": "str", "code": "str", "note": "str"}
+    with open(p, newline="", encoding="utf-8") as f:
+        expect = [{k: (v or "") for k, v in r.items()} for r in csv.DictReader(f)]
+    assert list(ds) == expect and ds == expect and len(ds) == 3
+    assert ds[1]["views"] == "" and ds.column("views").is_null(1) and ds[-1]["title"] == "C"
+    assert ds[0:2] == expect[0:2]
+    assert infer_kind(["2024-01-02", ""]) == "date" and infer_kind(["1e3"]) == "str"
+
+
+def test_dictionary_encoding_is_compact(tmp_path):
+    rows = [{"title": f"T{i % 5}", "views": str(i)} for i in range(10000)]
+    ds = Dataset.from_rows(rows)
+    title = ds.column("title")
+    assert title.kind == "str" and len(title.dictionary) == 5 and title.data.itemsize == 4
+    assert ds.nbytes < 10000 * 16
+    assert ds == rows
+
+
+def test_skills_accept_dataset_with_identical_results(tmp_path):
+    lines = ["title,views"] + [f"{t},{v}" for t, v in [(" a ", 5), ("", 9), ("b", ""), ("c", 5), ("d", 12), ("e", 3)]]
+    p = _write(tmp_path, "\n".join(lines) + "\n")
+    ds = load_csv(p)
+    with open(p, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    cleaned_ds = csv_clean(ds)
+    assert isinstance(cleaned_ds, Dataset) and cleaned_ds == csv_clean(rows)
+    for top_n in (0, 2, 3, 10):
+        expect = stats_aggregate(csv_clean(rows), top_n=top_n, backend="python")
+        assert stats_aggregate(cleaned_ds, top_n=top_n) == expect
+        assert stats_aggregate(cleaned_ds, top_n=top_n, backend="python") == expect
+        assert stats_aggregate(ds, top_n=top_n) == stats_aggregate(rows, top_n=top_n, backend="python")
+
+
+def test_ragged_rows(tmp_path):
+    p = _write(tmp_path, "title,views,likes\nA,5\nB,7,1,extra,more\nC,,2\n")
+    ds = load_csv(p)
+    with open(p, newline="", encoding="utf-8") as f:
+        raw = list(csv.DictReader(f))
+    # DictReader：短行缺失字段为 None，长行多余字段收入键 None；列式：缺失为 ""，多余字段丢弃
+    assert raw[0]["likes"] is None and raw[1][None] == ["extra", "more"]
+    assert list(ds) == [
+        {"title": "A", "views": "5", "likes": ""},
+        {"title": "B", "views": "7", "likes": "1"},
+        {"title": "C", "views": "", "likes": "2"},
+    ]
+    # 短行：清洗 / 聚合结果与行字典路径一致
+    short = [raw[0], raw[2]]
+    assert csv_clean(ds.take([0, 2]), drop_empty=False) == csv_clean(short, drop_empty=False)
+    assert stats_aggregate(ds.take([0, 2]), top_n=2) == stats_aggregate(short, top_n=2)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+import shutil
+
+import pytest
+
+from packages.data.dataset import load_csv
+from packages.data.dataset_cache import DatasetCache, configure_dataset_cache, dataset_cache, dump_dataset, map_dataset
+from skills.stats_aggregate import stats_aggregate
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["title", "views", "ratio", "day", "note"])
+        w.writerows(rows)
+
+
+def _sample(n=200):
+    return [[f"T{i % 37}", str(i * 3) if i % 11 else "", repr(i / 8), f"2024-01-{1 + i % 28:02d}", "多行\n备注" if i % 5 == 0 else ""] for i in range(n)]
+
+
+def test_roundtrip_is_zero_copy_and_identical(tmp_path):
+    p = str(tmp_path / "d.csv")
+    _write_csv(p, _sample())
+    ds = load_csv(p)
+    blob = str(tmp_path / "d.dsc")
+    assert dump_dataset(ds, blob) == os.path.getsize(blob)
+    mapped = map_dataset(blob)
+    assert isinstance(mapped.column("views").data, memoryview)
+    assert [c.kind for c in mapped.columns] == [c.kind for c in ds.columns]
+    assert list(mapped) == list(ds)
+    assert mapped.take([3, 1]) == ds.take([3, 1])
+    assert stats_aggregate(mapped, top_n=5) == stats_aggregate(ds, top_n=5)
+
+
+def test_numpy_view_of_mapped_column(tmp_path):
+    np = pytest.importorskip("numpy")
+    p = str(tmp_path / "d.csv")
+    _write_csv(p, _sample(50))
+    dump_dataset(load_csv(p), str(tmp_path / "d.dsc"))
+    col = map_dataset(str(tmp_path / "d.dsc")).column("ratio")
+    assert np.array_equal(col.numpy(), np.array([i / 8 for i in range(50)]))
+
+
+def test_cache_hit_touch_copy_and_change(tmp_path):
+    p = str(tmp_path / "d.csv")
+    _write_csv(p, _sample())
+    cache = DatasetCache(str(tmp_path / "cache"))
+    first = cache.load(p)
+    assert cache.counters["miss"] == 1 and cache.counters["write"] == 1
+    assert cache.load(p) == first and cache.counters["hit"] == 1
+    # 仅 mtime 变化 / 同内容拷贝：按 sha256 命中，不再解析
+    os.utime(p, ns=(1, 1))
+    q = str(tmp_path / "copy.csv")
+    shutil.copyfile(p, q)
+    assert cache.load(p) == first and cache.load(q) == first
+    assert cache.counters["hash_hit"] == 2 and cache.counters["miss"] == 1
+    # 内容变化：重新解析
+    _write_csv(p, _sample(10))
+    assert len(cache.load(p)) == 10 and cache.counters["miss"] == 2
+    assert cache.stats()["files"] == 2
+
+
+def test_lru_eviction_and_limits(tmp_path):
+    cache = DatasetCache(str(tmp_path / "cache"))
+    paths = []
+    for k in range(3):
+        p = str(tmp_path / f"d{k}.csv")
+        _write_csv(p, _sample(100 + k))
+        paths.append(p)
+    cache.load(paths[0])
+    one = cache.stats()["bytes"]
+    cache.max_bytes = int(one * 2.5)
+    cache.load(paths[1])
+    for f in os.listdir(cache.cache_dir):
+        os.utime(os.path.join(cache.cache_dir, f), (0, 0))
+    cache.load(paths[0])  # 命中，刷新 d0 的使用时间
+    cache.load(paths[2])
+    assert cache.counters["evicted"] == 1
+    assert cache.lookup(paths[0]) is not None and cache.lookup(paths[1]) is None
+    cache.max_file_bytes = 10
+    assert not cache.cacheable(paths[0])
+    assert cache.lookup(paths[0]) is None
+
+
+def test_corrupt_blob_is_a_miss(tmp_path):
+    p = str(tmp_path / "d.csv")
+    _write_csv(p, _sample(20))
+    cache = DatasetCache(str(tmp_path / "cache"))
+    cache.load(p)
+    blob = [f for f in os.listdir(cache.cache_dir) if f.endswith(".dsc")][0]
+    with open(os.path.join(cache.cache_dir, blob), "wb") as f:
+        f.write(b"garbage" * 10)
+    assert list(cache.load(p)) == list(load_csv(p))
+    assert cache.counters["error"] == 1 and cache.counters["miss"] == 2
+
+
+def test_configure_from_tools_section(tmp_path):
+    cache = dataset_cache()
+    saved = (cache.enabled, cache.cache_dir, cache.max_bytes, cache.max_file_bytes)
+    try:
+        configure_dataset_cache({"tools": {"dataset_cache": {"enabled": False, "dir": str(tmp_path), "max_mb": 1, "max_file_mb": 0.5}}})
+        assert (cache.enabled, cache.cache_dir, cache.max_bytes, cache.max_file_bytes) == (False, str(tmp_path), 1 << 20, 1 << 19)
+    finally:
+        cache.enabled, cache.cache_dir, cache.max_bytes, cache.max_file_bytes = saved
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from packages.data.dataset_cache import dataset_cache
+from packages.tools.datasets import DatasetRegistry, datasets, is_handle, register_transform
+from packages.tools.result_cache import result_cache
+
+
+@pytest.fixture(autouse=True)
+def _isolated_dataset_cache(tmp_path, monkeypatch):
+    # 解析缓存写到 tmp_path，不落到仓库 .cache（环境变量供进程池子进程使用）
+    cache_dir = str(tmp_path / "dataset-cache")
+    monkeypatch.setenv("DATASET_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(dataset_cache(), "cache_dir", cache_dir)
+
+
+def _csv(tmp_path, name="w.csv", n=3):
+    p = tmp_path / name
+    lines = ["title,views"] + [f" T{i} ,{i * 10}" for i in range(n)] + [",5"]
+    p.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return p
+
+
+def test_csv_handle_reused_until_file_changes(tmp_path):
+    reg = DatasetRegistry()
+    p = _csv(tmp_path)
+    h1 = reg.from_csv("w.csv", str(tmp_path))
+    h2 = reg.from_csv("w.csv", str(tmp_path))
+    assert is_handle(h1) and h1 == h2
+    assert reg.get(h1) is reg.get(h2)  # 按引用传递，不复制
+    assert reg.stats()["load"] == 1 and reg.stats()["hit"] == 1
+
+    p.write_text("title,views\nX,1\n", encoding="utf-8")
+    h3 = reg.from_csv("w.csv", str(tmp_path))
+    assert h3 != h1 and reg.get(h3) == [{"title": "X", "views": "1"}]
+
+
+def test_derive_and_rebuild_after_eviction(tmp_path):
+    register_transform("test.upper", lambda rows, field="title": [{**r, field: r[field].upper()} for r in rows])
+    reg = DatasetRegistry(max_bytes=1)
+    _csv(tmp_path)
+    src = reg.from_csv("w.csv", str(tmp_path))
+    d = reg.derive(src, "test.upper", field="title")
+    assert d == reg.derive(src, "test.upper", field="title")
+    # 预算极小：未被引用的数据集立即被淘汰，但按配方可重建
+    assert reg.stats()["datasets"] <= 1 and reg.stats()["evicted"] >= 1
+    rows = reg.get(d)
+    assert rows[0]["title"] == " T0 " and reg.stats()["rebuild"] >= 1
+    with pytest.raises(KeyError):
+        reg.get("ds://unknown")
+
+
+def test_pinned_datasets_are_not_evicted(tmp_path):
+    reg = DatasetRegistry(max_bytes=1)
+    _csv(tmp_path, "a.csv")
+    _csv(tmp_path, "b.csv")
+    a = reg.from_csv("a.csv", str(tmp_path))
+    with reg.use(a) as rows:
+        reg.from_csv("b.csv", str(tmp_path))
+        assert reg.stats()["pinned"] == 1
+        assert reg.get(a) is rows
+    assert reg.stats()["pinned"] == 0 and reg.stats()["datasets"] == 0
+    # 源文件变化后，被淘汰的旧句柄不再可重建
+    (tmp_path / "a.csv").write_text("title,views\nZ,9\n", encoding="utf-8")
+    with pytest.raises(KeyError):
+        reg.get(a)
+
+
+def test_tool_chain_passes_handles(tmp_path):
+    from packages.tools.runtime import ToolRuntime
+
+    result_cache().clear()
+    _csv(tmp_path, n=12)
+    rt = ToolRuntime({}, base_dir=str(tmp_path))
+    loaded = rt.call_local("data.load_csv", {"path": "w.csv"})["structured"]
+    assert loaded["rows"] == 13 and loaded["columns"] == ["title", "views"]
+
+    cleaned = rt.call_local("skills.csv_clean", {"dataset": loaded["dataset"]})["structured"]
+    assert cleaned["cleaned_count"] == 12 and is_handle(cleaned["dataset"])
+    assert rt.call_local("skills.csv_clean", {"path": "w.csv"})["structured"]["dataset"] == cleaned["dataset"]
+
+    agg = rt.call_local("stats.aggregate", {"dataset": cleaned["dataset"], "top_n": 3})["structured"]
+    assert agg["summary"]["count"] == 12 and [t["title"] for t in agg["top"]] == ["T11", "T10", "T9"]
+    # 句柄也可放在 rows / path 位置
+    assert rt.call_local("stats.aggregate", {"rows": cleaned["dataset"], "top_n": 3})["structured"] == agg
+    assert rt.call_local("stats.aggregate", {"path": cleaned["dataset"], "top_n": 3})["structured"] == agg
+    md = rt.call_local("report.md_render", {"summary": agg["summary"], "top": agg["top"]})["text"]
+    assert "T11" in md
+    assert datasets().stats()["pinned"] == 0
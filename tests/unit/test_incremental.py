@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import random
+
+from packages.agents.skills_pipeline import iter_csv_rows, run_incremental_csv, run_skills_pipeline
+from packages.data.csv_chunks import last_record_end, read_header
+from packages.data.incremental import IncrementalStore
+from skills.stats_aggregate import stats_combine, stats_merge, stats_partial
+
+PLAN = {"steps": [
+    {"id": "s1", "op": "csv.clean", "args": {"drop_empty": True}},
+    {"id": "s2", "op": "stats.aggregate", "args": {"top_n": 7, "score_by": "views", "title_field": "title"}},
+    {"id": "s3", "op": "md.render", "args": {"include_table": True}},
+]}
+
+
+def _lines(start, n, seed):
+    rnd = random.Random(seed)
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    for i in range(start, start + n):
+        w.writerow([rnd.choice([f"T{i}", f"多行\n{i}", f'"q",{i}', ""]), rnd.choice([str(rnd.randint(0, 30)), "x", "1,200"])])
+    return buf.getvalue()
+
+
+def _append(path, text):
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _full(path):
+    return run_skills_pipeline(iter_csv_rows(path), PLAN)
+
+
+def test_appends_only_parse_tail(tmp_path):
+    p = str(tmp_path / "d.csv")
+    with open(p, "w", newline="", encoding="utf-8") as f:
+        f.write("title,views\r\n")
+    store = IncrementalStore(str(tmp_path / "state"), min_file_bytes=0)
+    assert run_incremental_csv(p, PLAN, store=store) == _full(p)
+    start = 0
+    for k in range(4):
+        _append(p, _lines(start, 300, k))
+        start += 300
+        before = store.counters["tail_bytes"]
+        added = len(_lines(start - 300, 300, k).encode("utf-8"))
+        assert run_incremental_csv(p, PLAN, store=store) == _full(p)
+        assert store.counters["tail_bytes"] - before == added
+    assert store.counters == {"incremental": 4, "full": 1, "reset": 0, "tail_bytes": store.counters["tail_bytes"]}
+
+
+def test_rewritten_prefix_falls_back_to_full(tmp_path):
+    p = str(tmp_path / "d.csv")
+    with open(p, "w", newline="", encoding="utf-8") as f:
+        f.write("title,views\n" + _lines(0, 200, 1))
+    store = IncrementalStore(str(tmp_path / "state"), min_file_bytes=0)
+    run_incremental_csv(p, PLAN, store=store)
+    with open(p, "w", newline="", encoding="utf-8") as f:
+        f.write("title,views\n" + _lines(0, 250, 2))
+    assert run_incremental_csv(p, PLAN, store=store) == _full(p)
+    assert store.counters["reset"] == 1
+    # 截断
+    with open(p, "w", newline="", encoding="utf-8") as f:
+        f.write("title,views\n" + _lines(0, 5, 2))
+    assert run_incremental_csv(p, PLAN, store=store) == _full(p)
+    assert store.counters["reset"] == 2
+
+
+def test_unterminated_last_record_is_not_committed(tmp_path):
+    p = str(tmp_path / "d.csv")
+    with open(p, "w", newline="", encoding="utf-8") as f:
+        f.write('title,views\na,5\n"b\nb",7\nc,1')
+    header, body = read_header(p)
+    assert header == ["title", "views"]
+    size = len(open(p, "rb").read())
+    assert last_record_end(p, body, size) == size - len("c,1")
+    store = IncrementalStore(str(tmp_path / "state"), min_file_bytes=0)
+    assert run_incremental_csv(p, PLAN, store=store) == _full(p)
+    # 写入方补全最后一条记录
+    _append(p, "00\nd,3\n")
+    assert run_incremental_csv(p, PLAN, store=store) == _full(p)
+    assert store.counters["reset"] == 0
+    assert _full(p)[1]["top"][0] == {"rank": 1, "title": "c", "score": 100.0}
+
+
+def test_combine_is_associative_with_merge():
+    rnd = random.Random(5)
+    rows = [{"title": f"t{i}", "views": str(rnd.randint(0, 5))} for i in range(90)]
+    parts = [stats_partial(rows[a : a + 20], top_n=6) for a in range(0, 90, 20)]
+    nested = [stats_combine(parts[:2], top_n=6), stats_combine(parts[2:], top_n=6)]
+    assert stats_merge(nested, top_n=6) == stats_merge(parts, top_n=6)
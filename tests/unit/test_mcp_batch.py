@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import time
+
+from packages.agents.mcp_agents import ExecutorMCPTool, MCPConversationAgent
+from packages.providers.mcp_client import MCPClient
+
+
+CFG = {
+    "llm": {"provider": "mock", "model": "mock-1"},
+    "mcp": {"servers": [{"id": "api", "transport": "stdio", "command": "x"}], "batch": {"per_server": 2, "timeout_sec": 0.5}},
+}
+
+
+class _SlowClient(MCPClient):
+    def __init__(self, cfg, delay=0.05):
+        super().__init__(cfg)
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def _acall_tool(self, server_id, tool, args):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            if tool == "hang":
+                await asyncio.sleep(10)
+            if tool == "boom":
+                raise ConnectionError("down")
+            await asyncio.sleep(self.delay)
+            return {"text": f"{tool}:{json.dumps(args, sort_keys=True)}", "structured": None}
+        finally:
+            self.active -= 1
+
+
+def test_call_tools_concurrent_ordered_with_limits():
+    c = _SlowClient(CFG)
+    calls = [{"server": "api", "tool": f"t{i}", "args": {"i": i}} for i in range(4)]
+    calls.append({"server": "api", "tool": "hang", "args": {}})
+    calls.append({"server": "api", "tool": "boom", "args": {}})
+    t0 = time.time()
+    out = asyncio.run(c.call_tools_async(calls))
+    elapsed = time.time() - t0
+    assert [o["tool"] for o in out] == ["t0", "t1", "t2", "t3", "hang", "boom"]
+    assert out[0]["result"]["text"] == 't0:{"i": 0}'
+    assert "timeout" in out[4]["error"] and out[5]["error"] == "down"
+    # 每 server 至多 2 个并发；挂起的调用按单次超时结束，不阻塞整批
+    assert c.peak == 2
+    assert elapsed < 2.0
+
+
+class _ScriptRouter:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.seen = []
+
+    def chat_with_meta(self, msgs, temperature=0.0, retries=0, **_):
+        self.seen.append(list(msgs))
+        return self.replies.pop(0), {"provider": "script"}
+
+
+def test_agent_executes_actions_batch_in_one_turn():
+    agent = MCPConversationAgent(CFG)
+    agent.mcp = _SlowClient(CFG)
+    batch = {"actions": [
+        {"type": "mcp_call", "tool": "ls", "args": {"path": "."}},
+        {"tool": "data.csv_head", "args": {"path": "a.csv", "n": 5}},
+        {"type": "mcp_call", "tool": "boom", "args": {}},
+    ]}
+    agent.router = _ScriptRouter([json.dumps(batch), "最终答案"])
+    out = asyncio.run(agent.respond_async("s1", [], "看看"))
+    assert out["reply"].endswith("最终答案")
+    # 两次 LLM 调用：一次给出批量动作，一次基于全部观察作答
+    assert len(agent.router.seen) == 2
+    obs = agent.router.seen[1][-1]["content"]
+    assert obs.count("[工具执行结果]") == 3
+    assert "api.fs.list_dir" in obs and "api.data.csv_head" in obs
+    # 远程失败的调用走本地回退
+    assert "<unknown tool: boom>" in obs
+    assert len(out["mcp"]["batch"]) == 3
+
+
+def test_executor_runs_multiple_mcp_steps_concurrently():
+    client = _SlowClient(CFG, delay=0.1)
+    plan = {"steps": [
+        {"op": "mcp.tool", "server": "api", "tool": "a", "args": {}},
+        {"op": "mcp.tool", "server": "api", "tool": "b", "args": {}},
+        {"op": "mcp.tool", "server": "api", "tool": "boom", "args": {}},
+    ]}
+    t0 = time.time()
+    text, ctx = ExecutorMCPTool(mcp_client=client).execute({}, plan, {})
+    assert time.time() - t0 < 0.25
+    assert text.index("## api.a") < text.index("## api.b") < text.index("<error: down>")
+    assert [m["tool"] for m in ctx["mcp"]] == ["a", "b", "boom"]
+
+    single, ctx1 = ExecutorMCPTool(mcp_client=client).execute({}, {"mcp": {"server": "api", "tool": "a", "args": {}}}, {})
+    assert single == "a:{}" and ctx1["mcp"]["tool"] == "a"
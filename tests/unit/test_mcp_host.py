@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+
+import pytest
+
+from apps.server.mcp_host import ToolHost
+from packages.data.dataset_cache import dataset_cache
+from packages.tools.registry import ToolSpec, register_tool
+
+
+@pytest.fixture(autouse=True)
+def _isolated_dataset_cache(tmp_path, monkeypatch):
+    # 解析缓存写到 tmp_path，不落到仓库 .cache（环境变量供进程池子进程使用）
+    cache_dir = str(tmp_path / "dataset-cache")
+    monkeypatch.setenv("DATASET_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(dataset_cache(), "cache_dir", cache_dir)
+
+
+def _slow(args, base_dir):
+    time.sleep(float(args.get("sec") or 0.3))
+    return {"text": threading.current_thread().name}
+
+
+register_tool(ToolSpec("test.slow_heavy", idempotent=False, cost="heavy", handler=_slow))
+
+
+def test_heavy_call_does_not_block_light_tools_or_loop():
+    host = ToolHost(heavy_workers=2, io_threads=2)
+
+    async def main():
+        t0 = time.perf_counter()
+        heavy = asyncio.ensure_future(host.call("test.slow_heavy", {"sec": 0.4}))
+        await asyncio.sleep(0.05)
+        light = await host.call("data.csv_head", {"path": "examples/data/weekly.csv", "n": 2})
+        light_ms = (time.perf_counter() - t0) * 1000
+        return await heavy, light, light_ms
+
+    try:
+        heavy, light, light_ms = asyncio.run(main())
+    finally:
+        host.shutdown()
+    assert heavy["text"].startswith("mcp-heavy")
+    assert light["text"].count("\n") == 2 and light_ms < 300
+
+
+def test_metrics_track_concurrency_latency_and_errors():
+    host = ToolHost(heavy_workers=3)
+
+    async def main():
+        await asyncio.gather(*(host.call("test.slow_heavy", {"sec": 0.1}) for _ in range(3)))
+        await host.call("fs.read_text", {"path": "nope.txt"})
+        await host.call("stats.aggregate", {"path": "nope.csv"})
+
+    try:
+        asyncio.run(main())
+    finally:
+        host.shutdown()
+    m = host.metrics()["tools"]
+    slow = m["test.slow_heavy"]
+    assert slow["calls"] == 3 and slow["peak_concurrency"] == 3 and slow["in_flight"] == 0
+    assert 80 <= slow["p50_ms"] <= slow["max_ms"]
+    assert m["stats.aggregate"]["errors"] == 1 and m["fs.read_text"]["errors"] == 0
+
+
+def test_process_pool_for_heavy_tools():
+    host = ToolHost(heavy_pool="process", heavy_workers=1)
+
+    async def main():
+        return await host.call("stats.aggregate", {"path": "examples/data/weekly.csv", "top_n": 2})
+
+    try:
+        res = asyncio.run(main())
+    finally:
+        host.shutdown()
+    assert len(res["structured"]["top"]) == 2
+    assert host.metrics()["heavy_pool"] == "process"
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from packages.providers.mcp_client import MCPClient
+from packages.providers.mcp_meta import MetaCache, meta_cache, notification_handler
+
+
+class _Loader:
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.fail:
+            raise ConnectionError("down")
+        return [f"v{self.calls}"]
+
+
+def test_meta_cache_ttl_stale_while_revalidate():
+    cache = MetaCache()
+    load = _Loader()
+    key = ("s", None, "tools", None)
+
+    async def main():
+        a = await cache.get(key, load, ttl=0.05, stale_sec=10)
+        b = await cache.get(key, load, ttl=0.05, stale_sec=10)
+        await asyncio.sleep(0.06)
+        # 过期：立即返回旧值并在后台刷新
+        c = await cache.get(key, load, ttl=0.05, stale_sec=10)
+        await asyncio.sleep(0.01)
+        d = await cache.get(key, load, ttl=0.05, stale_sec=10)
+        return a, b, c, d
+
+    a, b, c, d = asyncio.run(main())
+    assert a == b == c == ["v1"] and d == ["v2"]
+    assert load.calls == 2
+    st = cache.stats()
+    assert st["hit"] == 2 and st["stale"] == 1 and st["refresh"] == 1
+
+
+def test_meta_cache_negative_ttl_and_invalidation():
+    cache = MetaCache()
+    bad = _Loader(fail=True)
+    key = ("s", None, "prompt", ("chat.system", "{}"))
+
+    async def main():
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                await cache.get(key, bad, negative_ttl=60)
+        assert bad.calls == 1
+        assert cache.invalidate("s") == 1
+        good = _Loader()
+        return await cache.get(key, good)
+
+    assert asyncio.run(main()) == ["v1"]
+
+
+def test_meta_cache_drops_load_racing_with_invalidation():
+    cache = MetaCache()
+    key = ("s", None, "tools", None)
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return ["old"]
+
+    async def main():
+        t = asyncio.ensure_future(cache.get(key, slow))
+        await asyncio.sleep(0.005)
+        cache.on_notification("s", "notifications/tools/list_changed")
+        assert await t == ["old"]
+        # 加载期间收到 list_changed：结果不写回缓存
+        return cache.stats()["entries"]
+
+    assert asyncio.run(main()) == 0
+
+
+class _CountingClient(MCPClient):
+    fetches = 0
+
+    async def _fetch_tools(self, server_id):
+        type(self).fetches += 1
+        return [{"name": "fs.read_text", "description": None}]
+
+
+def test_clients_share_process_level_cache():
+    cfg = {"mcp": {"servers": [{"id": "meta-demo", "transport": "stdio", "command": "x"}]}}
+    meta_cache().invalidate("meta-demo")
+
+    async def main():
+        out = []
+        for _ in range(3):
+            # 每个请求新建客户端（与 api_chat_send 一致）
+            out.append(await _CountingClient(cfg).list_tools_async("meta-demo"))
+        out[0][0]["name"] = "mutated"
+        out.append(await _CountingClient(cfg).list_tools_async("meta-demo"))
+        await notification_handler("meta-demo")(type("N", (), {"method": "notifications/tools/list_changed"})())
+        out.append(await _CountingClient(cfg).list_tools_async("meta-demo"))
+        return out
+
+    out = asyncio.run(main())
+    assert _CountingClient.fetches == 2
+    assert out[3][0]["name"] == "fs.read_text"
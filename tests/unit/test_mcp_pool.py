@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+
+import pytest
+
+from packages.providers.mcp_client import MCPClient, MCPServerConfig
+from packages.providers.mcp_pool import MCPServerUnavailable, MCPSessionPool
+
+
+class _FakeSession:
+    def __init__(self, n):
+        self.n = n
+        self.broken = False
+
+    async def call(self, x):
+        if self.broken:
+            raise ConnectionError("pipe closed")
+        await asyncio.sleep(0)
+        return (self.n, x)
+
+
+class _Opener:
+    def __init__(self, fail=0):
+        self.opens = 0
+        self.closes = 0
+        self.fail = fail
+
+    @contextlib.asynccontextmanager
+    async def __call__(self, sc):
+        if self.fail > 0:
+            self.fail -= 1
+            raise OSError("connect refused")
+        self.opens += 1
+        try:
+            yield _FakeSession(self.opens)
+        finally:
+            self.closes += 1
+
+
+SC = MCPServerConfig(id="demo", transport="stdio", command="demo")
+
+
+def test_pool_reuses_session_across_calls():
+    opener = _Opener()
+
+    async def main():
+        pool = MCPSessionPool(opener=opener, max_concurrency=2)
+        outs = []
+        for i in range(5):
+            async with pool.session(SC) as s:
+                outs.append(await s.call(i))
+        # 并发租用也共享同一连接
+        async def one(i):
+            async with pool.session(SC) as s:
+                return await s.call(i)
+        outs += await asyncio.gather(*(one(i) for i in range(6)))
+        stats = pool.stats()["demo"]
+        await pool.aclose()
+        return outs, stats
+
+    outs, stats = asyncio.run(main())
+    assert opener.opens == 1 and opener.closes == 1
+    assert all(n == 1 for n, _ in outs)
+    assert stats["calls"] == 11 and stats["connects"] == 1
+
+
+def test_pool_reconnects_after_transport_error():
+    opener = _Opener()
+
+    async def main():
+        pool = MCPSessionPool(opener=opener)
+        async with pool.session(SC) as s:
+            s.broken = True
+        with pytest.raises(ConnectionError):
+            async with pool.session(SC) as s:
+                await s.call(1)
+        async with pool.session(SC) as s:
+            out = await s.call(2)
+        await pool.aclose()
+        return out
+
+    assert asyncio.run(main()) == (2, 2)
+    assert opener.opens == 2 and opener.closes == 2
+
+
+def test_pool_backoff_then_recover():
+    opener = _Opener(fail=1)
+
+    async def main():
+        pool = MCPSessionPool(opener=opener, backoff_base_sec=0.05)
+        with pytest.raises(MCPServerUnavailable):
+            async with pool.session(SC):
+                pass
+        assert not pool.available(SC)
+        # 退避期内立即失败，不再尝试连接
+        with pytest.raises(MCPServerUnavailable):
+            async with pool.session(SC):
+                pass
+        await asyncio.sleep(0.06)
+        assert pool.available(SC)
+        async with pool.session(SC) as s:
+            out = await s.call("ok")
+        await pool.aclose()
+        return out
+
+    assert asyncio.run(main()) == (1, "ok")
+
+
+def test_pool_evicts_idle_sessions():
+    opener = _Opener()
+
+    async def main():
+        pool = MCPSessionPool(opener=opener, idle_timeout_sec=0.01)
+        async with pool.session(SC) as s:
+            await s.call(0)
+        await asyncio.sleep(0.02)
+        n = await pool.evict_idle()
+        closed_after_evict = opener.closes
+        async with pool.session(SC) as s:
+            await s.call(1)
+        await pool.aclose()
+        return n, closed_after_evict
+
+    n, closed = asyncio.run(main())
+    assert n == 1 and closed == 1
+    assert opener.opens == 2 and opener.closes == 2
+
+
+def test_client_disables_pool_via_config():
+    c = MCPClient({"mcp": {"pool": {"enabled": False}, "servers": [{"id": "demo", "transport": "stdio", "command": "x"}]}})
+    assert c.pool_cfg == {"enabled": False}
+    # 未启用池时返回一次性会话上下文（不触发连接）
+    assert hasattr(c._session(c.servers["demo"]), "__aenter__")
+
+
+def test_sync_calls_share_background_loop_and_pool(monkeypatch):
+    import packages.providers.mcp_pool as mp
+
+    opener = _Opener()
+    monkeypatch.setattr(mp, "default_opener", opener)
+    from packages.providers import mcp_client as mc
+
+    mc.stop_background_loop()
+    c = MCPClient({"mcp": {"servers": [{"id": "demo", "transport": "stdio", "command": "x"}]}})
+
+    async def op(i):
+        async with c._session(c.servers["demo"]) as s:
+            return await s.call(i)
+
+    assert [c._run_sync(op(i))[0] for i in range(3)] == [1, 1, 1]
+
+    # 在运行中的事件循环内同步调用同样可用
+    async def inside():
+        return c._run_sync(op("x"))
+
+    assert asyncio.run(inside()) == (1, "x")
+    mc.stop_background_loop()
+    assert opener.opens == 1 and opener.closes == 1
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import urllib.request
+
+from packages.agents.llm_agents import CriticLLM, ExecutorLLM, PlannerLLM
+from packages.providers.interfaces import ProviderHTTPError
+from packages.providers.mock_client import MockLLMClient
+from packages.providers.router import LLMRouter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def _srs():
+    with open(os.path.join(ROOT, "examples", "srs", "weekly_report.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _ctx():
+    with open(os.path.join(ROOT, "examples", "data", "weekly.csv"), encoding="utf-8") as f:
+        excerpt = f.read()
+    return {"csv_excerpt": excerpt, "prompts_dir": os.path.join(ROOT, "packages", "prompts")}
+
+
+def test_llm_agents_run_against_mock_via_router():
+    router = LLMRouter({"llm": {"provider": "mock", "singleflight": False}})
+    srs, ctx = _srs(), _ctx()
+    plan = PlannerLLM(router).plan(srs, ctx)
+    assert [s["op"] for s in plan["steps"]] == ["csv.clean", "stats.aggregate", "md.render"]
+    md, info = ExecutorLLM(router).execute(srs, plan, ctx)
+    assert "# Weekly Report" in md and "## Top Items" in md
+    assert info["llm"]["provider"] == "mock"
+    review = CriticLLM(router).review(srs, md, ctx)
+    assert review["pass"] is True
+    # 相同输入得到相同输出
+    md2, _ = ExecutorLLM(router).execute(srs, plan, ctx)
+    assert md2 == md
+
+
+def test_injected_429_is_retried_and_streaming_matches():
+    msgs = [{"role": "system", "content": "你是评审器。"}, {"role": "user", "content": "REPORT:\n# Weekly Report\n## Top Items"}]
+    always = MockLLMClient(options={"rate_limit_rate": 1.0, "retry_after_sec": 0})
+    try:
+        always.chat_with_meta(msgs, retries=1)
+        assert False, "expected 429"
+    except ProviderHTTPError as e:
+        assert e.status_code == 429
+    plain, _ = MockLLMClient().chat_with_meta(msgs)
+    streamed, meta = MockLLMClient(options={"stream": True, "chunk_chars": 4}).chat_with_meta(msgs)
+    assert streamed == plain and "ttft_ms" in meta
+    assert meta["usage"]["total_tokens"] > 0
+
+
+def test_openai_compatible_server_roundtrip():
+    from apps.server.mock_llm import serve
+
+    httpd = serve("127.0.0.1", 0, {})
+    t = threading.Thread(target=httpd.serve_forever, daemon=True)
+    t.start()
+    try:
+        port = httpd.server_address[1]
+        body = json.dumps({"model": "m", "messages": [{"role": "user", "content": "hi"}]}).encode("utf-8")
+        req = urllib.request.Request(f"http://127.0.0.1:{port}/v1/chat/completions", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            data = json.loads(resp.read())
+        assert data["choices"][0]["message"]["content"].startswith("（mock）")
+        assert data["usage"]["total_tokens"] > 0
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import csv
+import time
+
+import pytest
+
+from packages.agents.plan_executor import PlanError, build_dag, execute_plan, register_op
+from packages.agents.skills_pipeline import iter_csv_rows, run_skills_pipeline
+from packages.agents.step_memo import step_memo
+from packages.data.dataset import load_csv
+from packages.data.dataset_cache import dataset_cache
+from skills.stats_aggregate import stats_aggregate
+
+LEGACY = {"steps": [
+    {"id": "s1", "op": "csv.clean", "args": {"drop_empty": True}},
+    {"id": "s2", "op": "stats.aggregate", "args": {"top_n": 3, "score_by": "views", "title_field": "title"}},
+    {"id": "s3", "op": "md.render", "args": {"include_table": True}},
+]}
+
+
+@pytest.fixture(autouse=True)
+def _isolated_caches(tmp_path, monkeypatch):
+    # 步骤记忆化与解析缓存写到 tmp_path：不落到仓库 .cache，各测试之间也不互相命中
+    monkeypatch.setattr(step_memo(), "cache_dir", str(tmp_path / "steps"))
+    monkeypatch.setattr(dataset_cache(), "cache_dir", str(tmp_path / "dataset-cache"))
+    monkeypatch.setenv("DATASET_CACHE_DIR", str(tmp_path / "dataset-cache"))
+
+
+def _csv(tmp_path, n=50):
+    p = str(tmp_path / "d.csv")
+    with open(p, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["title", "views", "likes"])
+        for i in range(n):
+            w.writerow([f" T{i} " if i % 9 else "", str((i * 7) % 23), str(i % 5)])
+    return p
+
+
+def _sleepy(args, *inputs):
+    time.sleep(args.get("sec", 0.2))
+    return {"summary": {"count": len(inputs), "total": 0.0, "avg": 0.0}, "top": []}
+
+
+register_op("test.sleep", _sleepy)
+
+
+def test_legacy_plan_matches_fused_pipeline(tmp_path):
+    p = _csv(tmp_path)
+    events = []
+    md, info = execute_plan(LEGACY, p, emit=lambda t, pay: events.append((t, pay)))
+    assert md == run_skills_pipeline(iter_csv_rows(p), LEGACY)[0]
+    assert [(t, pay["id"], pay.get("fused")) for t, pay in events] == [("exec.step", "s2", ["s1", "s2"]), ("exec.step", "s3", None)]
+    assert all(pay["status"] == "ok" and pay["ms"] >= 0 for _, pay in events)
+    # 缺省步骤按规范链补全；列式 / 行列表输入同样可用
+    md2, _ = execute_plan({"steps": [LEGACY["steps"][1]]}, load_csv(p))
+    assert md2 == md
+    md3, _ = execute_plan({"steps": []}, list(iter_csv_rows(p)))
+    assert md3 == run_skills_pipeline(iter_csv_rows(p), {"steps": []})[0]
+
+
+def test_dag_branches_share_clean_step(tmp_path):
+    p = _csv(tmp_path)
+    plan = {"steps": [
+        {"id": "clean", "op": "csv.clean", "args": {"drop_empty": True}},
+        {"id": "by_views", "op": "stats.aggregate", "inputs": ["clean"], "args": {"top_n": 2, "score_by": "views"}},
+        {"id": "by_likes", "op": "stats.aggregate", "inputs": "clean", "args": {"top_n": 2, "score_by": "likes"}},
+        {"id": "r1", "op": "md.render", "inputs": ["by_views"]},
+        {"id": "r2", "op": "md.render", "inputs": ["by_likes"], "depends_on": ["r1"]},
+    ]}
+    assert [n.id for n in build_dag(plan)] == ["clean", "by_views", "by_likes", "r1", "r2"]
+    md, info = execute_plan(plan, p)
+    cleaned = info["outputs"]["clean"]
+    assert info["outputs"]["by_likes"] == stats_aggregate(cleaned, top_n=2, score_by="likes")
+    assert md == info["outputs"]["r2"]
+    assert info["agg"] is info["outputs"]["by_views"]
+
+
+def test_independent_steps_run_concurrently(tmp_path):
+    plan = {"steps": [
+        {"id": "a", "op": "test.sleep", "args": {"sec": 0.3}},
+        {"id": "b", "op": "test.sleep", "args": {"sec": 0.3}},
+        {"id": "c", "op": "test.sleep", "inputs": ["a", "b"], "args": {"sec": 0.0}},
+    ]}
+    t0 = time.perf_counter()
+    _, info = execute_plan(plan, [])
+    assert time.perf_counter() - t0 < 0.55
+    assert [s["id"] for s in info["steps"]][-1] == "c"
+    assert info["outputs"]["c"]["summary"]["count"] == 2
+
+
+def test_invalid_plans_and_fallback(tmp_path):
+    p = _csv(tmp_path)
+    with pytest.raises(PlanError):
+        build_dag({"steps": [{"id": "a", "op": "csv.clean", "inputs": ["b"]}, {"id": "b", "op": "csv.clean", "inputs": ["a"]}]})
+    with pytest.raises(PlanError):
+        build_dag({"steps": [{"id": "a", "op": "csv.clean", "depends_on": ["nope"]}]})
+    bad = {"steps": [{"id": "s2", "op": "stats.aggregate", "inputs": ["missing"], "args": {"top_n": 3}}]}
+    events = []
+    md, _ = execute_plan(bad, p, emit=lambda t, pay: events.append(t), fallback=True)
+    assert events[0] == "exec.plan_fallback"
+    assert md == execute_plan(LEGACY, p)[0]
+
+
+def test_unknown_op_is_skipped_and_passes_through(tmp_path):
+    p = _csv(tmp_path)
+    plan = {"steps": [LEGACY["steps"][0], {"id": "x", "op": "nlp.sentiment"}, LEGACY["steps"][1], LEGACY["steps"][2]]}
+    md, info = execute_plan(plan, p)
+    assert [s["status"] for s in info["steps"]] == ["ok", "skipped", "ok", "ok"]
+    assert md == execute_plan(LEGACY, p)[0]
+
+
+def test_process_pool(tmp_path):
+    p = _csv(tmp_path)
+    plan = {"steps": [
+        {"id": "clean", "op": "csv.clean", "inputs": [], "args": {"drop_empty": True}},
+        {"id": "agg", "op": "stats.aggregate", "inputs": ["clean"], "depends_on": ["clean"], "args": {"top_n": 3}},
+        {"id": "md", "op": "md.render", "inputs": ["agg"]},
+    ]}
+    assert execute_plan(plan, p, pool="process", max_parallel=2)[0] == execute_plan(LEGACY, p)[0]
+
+
+def test_skills_executor_prefers_csv_path_over_rows(tmp_path, monkeypatch):
+    from packages.agents import rule_agents
+
+    p = _csv(tmp_path)
+    seen = []
+
+    def spy(plan, source, **kw):
+        seen.append(source)
+        return execute_plan(plan, source, **kw)
+
+    monkeypatch.setattr(rule_agents, "execute_plan", spy)
+    # LLM 规划器会把全量 rows 放入上下文（仅供提示词抽样）：执行仍须按文件走并行/增量/记忆化路径
+    ctx = {"rows": list(iter_csv_rows(p)), "csv_path": p, "workers": 2}
+    md, _ = rule_agents.ExecutorSkills().execute({}, LEGACY, ctx)
+    assert seen == [p]
+    assert md == execute_plan(LEGACY, p)[0]
+
+
+def test_misnamed_ops_fall_back_instead_of_returning_source(tmp_path):
+    p = _csv(tmp_path)
+    plan = {"steps": [
+        {"id": "s1", "op": "clean", "args": {"drop_empty": True}},
+        {"id": "s2", "op": "aggregate", "args": {"top_n": 3, "score_by": "views", "title_field": "title"}},
+        {"id": "s3", "op": "render", "args": {"include_table": True}},
+    ]}
+    # 全部透传：CSV 路径不能被当作 Markdown
+    with pytest.raises(PlanError):
+        execute_plan(plan, p)
+    events = []
+    md, info = execute_plan(plan, p, emit=lambda t, pay: events.append(t), fallback=True)
+    assert "exec.plan_fallback" in events
+    assert md != p and md == execute_plan(LEGACY, p)[0]
+    assert info["agg"]["top"]
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from packages.prompts.budget import (
+    csv_candidates,
+    estimate_tokens,
+    fit_sections,
+    model_family,
+    srs_candidates,
+    stratified_sample,
+)
+
+
+def _rows(n):
+    return [{"title": f"t{i}", "views": str(i * 10)} for i in range(n)]
+
+
+def _excerpt(rows):
+    return "title,views\n" + "\n".join(f"{r['title']},{r['views']}" for r in rows)
+
+
+def test_estimator_families_and_cjk():
+    assert model_family("openai/gpt-4o-mini") == "openai"
+    assert model_family("qwen/qwen3-next-80b") == "qwen"
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 400, "gpt-4o") == 101
+    # 中文按字计，明显多于同长度 ASCII
+    assert estimate_tokens("中" * 100) > estimate_tokens("a" * 100)
+
+
+def test_within_budget_keeps_sections_verbatim():
+    rows = _rows(5)
+    srs = {"goal": "g", "params": {"top_n": 3}}
+    vars_, meta = fit_sections(
+        {"SRS": srs_candidates(srs), "CSV_EXCERPT": csv_candidates(_excerpt(rows), rows)},
+        {"enabled": True, "total": 5000},
+    )
+    assert vars_["CSV_EXCERPT"] == _excerpt(rows)
+    assert json.loads(vars_["SRS"]) == srs
+    assert meta["within_budget"] and meta["sections"]["CSV_EXCERPT"]["level"] == 0
+
+
+def test_csv_compacted_to_schema_stats_and_stratified_sample():
+    rows = _rows(2000)
+    vars_, meta = fit_sections(
+        {"CSV_EXCERPT": csv_candidates(_excerpt(rows), rows, score_by="views", sample_rows=40)},
+        {"enabled": True, "sections": {"CSV_EXCERPT": 400}},
+    )
+    text = vars_["CSV_EXCERPT"]
+    assert "# rows=2000" in text and "views:num" in text and "max=19990" in text
+    assert meta["sections"]["CSV_EXCERPT"]["tokens"] <= 400
+    # 抽样覆盖评分最高与最低的行
+    sample = stratified_sample(rows, 5, "views")
+    assert sample[0]["views"] == "0" and sample[-1]["views"] == "19990"
+
+
+def test_total_budget_shrinks_largest_section():
+    srs = {"goal": "g", "params": {}, "acceptance": [{"id": "A1", "then": "x" * 400}], "constraints": ["c" * 400]}
+    rows = _rows(5)
+    vars_, meta = fit_sections(
+        {"SRS": srs_candidates(srs), "CSV_EXCERPT": csv_candidates(_excerpt(rows), rows)},
+        {"enabled": True, "total": 150, "sections": {"SRS": 10000, "CSV_EXCERPT": 10000}},
+    )
+    assert meta["prompt_tokens_est"] <= 150
+    assert "acceptance" not in json.loads(vars_["SRS"])
+    assert vars_["CSV_EXCERPT"] == _excerpt(rows)
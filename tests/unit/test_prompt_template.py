@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from packages.prompts import template as tmod
+from packages.prompts.loader import load_pair, render
+
+
+def test_single_pass_render_does_not_resubstitute():
+    t = tmod.compile_template("A={{A}} B={{B}} C={{C}}")
+    assert t.slots == ("A", "B", "C")
+    out = t.render({"A": "{{B}}", "B": "b"})
+    assert out == "A={{B}} B=b C={{C}}"
+    assert render("x {{SRS}} y", {"SRS": "1"}) == "x 1 y"
+
+
+def test_load_pair_caches_and_hot_reloads(tmp_path):
+    tmod.clear_cache()
+    tmod.set_reload_interval(0)
+    try:
+        (tmp_path / "p.system.txt").write_text("sys v1", encoding="utf-8")
+        (tmp_path / "p.user.txt").write_text("U {{X}}", encoding="utf-8")
+        assert load_pair(str(tmp_path), "p") == ("sys v1", "U {{X}}")
+        a = tmod.load_template(str(tmp_path / "p.user.txt"))
+        assert tmod.load_template(str(tmp_path / "p.user.txt")) is a
+
+        p = tmp_path / "p.system.txt"
+        p.write_text("sys v2", encoding="utf-8")
+        st = os.stat(p)
+        os.utime(p, (st.st_atime, st.st_mtime + 5))
+        assert load_pair(str(tmp_path), "p")[0] == "sys v2"
+        assert load_pair(str(tmp_path), "missing") == ("", "")
+    finally:
+        tmod.set_reload_interval(1.0)
+        tmod.clear_cache()
+
+
+def test_reload_interval_skips_stat(tmp_path, monkeypatch):
+    tmod.clear_cache()
+    path = str(tmp_path / "q.user.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("hi")
+    tmod.load_template(path)
+
+    def _no_stat(*a, **k):
+        raise AssertionError("stat on hot path")
+
+    monkeypatch.setattr(tmod.os, "stat", _no_stat)
+    assert tmod.load_template(path).source == "hi"
+    tmod.clear_cache()
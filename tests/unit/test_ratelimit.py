@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from packages.providers import openrouter_client
+from packages.providers.interfaces import ProviderHTTPError
+from packages.providers.ratelimit import RateLimiter, estimate_request_tokens, limiter_for
+
+
+def test_memory_bucket_waits_when_rpm_exhausted():
+    lim = RateLimiter("t:m", rpm=600)  # 10 次/秒
+    lim._mem = (1.0, 0.0, time.time(), 0.0)
+    assert lim.acquire() < 0.01
+    waited = lim.acquire()
+    assert 0.05 < waited < 0.5
+    assert lim.stats()["waited"] == 1
+
+
+def test_sqlite_state_shared_between_instances(tmp_path):
+    path = str(tmp_path / "rl.db")
+    a = RateLimiter("p:m", tpm=6000, state_path=path)
+    b = RateLimiter("p:m", tpm=6000, state_path=path)
+    a.acquire(6000)  # 清空共享桶
+    t0 = time.time()
+    b.acquire(20)  # 100 token/秒 → 约 0.2 秒
+    assert time.time() - t0 > 0.1
+
+
+def test_pause_blocks_other_callers(tmp_path):
+    path = str(tmp_path / "rl.db")
+    a = RateLimiter("p:m", rpm=1000, state_path=path)
+    b = RateLimiter("p:m", rpm=1000, state_path=path)
+    a.pause(0.3)
+    waited = b.acquire()
+    assert waited >= 0.25
+
+
+def test_limiter_for_unconfigured_returns_none():
+    assert limiter_for({"llm": {}}, "openrouter", "m") is None
+    lim = limiter_for({"llm": {"rate_limit": {"rpm": 60, "backend": "memory"}}}, "openrouter", "m")
+    assert lim is not None and lim.key == "openrouter:m"
+    assert estimate_request_tokens([{"role": "user", "content": "x" * 40}], 5) == 15
+
+
+def test_last_attempt_429_still_pauses_shared_limiter(monkeypatch):
+    class _Resp:
+        status_code = 429
+        headers = {"Retry-After": "2"}
+        text = "rate limited"
+
+        def json(self):
+            return {}
+
+    class _Session:
+        def post(self, *a, **k):
+            return _Resp()
+
+    class _Limiter:
+        def __init__(self):
+            self.paused = []
+
+        def acquire(self, tokens=0):
+            return 0.0
+
+        def pause(self, sec):
+            self.paused.append(sec)
+
+    monkeypatch.setattr(openrouter_client, "get_session", lambda: _Session())
+    client = openrouter_client.OpenRouterClient(api_key="k", model="m")
+    client.rate_limiter = _Limiter()
+    # 路由器对非最后一个端点传 retries=0：仍须让共享限流器暂停
+    with pytest.raises(ProviderHTTPError):
+        client.chat_with_meta([{"role": "user", "content": "hi"}], retries=0)
+    assert client.rate_limiter.paused == [2.0]
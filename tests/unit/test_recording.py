@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from packages.providers.recording import RecordingProvider, ReplayMissError, ReplayProvider, load_recording
+
+
+class _Counter:
+    model = "m"
+
+    def __init__(self):
+        self.calls = 0
+
+    def chat_with_meta(self, messages, temperature=0.2, max_tokens=None, retries=0):
+        self.calls += 1
+        return f"r{self.calls}:{messages[-1]['content']}", {"provider": "fake", "attempts": 1}
+
+
+def _msgs(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_record_then_replay_exact(tmp_path):
+    rec = RecordingProvider(_Counter())
+    rec.stage = "plan"
+    a, _ = rec.chat_with_meta(_msgs("p"))
+    rec.stage = "review"
+    b, _ = rec.chat_with_meta(_msgs("x"), temperature=0.0)
+    path = rec.save(str(tmp_path / "t.llm.jsonl"))
+    assert [r["stage"] for r in load_recording(path)] == ["plan", "review"]
+
+    rp = ReplayProvider.from_file(path)
+    rp.stage = "review"
+    content, meta = rp.chat_with_meta(_msgs("x"), temperature=0.0)
+    assert content == b and meta["replay"]["match"] == "exact"
+    rp.stage = "plan"
+    assert rp.chat_with_meta(_msgs("p"))[0] == a
+
+
+def test_replay_falls_back_by_stage_unless_strict(tmp_path):
+    rec = RecordingProvider(_Counter())
+    rec.stage = "execute"
+    rec.chat_with_meta(_msgs("old prompt"))
+    path = rec.save(str(tmp_path / "t.llm.jsonl"))
+
+    rp = ReplayProvider.from_file(path)
+    rp.stage = "execute"
+    content, meta = rp.chat_with_meta(_msgs("changed prompt"))
+    assert content.startswith("r1:") and meta["replay"]["match"] == "stage"
+
+    strict = ReplayProvider.from_file(path, strict=True)
+    strict.stage = "execute"
+    with pytest.raises(ReplayMissError):
+        strict.chat_with_meta(_msgs("changed prompt"))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+import packages.providers.router as router_mod
+from packages.providers.endpoints import health_for, reset_health
+from packages.providers.interfaces import ProviderHTTPError
+
+
+class _FakeClient:
+    def __init__(self, name, fail_status=None, delay=0.0):
+        self.name = name
+        self.model = name
+        self.base_url = f"http://{name}"
+        self.fail_status = fail_status
+        self.delay = delay
+        self.calls = 0
+
+    def chat_with_meta(self, messages, temperature=0.2, max_tokens=None, retries=0):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail_status:
+            raise ProviderHTTPError(f"fail {self.fail_status}", self.fail_status)
+        return f"from {self.name}", {"provider": self.name, "attempts": 1}
+
+
+def _router(monkeypatch, clients, **routing):
+    reset_health()
+    by_model = {c.name: c for c in clients}
+    monkeypatch.setattr(router_mod, "_build_client", lambda ep, cfg: by_model[ep.model])
+    cfg = {
+        "llm": {
+            "singleflight": False,
+            "endpoints": [{"id": c.name, "provider": "openrouter", "model": c.name} for c in clients],
+            "routing": routing,
+        }
+    }
+    return router_mod.LLMRouter(cfg)
+
+
+def test_failover_on_429(monkeypatch):
+    a = _FakeClient("a", fail_status=429)
+    b = _FakeClient("b")
+    r = _router(monkeypatch, [a, b])
+    content, meta = r.chat_with_meta([{"role": "user", "content": "x"}])
+    assert content == "from b"
+    assert meta["route"]["attempted"] == ["a", "b"]
+
+
+def test_non_retryable_error_is_raised(monkeypatch):
+    a = _FakeClient("a", fail_status=400)
+    b = _FakeClient("b")
+    r = _router(monkeypatch, [a, b])
+    with pytest.raises(ProviderHTTPError):
+        r.chat_with_meta([{"role": "user", "content": "x"}])
+    assert b.calls == 0
+
+
+def test_breaker_skips_open_endpoint(monkeypatch):
+    a = _FakeClient("a", fail_status=503)
+    b = _FakeClient("b")
+    r = _router(monkeypatch, [a, b], breaker_failures=2, breaker_cooldown_sec=60)
+    for _ in range(4):
+        r.chat_with_meta([{"role": "user", "content": "x"}])
+    assert a.calls == 2
+    assert health_for("a").snapshot()["breaker"] == "open"
+
+
+def test_hedge_returns_faster_endpoint(monkeypatch):
+    slow = _FakeClient("slow")
+    fast = _FakeClient("fast")
+    r = _router(monkeypatch, [slow, fast], hedge=True, hedge_min_samples=3)
+    for _ in range(3):
+        health_for("slow").record_success(10.0)
+    slow.delay = 0.5
+    t0 = time.time()
+    content, meta = r.chat_with_meta([{"role": "user", "content": "x"}])
+    assert content == "from fast"
+    assert meta["route"]["hedged"] is True
+    assert time.time() - t0 < 0.4
+
+
+def test_half_open_probe_released_on_non_retryable_error(monkeypatch):
+    a = _FakeClient("a", fail_status=503)
+    b = _FakeClient("b")
+    r = _router(monkeypatch, [a, b], breaker_failures=1, breaker_cooldown_sec=0.0)
+    r.chat_with_meta([{"role": "user", "content": "x"}])
+    assert health_for("a").snapshot()["breaker"] == "half_open"
+    # 半开试探遇到 400：不计成败，但试探标记须释放，之后仍可再次试探
+    a.fail_status = 400
+    with pytest.raises(ProviderHTTPError):
+        r.chat_with_meta([{"role": "user", "content": "x"}])
+    assert health_for("a").available()
+    health_for("a").release_probe()
+    a.fail_status = None
+    content, _ = r.chat_with_meta([{"role": "user", "content": "x"}])
+    assert content == "from a"
+    assert health_for("a").snapshot()["breaker"] == "closed"
+
+
+def test_hedge_pool_sized_from_config_and_queue_time_not_counted(monkeypatch):
+    slow = _FakeClient("slow", delay=0.15)
+    fast = _FakeClient("fast")
+    r = _router(monkeypatch, [slow, fast], hedge=True, hedge_min_samples=3, hedge_max_delay_ms=1000, hedge_pool_size=2)
+    for _ in range(3):
+        health_for("slow").record_success(300.0)
+    # 池被占满时主请求排队，排队时间不应触发对冲
+    pool = router_mod._hedge_pool(2)
+    assert pool._max_workers == 2
+    blockers = [pool.submit(time.sleep, 0.3) for _ in range(2)]
+    content, meta = r.chat_with_meta([{"role": "user", "content": "x"}])
+    assert content == "from slow"
+    assert meta["route"]["hedged"] is False
+    assert all(b.done() for b in blockers)
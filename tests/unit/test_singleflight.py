@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from packages.providers.singleflight import SingleFlight, request_fingerprint
+
+
+def test_fingerprint_ignores_dict_order():
+    a = request_fingerprint("p", "m", [{"role": "user", "content": "hi"}], 0.2, None)
+    b = request_fingerprint("p", "m", [{"content": "hi", "role": "user"}], 0.2, None)
+    c = request_fingerprint("p", "m", [{"role": "user", "content": "hi"}], 0.3, None)
+    assert a == b
+    assert a != c
+
+
+def test_concurrent_calls_share_one_result():
+    sf = SingleFlight()
+    calls = []
+    gate = threading.Event()
+
+    def slow():
+        calls.append(1)
+        gate.wait(2)
+        return "ok"
+
+    results = []
+
+    def worker():
+        results.append(sf.do("k", slow))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for t in threads:
+        t.start()
+    # 等待全部挂接后放行
+    deadline = time.time() + 2
+    while sf.waiters("k") < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    assert sf.stats()["inflight"] == {"k": 4}
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert sf.stats()["inflight"] == {}
+    assert sf.stats()["coalesced"] == 4
+
+
+def test_error_is_shared_and_key_released():
+    sf = SingleFlight()
+
+    def boom():
+        raise RuntimeError("429")
+
+    with pytest.raises(RuntimeError):
+        sf.do("k", boom)
+    assert sf.do("k", lambda: 1) == (1, False)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import random
+
+from packages.agents.skills_pipeline import iter_csv_rows, run_skills_pipeline
+from skills.csv_clean import csv_clean, iter_clean
+from skills.md_render import md_render
+from skills.stats_aggregate import stats_aggregate, stats_aggregate_stream
+
+
+def _rows(n, seed=7):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        views = rnd.choice(["", "1,200", "3.5", "x", str(rnd.randint(0, 50)), " 7 "])
+        title = rnd.choice(["", f" T{i} ", f"T{i % 5}"])
+        out.append({"title": title, "views": views})
+    return out
+
+
+def test_stream_aggregate_matches_list_version():
+    rows = _rows(2000)
+    for top_n in (0, 1, 10, 37, 5000):
+        for rs in (rows, csv_clean(rows)):
+            assert stats_aggregate_stream(iter(rs), top_n=top_n) == stats_aggregate(rs, top_n=top_n)
+
+
+def test_ties_keep_first_seen_order():
+    rows = [{"title": t, "views": "5"} for t in "abcdef"] + [{"title": "", "views": "9"}]
+    res = stats_aggregate_stream(rows, top_n=3)
+    assert [(t["rank"], t["title"]) for t in res["top"]] == [(2, "a"), (3, "b")]
+    assert res == stats_aggregate(rows, top_n=3)
+
+
+def test_iter_clean_is_lazy():
+    consumed = []
+
+    def gen():
+        for r in _rows(100):
+            consumed.append(r)
+            yield r
+
+    it = iter_clean(gen())
+    next(it)
+    assert len(consumed) < 100
+
+
+def test_fused_pipeline_matches_stepwise(tmp_path):
+    p = tmp_path / "d.csv"
+    lines = ["title,views"] + [f"{r['title']},\"{r['views']}\"" for r in _rows(500, seed=3)]
+    p.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    plan = {"steps": [
+        {"id": "s1", "op": "csv.clean", "args": {"drop_empty": True}},
+        {"id": "s2", "op": "stats.aggregate", "args": {"top_n": 7, "score_by": "views", "title_field": "title"}},
+        {"id": "s3", "op": "md.render", "args": {"include_table": True}},
+    ]}
+    md, agg, count = run_skills_pipeline(iter_csv_rows(str(p)), plan)
+    cleaned = csv_clean(list(iter_csv_rows(str(p))))
+    expect = stats_aggregate(cleaned, top_n=7)
+    assert agg == expect and count == len(cleaned)
+    assert md == md_render(expect["summary"], expect["top"], include_table=True)
+    # 缺省计划按默认参数兜底
+    assert run_skills_pipeline(iter_csv_rows(str(p)), {})[1] == stats_aggregate(cleaned)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import random
+
+from skills.stats_aggregate import _to_number, stats_aggregate
+
+
+def _reference(rows, top_n=10, score_by="views", title_field="title"):
+    """改写前的实现：两次解析 + 全量稳定排序。"""
+    n = len(rows)
+    total = sum(_to_number(r.get(score_by, 0)) for r in rows)
+    avg = (total / n) if n else 0.0
+    ranked = sorted(
+        ({"title": r.get(title_field, ""), "score": _to_number(r.get(score_by, 0))} for r in rows),
+        key=lambda x: x["score"],
+        reverse=True,
+    )
+    top = [{"rank": i + 1, **item} for i, item in enumerate(ranked[: max(0, int(top_n))]) if item["title"]]
+    return {"summary": {"count": n, "total": round(total, 2), "avg": round(avg, 2)}, "top": top}
+
+
+def _rows(n, seed):
+    rnd = random.Random(seed)
+    values = ["", "1,200", "3.5", "x", " 7 ", "1e3", "-2", "0", None, 12, 4.25, "1,2,3", "inf"]
+    out = []
+    for i in range(n):
+        v = rnd.choice(values) if rnd.random() < 0.3 else str(rnd.randint(0, 40))
+        out.append({"title": rnd.choice(["", f"T{i}", "dup"]), "views": v})
+    return out
+
+
+def test_matches_full_sort_reference():
+    for seed in range(5):
+        rows = _rows(3000, seed)
+        for top_n in (0, 1, 3, 10, 100, 4000, -1):
+            got = stats_aggregate(rows, top_n=top_n)
+            errors = got["summary"].pop("parse_errors")
+            assert got == _reference(rows, top_n=top_n)
+            assert errors == sum(1 for r in rows if r["views"] == "x")
+
+
+def test_parse_errors_and_missing_values():
+    rows = [{"title": "a", "views": "1,000"}, {"title": "b", "views": "n/a"}, {"title": "c", "views": ""}, {"title": "d"}, {"title": "e", "views": None}]
+    res = stats_aggregate(rows, top_n=2)
+    assert res["summary"] == {"count": 5, "total": 1000.0, "avg": 200.0, "parse_errors": 1}
+    assert [(t["rank"], t["title"], t["score"]) for t in res["top"]] == [(1, "a", 1000.0), (2, "b", 0.0)]
+
+
+def test_stable_ties_across_heap_replacements():
+    rows = [{"title": f"t{i}", "views": str(i % 3)} for i in range(30)]
+    assert stats_aggregate(rows, top_n=4)["top"] == _reference(rows, top_n=4)["top"]
+    assert [t["title"] for t in stats_aggregate(rows, top_n=4)["top"]] == ["t2", "t5", "t8", "t11"]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import json
+import random
+
+import pytest
+
+from skills import stats_aggregate as sa
+
+np = pytest.importorskip("numpy")
+
+
+def _rows(n, seed, extra=()):
+    rnd = random.Random(seed)
+    pool = ["1,200", "3.5", " 7 ", "1e3", "-2", "0", "-0", "", "inf", "-inf", "2,500.75", "1_000"] + list(extra)
+    out = []
+    for i in range(n):
+        v = rnd.choice(pool) if rnd.random() < 0.2 else str(rnd.randint(0, 60))
+        out.append({"title": rnd.choice(["", f"T{i}", "dup"]), "views": v})
+    return out
+
+
+def _same(a, b):
+    return json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+
+
+def test_numpy_backend_is_byte_identical():
+    for seed in range(4):
+        rows = _rows(5000, seed)
+        for top_n in (0, 1, 5, 10, 250, 5000, 9999, -3):
+            res_np = sa.stats_aggregate(rows, top_n=top_n, backend="numpy")
+            res_py = sa.stats_aggregate(rows, top_n=top_n, backend="python")
+            assert _same(res_np, res_py)
+            assert all(type(t["score"]) is float for t in res_np["top"])
+
+
+def test_numpy_backend_used_and_falls_back(monkeypatch):
+    calls = []
+    real = sa._aggregate_numpy
+
+    def spy(*a, **kw):
+        res = real(*a, **kw)
+        calls.append(res is not None)
+        return res
+
+    monkeypatch.setattr(sa, "_aggregate_numpy", spy)
+    rows = _rows(300, 1)
+    sa.stats_aggregate(rows, backend="numpy")
+    sa.stats_aggregate(rows)  # 行字典输入 auto 不走向量化（转数组开销高于收益）
+    assert calls == [True]
+    # 无法解析 / NaN / 非字符串：回退 Python 路径，结果（含 parse_errors）一致
+    for extra in (["x"], ["nan"], [None]):
+        bad = _rows(300, 2, extra=extra) + [{"title": "z", "views": extra[0]}]
+        assert _same(sa.stats_aggregate(bad, backend="numpy"), sa.stats_aggregate(bad, backend="python"))
+    assert calls[1:] == [False, False, False]
+    assert sa.stats_aggregate([{"title": "z", "views": "x"}] * 200, backend="numpy")["summary"]["parse_errors"] == 200
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+
+import pytest
+
+from packages.agents import step_memo as sm
+from packages.agents.plan_executor import execute_plan
+from packages.agents.step_memo import StepMemo, step_key
+from packages.data.dataset import Dataset, load_csv
+from packages.data.dataset_cache import dataset_cache
+
+DAG = {"steps": [
+    {"id": "clean", "op": "csv.clean", "inputs": [], "args": {"drop_empty": True}},
+    {"id": "agg", "op": "stats.aggregate", "inputs": ["clean"], "args": {"top_n": 3, "score_by": "views"}},
+    {"id": "md", "op": "md.render", "inputs": ["agg"]},
+    # clean 有两个消费者，不与聚合融合
+    {"id": "top1", "op": "stats.aggregate", "inputs": ["clean"], "args": {"top_n": 1}},
+]}
+
+
+@pytest.fixture(autouse=True)
+def _isolated_dataset_cache(tmp_path, monkeypatch):
+    # 各测试显式注入 StepMemo；CSV 解析缓存同样写到 tmp_path
+    monkeypatch.setattr(dataset_cache(), "cache_dir", str(tmp_path / "dataset-cache"))
+
+
+def _csv(tmp_path, n=40, name="d.csv"):
+    p = str(tmp_path / name)
+    with open(p, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["title", "views"])
+        for i in range(n):
+            w.writerow([f"T{i}" if i % 7 else "", str((i * 11) % 17)])
+    return p
+
+
+def _cache(info):
+    return {s["id"]: s.get("cache") for s in info["steps"]}
+
+
+def test_second_run_hits_every_step(tmp_path):
+    p = _csv(tmp_path)
+    memo = StepMemo(str(tmp_path / "memo"))
+    md1, info1 = execute_plan(DAG, p, memo=memo)
+    assert _cache(info1) == {"clean": "miss", "agg": "miss", "md": "miss", "top1": "miss"}
+    events = []
+    md2, info2 = execute_plan(DAG, p, memo=memo, emit=lambda t, pay: events.append(pay))
+    assert md2 == md1 and info2["agg"] == info1["agg"]
+    # clean 只被命中步骤消费，不再执行
+    assert _cache(info2) == {"agg": "hit", "md": "hit", "top1": "hit", "clean": "pruned"}
+    assert info2["cache"]["hit"] == 3 and info2["cache"]["saved_ms"] >= 0
+    assert all("saved_ms" in e for e in events if e.get("cache") == "hit")
+    # memo=False 关闭记忆化
+    _, info3 = execute_plan(DAG, p, memo=False)
+    assert all("cache" not in s for s in info3["steps"])
+
+
+def test_changed_args_reuse_shared_prefix(tmp_path):
+    p = _csv(tmp_path)
+    memo = StepMemo(str(tmp_path / "memo"))
+    execute_plan(DAG, p, memo=memo)
+    plan = {"steps": [dict(s) for s in DAG["steps"]]}
+    plan["steps"][1]["args"] = {"top_n": 5, "score_by": "views"}
+    md, info = execute_plan(plan, p, memo=memo)
+    assert _cache(info) == {"clean": "hit", "top1": "hit", "agg": "miss", "md": "miss"}
+    assert isinstance(info["outputs"]["clean"], Dataset)
+    assert md == execute_plan(plan, p, memo=False)[0]
+
+
+def test_fused_legacy_plan_is_memoized(tmp_path):
+    p = _csv(tmp_path)
+    memo = StepMemo(str(tmp_path / "memo"))
+    legacy = {"steps": [{"id": "s2", "op": "stats.aggregate", "args": {"top_n": 3}}]}
+    md1, _ = execute_plan(legacy, p, memo=memo, workers=1)
+    # workers 只是执行选项，不参与键
+    md2, info = execute_plan(legacy, p, memo=memo, workers=2)
+    assert md2 == md1
+    assert _cache(info) == {"s2": "hit", "s3": "hit"}
+
+
+def test_source_and_skill_changes_invalidate(tmp_path, monkeypatch):
+    p = _csv(tmp_path)
+    memo = StepMemo(str(tmp_path / "memo"))
+    execute_plan(DAG, p, memo=memo)
+    with open(p, "a", newline="", encoding="utf-8") as f:
+        f.write("Tnew,99\n")
+    os.utime(p, ns=(1, 1))
+    md, info = execute_plan(DAG, p, memo=memo)
+    assert set(_cache(info).values()) == {"miss"}
+    assert "Tnew" in md
+    real = sm.skill_sha256
+    monkeypatch.setattr(sm, "skill_sha256", lambda name: "changed" if name == "stats_aggregate" else real(name))
+    _, info = execute_plan(DAG, p, memo=memo)
+    assert _cache(info) == {"clean": "hit", "agg": "miss", "md": "miss", "top1": "miss"}
+    # 非路径输入不可指纹化：全部旁路
+    _, info = execute_plan(DAG, load_csv(p), memo=memo)
+    assert set(_cache(info).values()) == {"bypass"}
+
+
+def test_lru_eviction_and_unserializable_values(tmp_path):
+    memo = StepMemo(str(tmp_path / "memo"), max_bytes=2500)
+    keys = [step_key("op", {"i": i}, []) for i in range(6)]
+    for i, k in enumerate(keys):
+        assert memo.put(k, {"payload": "x" * 800, "i": i}, {"op": "op", "ms": 1.0})
+        if i == 1:
+            assert memo.get(keys[0])[0]
+    st = memo.stats()
+    assert st["bytes"] <= 2500 and st["evicted"] > 0
+    assert memo.get(keys[-1])[1]["i"] == 5
+    assert not memo.get(keys[1])[0]
+    assert not memo.put(step_key("op", {}, []), object(), {})
+    memo.clear()
+    assert memo.stats()["entries"] == 0
+
+
+def test_dataset_round_trip(tmp_path):
+    ds = load_csv(_csv(tmp_path))
+    memo = StepMemo(str(tmp_path / "memo"))
+    k = step_key("csv.clean", {}, ["x"])
+    assert memo.put(k, ds, {"op": "csv.clean", "ms": 3.5})
+    hit, value, meta = memo.get(k)
+    assert hit and meta["ms"] == 3.5 and meta["format"] == "dataset"
+    assert isinstance(value, Dataset) and value == ds
+
+
+def test_fused_plan_reuses_clean_when_only_top_n_changes(tmp_path):
+    p = _csv(tmp_path)
+    memo = StepMemo(str(tmp_path / "memo"))
+
+    def legacy(top_n):
+        return {"steps": [
+            {"id": "s1", "op": "csv.clean", "args": {"drop_empty": True}},
+            {"id": "s2", "op": "stats.aggregate", "args": {"top_n": top_n, "score_by": "views"}},
+            {"id": "s3", "op": "md.render", "args": {"include_table": True}},
+        ]}
+
+    _, info = execute_plan(legacy(5), p, memo=memo)
+    assert info["steps"][0]["clean_cache"] == "miss"
+    _, info = execute_plan(legacy(5), p, memo=memo)
+    assert _cache(info) == {"s2": "hit", "s3": "hit"}
+    # 只改 top_n：融合节点未命中，但清洗结果按 csv.clean 的键复用，只重做聚合
+    md, info = execute_plan(legacy(3), p, memo=memo)
+    fused = info["steps"][0]
+    assert fused["cache"] == "miss" and fused["clean_cache"] == "hit" and fused["saved_ms"] is not None
+    assert md == execute_plan(legacy(3), p, memo=False)[0]
+    # 与未融合的独立 csv.clean 步骤共用同一个键
+    _, info = execute_plan(DAG, p, memo=memo)
+    assert _cache(info)["clean"] == "hit"
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from packages.tools.registry import ToolSpec, get_tool_spec, register_tool
+from packages.tools.result_cache import ToolResultCache, cache_key, cached_call, result_cache
+
+
+def _reader(calls, path):
+    def fn():
+        calls.append(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return {"text": f.read()}
+    return fn
+
+
+def test_cached_call_hits_until_file_changes(tmp_path):
+    result_cache().clear()
+    p = tmp_path / "a.csv"
+    p.write_text("title,views\nA,1\n", encoding="utf-8")
+    calls = []
+    args = {"path": "a.csv", "n": 5}
+    r1, s1 = cached_call("data.csv_head", args, _reader(calls, str(p)), base_dir=str(tmp_path))
+    r2, s2 = cached_call("data.csv_head", dict(reversed(list(args.items()))), _reader(calls, str(p)), base_dir=str(tmp_path))
+    assert (s1, s2) == ("miss", "hit") and r1 == r2 and len(calls) == 1
+    # 命中返回新对象，修改不污染缓存
+    r2["text"] = "x"
+    assert cached_call("data.csv_head", args, _reader(calls, str(p)), base_dir=str(tmp_path))[0] == r1
+
+    p.write_text("title,views\nA,1\nB,2\n", encoding="utf-8")
+    r3, s3 = cached_call("data.csv_head", args, _reader(calls, str(p)), base_dir=str(tmp_path))
+    assert s3 == "miss" and "B,2" in r3["text"] and len(calls) == 2
+
+
+def test_non_idempotent_and_missing_files_bypass(tmp_path):
+    assert get_tool_spec("fs.read_text").idempotent
+    register_tool(ToolSpec("test.side_effect", idempotent=False))
+    assert cached_call("test.side_effect", {}, lambda: {"n": 1})[1] == "bypass"
+    assert cached_call("unknown.tool", {}, lambda: {"n": 1})[1] == "bypass"
+    assert cache_key("fs.read_text", {"path": "nope.txt"}, base_dir=str(tmp_path)) is None
+    # 不同作用域（本地 / 远程 server）互不共享
+    (tmp_path / "f.txt").write_text("x", encoding="utf-8")
+    k1 = cache_key("fs.read_text", {"path": "f.txt"}, str(tmp_path), scope="local")
+    k2 = cache_key("fs.read_text", {"path": "f.txt"}, str(tmp_path), scope="mcp:api")
+    assert k1 and k2 and k1 != k2
+
+
+def test_lru_eviction_under_memory_budget():
+    cache = ToolResultCache(max_bytes=100)
+    for i in range(5):
+        assert cache.put(("t", str(i), ()), {"text": "x" * 20})
+    st = cache.stats()
+    assert st["bytes"] <= 100 and st["evictions"] >= 1
+    assert cache.get(("t", "0", ()))[0] is False
+    assert cache.get(("t", "4", ()))[0] is True
+    # 超过整体预算的单个结果不缓存
+    assert cache.put(("t", "big", ()), {"text": "y" * 200}) is False
+
+
+def test_runtime_local_call_reports_cache_state():
+    from packages.tools.runtime import ToolRuntime
+
+    result_cache().clear()
+    rt = ToolRuntime({})
+    args = {"path": "examples/data/weekly.csv", "n": 3}
+    first = rt.call_local("data.csv_head", args)
+    second = rt.call_local("data.csv_head", args)
+    assert first["cache"] == "miss" and second["cache"] == "hit"
+    assert first["text"] == second["text"] and first["text"].count("\n") == 3
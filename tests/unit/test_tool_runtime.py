@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from packages.tools.runtime import ToolRuntime, mark_up, server_down
+
+
+class _Client:
+    """记录调用次数的假 MCPClient：connect 失败或返回固定结果。"""
+
+    def __init__(self, fail=False):
+        self.servers = {"api": object()}
+        self.fail = fail
+        self.calls = 0
+
+    async def call_tool_async(self, server, tool, args):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionRefusedError("connect refused")
+        return {"text": f"remote:{tool}"}
+
+    async def call_tools_async(self, calls):
+        out = []
+        for c in calls:
+            try:
+                out.append({**c, "result": await self.call_tool_async(c["server"], c["tool"], c["args"]), "latency_ms": 0})
+            except Exception as e:
+                out.append({**c, "error": str(e), "error_type": type(e).__name__, "latency_ms": 0})
+        return out
+
+
+def test_local_first_dispatches_in_process():
+    mark_up("api")
+    client = _Client()
+    rt = ToolRuntime({"mcp": {}}, client=client)
+    rec = asyncio.run(rt.call_async("api", "fs.list_dir", {"path": "skills"}))
+    assert rec["route"] == "local" and client.calls == 0
+    assert "stats_aggregate.py" in [f["name"] for f in rec["result"]["structured"]["files"]]
+    # 无本地实现的工具仍走远程
+    assert asyncio.run(rt.call_async("api", "custom.tool", {}))["route"] == "remote"
+
+
+def test_down_server_is_skipped_without_reconnect():
+    mark_up("api")
+    client = _Client(fail=True)
+    rt = ToolRuntime({"mcp": {"local_first": False, "down_backoff_sec": 60}}, client=client)
+    r1 = asyncio.run(rt.call_async("api", "data.csv_head", {"path": "examples/data/weekly.csv", "n": 2}))
+    assert r1["route"] == "fallback" and r1["result"]["text"].startswith("title,views")
+    assert server_down("api")
+    r2 = asyncio.run(rt.call_async("api", "data.csv_head", {"path": "examples/data/weekly.csv", "n": 2}))
+    # 已知不可用：不再尝试连接，直接本地执行
+    assert r2["route"] == "local" and client.calls == 1
+    batch = asyncio.run(rt.call_many_async([
+        {"server": "api", "tool": "fs.read_text", "args": {"path": "README.md"}},
+        {"server": "api", "tool": "custom.tool", "args": {}},
+    ]))
+    assert [b["route"] for b in batch] == ["local", "local"] and client.calls == 1
+    assert batch[1]["result"]["text"] == "<unknown tool: custom.tool>"
+    mark_up("api")
+
+
+def test_require_remote_raises_fast_when_down():
+    mark_up("api")
+    client = _Client(fail=True)
+    rt = ToolRuntime({"mcp": {"require_remote": True}}, client=client)
+    with pytest.raises(ConnectionRefusedError):
+        asyncio.run(rt.call_async("api", "fs.read_text", {"path": "README.md"}))
+    with pytest.raises(RuntimeError):
+        asyncio.run(rt.call_async("api", "fs.read_text", {"path": "README.md"}))
+    assert client.calls == 1
+    out = asyncio.run(rt.call_many_async([{"server": "api", "tool": "fs.read_text", "args": {}}]))
+    assert "error" in out[0] and client.calls == 1
+    mark_up("api")
+
+
+def test_registry_lists_local_tools_with_schema():
+    tools = {t["name"]: t for t in ToolRuntime({}).available_tools()}
+    assert {"fs.read_text", "fs.list_dir", "data.csv_head", "skills.csv_clean", "stats.aggregate", "report.md_render"} <= set(tools)
+    assert tools["stats.aggregate"]["cost"] == "heavy" and "top_n" in tools["stats.aggregate"]["schema"]["properties"]